@@ -0,0 +1,229 @@
+"""
+API latency and throughput under load, offline, against stub Supabase and LLM backends.
+
+The real FastAPI app is driven in-process through httpx.ASGITransport. Supabase
+(PostgREST and auth) and the Together chat API are replaced by the ASGI stubs in
+benchmarks/stubs.py, injected through the `transport` parameters of
+create_supabase_client and LLMGateway, and Donut by a scanner that sleeps. Each stub adds
+a configurable latency, so the numbers measure the API's own overhead plus a known,
+repeatable backend cost.
+
+Each scenario runs `--requests` operations from `--concurrency` concurrent clients and
+reports p50/p95/p99 latency and operations per second. CRUD scenarios time the whole
+create/view/update/delete sequence as one operation. Results are checked against
+benchmarks/api_thresholds.json (limits for the default stub latencies and concurrency);
+the exit status is 1 if any scenario regresses, so this can gate performance changes.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_api_load --scenarios list_expenses track_receipt --requests 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+import uuid
+
+import httpx
+import jwt
+
+from benchmarks.stubs import STUB_JWT_SECRET, StubChatCompletions, StubPostgREST, StubReceiptScanner
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(__file__), "api_thresholds.json")
+STUB_SUPABASE_URL = "http://supabase.stub"
+STUB_LLM_URL = "http://llm.stub/v1"
+EMAIL = "bench@example.com"
+PASSWORD = "benchmark-password"
+
+
+async def build_app(db_latency: float, llm_latency: float, scan_latency: float, jitter: float):
+    """Import the app against the stubs and fill in the state its lifespan would create."""
+    # Read at import time by the token verifier and the Supabase client
+    os.environ.update({
+        "SUPABASE_URL": STUB_SUPABASE_URL,
+        "SUPABASE_KEY": jwt.encode({"role": "anon"}, STUB_JWT_SECRET, algorithm="HS256"),
+        "SUPABASE_JWT_SECRET": STUB_JWT_SECRET,
+        "TOGETHER_API_KEY": "stub",
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+    })
+    from server.main import app
+    from utils import ReceiptCache, create_supabase_client
+    from utils import llm_gateway
+
+    supabase = StubPostgREST(latency=db_latency, jitter=jitter)
+    llm = StubChatCompletions(latency=llm_latency, jitter=jitter)
+    app.state.db = await create_supabase_client(transport=httpx.ASGITransport(app=supabase))
+    app.state.receipt_scanner = StubReceiptScanner(latency=scan_latency)
+    # The stub scanner needs no warm-up, so it is ready from the start
+    app.state.receipt_scanner_ready = asyncio.get_running_loop().create_future()
+    app.state.receipt_scanner_ready.set_result(None)
+    app.state.receipt_cache = ReceiptCache()
+    llm_gateway._gateways["together"] = llm_gateway.LLMGateway(STUB_LLM_URL, transport=httpx.ASGITransport(app=llm), name="together")
+    return app, supabase, llm
+
+
+def expense(user_id: str, day: int = 1) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "amount": 4.99,
+        "category": "Food",
+        "business_name": "Stub Cafe",
+        "date": f"2025-06-{day % 28 + 1:02d}T12:00:00",
+        "user_id": user_id,
+    }
+
+
+async def login(client: httpx.AsyncClient, user_id: str):
+    response = await client.post("/api/users/login", json={"email": EMAIL, "password": PASSWORD})
+    response.raise_for_status()
+
+
+async def list_expenses(client: httpx.AsyncClient, user_id: str):
+    response = await client.get("/api/expenses/", params={"limit": 50})
+    response.raise_for_status()
+
+
+async def create_expense(client: httpx.AsyncClient, user_id: str):
+    response = await client.post("/api/expenses/create", json={"session_id": user_id, "new_expense": expense(user_id)})
+    response.raise_for_status()
+
+
+async def budget_crud(client: httpx.AsyncClient, user_id: str):
+    created = await client.post("/api/budgets/create", json={"name": "Groceries", "spending_limit": 400, "duration": "monthly"})
+    created.raise_for_status()
+    (await client.get("/api/budgets/view")).raise_for_status()
+    (await client.delete(f"/api/budgets/delete/{created.json()['id']}")).raise_for_status()
+
+
+async def goal_crud(client: httpx.AsyncClient, user_id: str):
+    goal = {"title": "Holiday", "target_amount": 2000, "current_amount": 0, "actionable_amount": 100, "frequency": "monthly", "deadline": "2026-12-31T00:00:00"}
+    created = await client.post("/api/goals/create", json={"new_goal": dict(goal)})
+    created.raise_for_status()
+    goal_id = created.json()["id"]
+    (await client.get("/api/goals/view")).raise_for_status()
+    (await client.put(f"/api/goals/update/{goal_id}", json={**goal, "current_amount": 100})).raise_for_status()
+    (await client.delete(f"/api/goals/delete/{goal_id}")).raise_for_status()
+
+
+async def track_receipt(client: httpx.AsyncClient, user_id: str):
+    # Fresh bytes every time, so the receipt cache never short-circuits the scan
+    files = {"file": ("receipt.jpg", os.urandom(4096), "image/jpeg")}
+    response = await client.post("/api/track-receipt", files=files)
+    response.raise_for_status()
+
+
+SCENARIOS = {
+    "login": login,
+    "list_expenses": list_expenses,
+    "create_expense": create_expense,
+    "budget_crud": budget_crud,
+    "goal_crud": goal_crud,
+    "track_receipt": track_receipt,
+}
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[max(math.ceil(q / 100 * len(sorted_values)) - 1, 0)]
+
+
+async def run_scenario(scenario, client: httpx.AsyncClient, user_id: str, requests: int, concurrency: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        await scenario(client, user_id)
+
+    latencies = []
+    errors = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                await scenario(client, user_id)
+            except httpx.HTTPError as e:
+                errors.append(e)
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": len(errors),
+        "first_error": repr(errors[0]) if errors else None,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "rps": len(latencies) / wall,
+    }
+
+
+def check(results: dict, thresholds: dict) -> list:
+    """Return one message per scenario that is slower than its threshold or had errors."""
+    failures = []
+    for name, result in results.items():
+        limits = thresholds.get(name, {})
+        if result["errors"]:
+            failures.append(f"{name}: {result['errors']} failed requests, first: {result['first_error']}")
+        for percentile_name in ("p50_ms", "p95_ms", "p99_ms"):
+            if percentile_name in limits and result[percentile_name] > limits[percentile_name]:
+                failures.append(f"{name}: {percentile_name} {result[percentile_name]:.1f} > {limits[percentile_name]}")
+        if "min_rps" in limits and result["rps"] < limits["min_rps"]:
+            failures.append(f"{name}: {result['rps']:.1f} ops/s < {limits['min_rps']}")
+    return failures
+
+
+async def main(args) -> int:
+    app, supabase, llm = await build_app(args.db_latency_ms / 1000, args.llm_latency_ms / 1000, args.scan_latency_ms / 1000, args.jitter_ms / 1000)
+    user_id = supabase.seed_user(EMAIL, PASSWORD)
+    supabase.table("expenses").extend(expense(user_id, day) for day in range(args.seed_expenses))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://budgetbuddy.test", timeout=60) as client:
+        response = await client.post("/api/users/login", json={"email": EMAIL, "password": PASSWORD})
+        response.raise_for_status()
+        client.cookies.set("access_token", response.json()["access_token"])
+        results = {}
+        print(f"{args.concurrency} concurrent clients, {args.requests} operations per scenario; "
+              f"stub latency db {args.db_latency_ms}ms, llm {args.llm_latency_ms}ms, scan {args.scan_latency_ms}ms")
+        print(f"{'scenario':<16}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'ops/s':>9}{'errors':>8}")
+        for name in args.scenarios:
+            result = results[name] = await run_scenario(SCENARIOS[name], client, user_id, args.requests, args.concurrency, args.warmup)
+            print(f"{name:<16}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['rps']:>9.1f}{result['errors']:>8}")
+    print(f"backend requests: supabase {supabase.requests}, llm {llm.requests}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.no_check:
+        return 0
+    with open(args.thresholds) as f:
+        failures = check(results, json.load(f))
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--db-latency-ms", type=float, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=50)
+    parser.add_argument("--scan-latency-ms", type=float, default=100)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--seed-expenses", type=int, default=1000)
+    parser.add_argument("--thresholds", default=THRESHOLDS_PATH)
+    parser.add_argument("--no-check", action="store_true", help="Report only, do not compare against thresholds")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(main(args)))
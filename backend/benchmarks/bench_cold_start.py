@@ -0,0 +1,59 @@
+"""
+Cold start to first /health response, per startup mode.
+
+Starts a fresh uvicorn process for each mode and polls /health until it answers. The
+receipt scanner loads in the background by default; pass --warmup startup to measure the
+old behaviour where the server waits for the Donut weights before serving.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_cold_start --modes api all --runs 3
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+
+def cold_start(mode: str, warmup: str, port: int, timeout: float) -> float:
+    env = {**os.environ, "BUDGETBUDDY_MODE": mode, "RECEIPT_SCANNER_WARMUP": warmup}
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.02)
+        raise TimeoutError(f"/health did not answer within {timeout}s in {mode} mode")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(modes: list, runs: int, warmup: str, port: int, timeout: float):
+    print(f"{'mode':<6}{'median s':>10}{'min s':>8}{'max s':>8}")
+    for mode in modes:
+        times = [cold_start(mode, warmup, port, timeout) for _ in range(runs)]
+        print(f"{mode:<6}{statistics.median(times):>10.2f}{min(times):>8.2f}{max(times):>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", nargs="+", default=["api", "ocr", "all"], choices=["api", "ocr", "all"])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--warmup", default="background", choices=["background", "startup"])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+    main(args.modes, args.runs, args.warmup, args.port, args.timeout)
@@ -0,0 +1,101 @@
+"""
+Throughput of the bulk expense import at 100k rows.
+
+Parses a generated CSV, validates it with the Expense model and writes it through a stub
+database client that sleeps for a fixed round-trip time per request. This shows how the
+number of requests, not the per-row work, dominates a per-row import.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_expense_import --rows 100000 --chunk-size 500 --latency-ms 20
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from server.routes.expenses import Expense
+from utils.expense_import import ExpenseImporter, parse_csv
+
+USER_ID = str(uuid.uuid4())
+MERCHANTS = ["Starbucks", "Safeway", "Uber", "Amazon", "Petco", "Local Diner"]
+
+
+class StubQuery:
+    def __init__(self, client, rows):
+        self.client = client
+        self.rows = rows
+
+    async def execute(self):
+        self.client.requests += 1
+        self.client.rows += len(self.rows) if isinstance(self.rows, list) else 1
+        await asyncio.sleep(self.client.latency)
+
+
+class StubTable:
+    def __init__(self, client):
+        self.client = client
+
+    def insert(self, rows):
+        return StubQuery(self.client, rows)
+
+    upsert = insert
+
+
+class StubClient:
+    """Counts requests and rows, and waits `latency` seconds per request like a remote database."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.requests = 0
+        self.rows = 0
+
+    def table(self, name):
+        return StubTable(self)
+
+
+def generate_csv(rows: int) -> bytes:
+    lines = ["date,amount,merchant,category"]
+    for i in range(rows):
+        lines.append(f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d},{(i % 9000) / 100 + 1:.2f},{MERCHANTS[i % len(MERCHANTS)]},")
+    return ("\n".join(lines) + "\n").encode()
+
+
+async def chunks(data: bytes, size: int = 64 * 1024):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def run(data: bytes, chunk_size: int, latency: float) -> tuple:
+    client = StubClient(latency)
+    importer = ExpenseImporter(client, USER_ID, Expense, chunk_size=chunk_size)
+    started = time.perf_counter()
+    async for _ in importer.run(parse_csv(chunks(data))):
+        pass
+    return time.perf_counter() - started, client, importer.counts
+
+
+async def main(rows: int, chunk_size: int, latency_ms: float, per_row_sample: int):
+    data = generate_csv(rows)
+    print(f"{rows} rows, {len(data) / 1e6:.1f} MB of CSV, {latency_ms:.0f} ms per database request")
+
+    seconds, client, counts = await run(data, chunk_size, latency_ms / 1000)
+    print(f"{'mode':<12}{'rows':>9}{'requests':>10}{'seconds':>10}{'rows/s':>12}")
+    print(f"{'batched':<12}{client.rows:>9}{client.requests:>10}{seconds:>10.2f}{client.rows / seconds:>12.0f}")
+
+    # A row per request is too slow to run at full size; time a sample and extrapolate
+    sample = generate_csv(per_row_sample)
+    sample_seconds, sample_client, _ = await run(sample, 1, latency_ms / 1000)
+    projected = sample_seconds / per_row_sample * rows
+    print(f"{'per-row':<12}{rows:>9}{rows:>10}{projected:>10.2f}{rows / projected:>12.0f}  (projected from {per_row_sample} rows)")
+    print(f"speedup: {projected / seconds:.1f}x, results: {counts}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--per-row-sample", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.chunk_size, args.latency_ms, args.per_row_sample))
@@ -0,0 +1,66 @@
+"""
+Goal forecast time as a user's expense history grows.
+
+Generates a synthetic history (several years of daily expenses with a seasonal bump) and
+times forecast_goals for every history size, for a fixed number of goals.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_forecast --sizes 1000 10000 100000 1000000 --goals 20
+"""
+import argparse
+import time
+from datetime import date
+
+import numpy as np
+
+from utils.forecast import forecast_goals
+
+TODAY = date(2025, 6, 15)
+
+
+def synthetic_history(expenses: int, years: int, rng: np.random.Generator) -> tuple:
+    start = np.datetime64(TODAY, "D") - 365 * years
+    dates = start + rng.integers(0, 365 * years, size=expenses)
+    # December costs about 50% more than other months
+    december = dates.astype("datetime64[M]").astype(np.int64) % 12 == 11
+    amounts = rng.gamma(2.0, 15.0, size=expenses) * np.where(december, 1.5, 1.0)
+    return dates, amounts
+
+
+def synthetic_goals(count: int, rng: np.random.Generator) -> list:
+    return [
+        {
+            "target_amount": float(rng.integers(500, 20000)),
+            "current_amount": float(rng.integers(0, 500)),
+            "actionable_amount": float(rng.integers(25, 500)),
+            "frequency": ["weekly", "monthly", "biweekly"][i % 3],
+            "deadline": f"{2026 + i % 4}-12-31",
+        }
+        for i in range(count)
+    ]
+
+
+def main(sizes: list, goals: int, years: int, repeats: int):
+    rng = np.random.default_rng(0)
+    goal_rows = synthetic_goals(goals, rng)
+    print(f"{goals} goals, {years} years of history, best of {repeats}")
+    print(f"{'expenses':>10}{'ms':>10}{'expenses/s':>14}")
+    for size in sizes:
+        dates, amounts = synthetic_history(size, years, rng)
+        best = float("inf")
+        for _ in range(repeats):
+            started = time.perf_counter()
+            forecast_goals(dates, amounts, goal_rows, today=TODAY)
+            best = min(best, time.perf_counter() - started)
+        print(f"{size:>10}{best * 1000:>10.2f}{size / best:>14.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--goals", type=int, default=20)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    main(args.sizes, args.goals, args.years, args.repeats)
@@ -0,0 +1,60 @@
+"""
+Throughput of batched vs unbatched receipt scanning.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_receipt_batching --requests 16 --batch-size 4
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from utils.receipt_scanner import ReceiptScanner, ReceiptScannerPool, BatchingReceiptScanner
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+SAMPLE_RECEIPTS = [
+    os.path.join(REPO_ROOT, "restaurant-receipt-itemized2-sample.jpg"),
+    os.path.join(REPO_ROOT, "FI_receipt_restaurant.jpg"),
+]
+
+
+async def run_concurrent(scanner, requests: int) -> float:
+    """Fire `requests` concurrent scans and return the wall time in seconds."""
+    images = [SAMPLE_RECEIPTS[i % len(SAMPLE_RECEIPTS)] for i in range(requests)]
+    started = time.perf_counter()
+    await asyncio.gather(*(scanner.scan(image) for image in images))
+    return time.perf_counter() - started
+
+
+async def main(requests: int, batch_size: int, batch_window_ms: float, pool_size: int):
+    pool = ReceiptScannerPool(size=pool_size)
+    await pool.start()
+    print(f"Loaded {pool_size} scanner(s) in {pool.load_time.snapshot()['sum']:.1f}s")
+
+    # Warm up so neither run pays for lazy initialisation
+    await pool.scan(SAMPLE_RECEIPTS[0])
+
+    unbatched = await run_concurrent(pool, requests)
+
+    batcher = BatchingReceiptScanner(pool, max_batch_size=batch_size, batch_window=batch_window_ms / 1000)
+    await batcher.start()
+    try:
+        batched = await run_concurrent(batcher, requests)
+    finally:
+        await batcher.stop()
+
+    print(f"{'mode':<10}{'seconds':>10}{'receipts/s':>12}")
+    print(f"{'unbatched':<10}{unbatched:>10.2f}{requests / unbatched:>12.2f}")
+    print(f"{'batched':<10}{batched:>10.2f}{requests / batched:>12.2f}")
+    print(f"speedup: {unbatched / batched:.2f}x (avg batch size {batcher.batch_sizes.snapshot()['avg']:.1f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--batch-window-ms", type=float, default=50)
+    parser.add_argument("--pool-size", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.batch_size, args.batch_window_ms, args.pool_size))
@@ -0,0 +1,97 @@
+"""
+Time to turn a page of expense rows into a JSON response body, per serialization path.
+
+Compares, for the same PostgREST-shaped rows:
+
+- per_row_models: what the expense view used to do, one model_validate_json(json.dumps(row))
+  per row, then FastAPI's response_model pass (validate the list again, jsonable_encoder,
+  JSONResponse)
+- response_model: a single validation through response_model, then JSONResponse
+- json: the raw rows through Starlette's stdlib JSONResponse
+- orjson: the raw rows through ORJSONResponse, as the expense endpoints now return them
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_serialization --rows 10000 --repeats 5
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from server.routes.expenses import Expense
+
+EXPENSE_LIST = TypeAdapter(List[Expense])
+CATEGORIES = ["Food", "Entertainment", "Shopping", "Travel", "Transportation", "Other"]
+
+
+def synthetic_rows(count: int, rng: random.Random) -> list:
+    start = datetime(2024, 1, 1)
+    user_id = str(uuid.uuid4())
+    return [
+        {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "amount": round(rng.uniform(1, 250), 2),
+            "category": rng.choice(CATEGORIES),
+            "business_name": f"Merchant {rng.randrange(500)}",
+            "date": (start + timedelta(minutes=rng.randrange(525600))).isoformat() + "+00:00",
+            "user_id": user_id,
+            "business": None,
+        }
+        for _ in range(count)
+    ]
+
+
+def per_row_models(rows: list) -> bytes:
+    models = [Expense.model_validate_json(json.dumps(row)) for row in rows]
+    return JSONResponse(jsonable_encoder(EXPENSE_LIST.validate_python(models))).body
+
+
+def response_model(rows: list) -> bytes:
+    return JSONResponse(jsonable_encoder(EXPENSE_LIST.validate_python(rows))).body
+
+
+def stdlib_json(rows: list) -> bytes:
+    return JSONResponse(rows).body
+
+
+def orjson_response(rows: list) -> bytes:
+    return ORJSONResponse(rows).body
+
+
+PATHS = {
+    "per_row_models": per_row_models,
+    "response_model": response_model,
+    "json": stdlib_json,
+    "orjson": orjson_response,
+}
+
+
+def main(rows: int, repeats: int):
+    data = synthetic_rows(rows, random.Random(0))
+    baseline = None
+    print(f"{rows} rows, best of {repeats}")
+    print(f"{'path':<16}{'ms':>10}{'rows/s':>12}{'KiB':>8}{'speedup':>9}")
+    for name, render in PATHS.items():
+        best = float("inf")
+        for _ in range(repeats):
+            started = time.perf_counter()
+            body = render(data)
+            best = min(best, time.perf_counter() - started)
+        baseline = baseline or best
+        print(f"{name:<16}{best * 1000:>10.2f}{rows / best:>12.0f}{len(body) / 1024:>8.0f}{baseline / best:>8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    main(args.rows, args.repeats)
@@ -0,0 +1,286 @@
+"""
+In-process stand-ins for Supabase (PostgREST + auth) and the Together chat API.
+
+Both are plain ASGI apps, meant to be mounted with httpx.ASGITransport through the
+`transport` parameters of create_supabase_client and LLMGateway, so the benchmarks run
+offline against the real request path. Every request sleeps for `latency` seconds plus
+up to `jitter` more (seeded, so runs are repeatable) to stand in for the network and the
+database.
+
+The PostgREST stub keeps tables in memory and understands the subset of the query
+syntax the API uses: eq/neq/gt/gte/lt/lte/in filters, select, order and limit. Keyset
+`or=` filters are ignored, so only first pages are meaningful.
+"""
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl
+
+import jwt
+
+STUB_JWT_SECRET = "benchmark-secret-not-for-production"
+
+# Donut output with no recognisable total, so extraction has to ask the LLM
+STUB_SCAN = {"menu": [{"nm": "Flat white", "cnt": "1"}, {"nm": "Croissant", "cnt": "1"}], "store": "Stub Cafe"}
+STUB_EXTRACTION = {"category": "Food", "price": 12.5, "business_name": "Stub Cafe"}
+
+
+def issue_token(user_id: str, email: str, ttl: int = 3600) -> str:
+    """An HS256 access token shaped like Supabase's, signed with STUB_JWT_SECRET."""
+    now = int(time.time())
+    claims = {"sub": user_id, "email": email, "aud": "authenticated", "role": "authenticated", "iat": now, "exp": now + ttl}
+    return jwt.encode(claims, STUB_JWT_SECRET, algorithm="HS256")
+
+
+async def read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def send_json(send, status: int, payload, headers: list = ()):
+    body = json.dumps(payload, default=str).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class _Latency:
+    def __init__(self, latency: float, jitter: float, seed: int):
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+
+    async def wait(self):
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _parse_value(raw: str):
+    raw = raw.strip()
+    if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+        return raw[1:-1]
+    return raw
+
+
+def _compare(value, op: str, raw: str) -> bool:
+    if op == "in":
+        return str(value) in {_parse_value(item) for item in raw.strip("()").split(",")}
+    if op == "is":
+        return value is None if raw == "null" else str(value).lower() == raw
+    target = _parse_value(raw)
+    if value is None:
+        return False
+    value = str(value)
+    return {
+        "eq": value == target,
+        "neq": value != target,
+        "gt": value > target,
+        "gte": value >= target,
+        "lt": value < target,
+        "lte": value <= target,
+    }.get(op, True)
+
+
+class StubPostgREST:
+    """In-memory tables behind a PostgREST-shaped API, plus the auth endpoints the API calls."""
+
+    def __init__(self, latency: float = 0.005, jitter: float = 0.0, seed: int = 0):
+        self.tables = {}
+        self.users = {}
+        self.requests = 0
+        self._latency = _Latency(latency, jitter, seed)
+
+    def table(self, name: str) -> list:
+        return self.tables.setdefault(name, [])
+
+    def seed_user(self, email: str, password: str) -> str:
+        user_id = str(uuid.uuid4())
+        self.users[email] = {"id": user_id, "email": email, "password": password}
+        return user_id
+
+    def _select(self, name: str, params: list) -> list:
+        rows = self.table(name)
+        limit = None
+        order = []
+        for key, value in params:
+            if key == "select" or key == "or":
+                continue
+            if key == "limit":
+                limit = int(value)
+            elif key == "order":
+                order = [part.split(".") for part in value.split(",")]
+            elif "." in value:
+                op, _, raw = value.partition(".")
+                rows = [row for row in rows if _compare(row.get(key), op, raw)]
+        for column, *direction in reversed(order):
+            rows = sorted(rows, key=lambda row: str(row.get(column) or ""), reverse="desc" in direction)
+        return rows[:limit] if limit is not None else list(rows)
+
+    def _insert(self, name: str, payload, upsert: bool) -> list:
+        rows = payload if isinstance(payload, list) else [payload]
+        table = self.table(name)
+        inserted = []
+        now = datetime.now(timezone.utc).isoformat()
+        by_id = {str(row.get("id")): row for row in table} if upsert else {}
+        for row in rows:
+            # The column defaults the API relies on: ids, and expense dates (CURRENT_TIMESTAMP)
+            defaults = {"id": str(uuid.uuid4()), "created_at": now, **({"date": now} if name == "expenses" else {})}
+            row = {**defaults, **row}
+            row["id"] = str(row["id"])
+            existing = by_id.get(row["id"])
+            if existing is not None:
+                existing.update(row)
+                inserted.append(existing)
+            else:
+                table.append(row)
+                inserted.append(row)
+        return inserted
+
+    def _rpc(self, name: str, args: dict):
+        if name == "mutate_owned_row":
+            table = self.table(args["p_table"])
+            row = next((row for row in table if str(row.get("id")) == args["p_id"]), None)
+            if row is None:
+                return {"status": "not_found", "row": None}
+            if str(row.get("user_id")) != args["p_user_id"]:
+                return {"status": "forbidden", "row": None}
+            if args.get("p_patch") is None:
+                table.remove(row)
+            else:
+                row.update(args["p_patch"])
+            return {"status": "ok", "row": row}
+        if name == "spending_summary":
+            return []
+        return None
+
+    def _auth(self, path: str, params: dict, body: dict, headers: dict):
+        if path.endswith("/token") and params.get("grant_type") == "password":
+            user = self.users.get(body.get("email"))
+            if user is None or user["password"] != body.get("password"):
+                return 400, {"error": "invalid_grant", "error_description": "Invalid login credentials"}
+            return 200, {
+                "access_token": issue_token(user["id"], user["email"]),
+                "refresh_token": uuid.uuid4().hex,
+                "token_type": "bearer",
+                "expires_in": 3600,
+                "expires_at": int(time.time()) + 3600,
+                "user": self._auth_user(user),
+            }
+        if path.endswith("/user"):
+            token = headers.get("authorization", "").removeprefix("Bearer ")
+            try:
+                claims = jwt.decode(token, STUB_JWT_SECRET, algorithms=["HS256"], audience="authenticated")
+            except jwt.InvalidTokenError:
+                return 401, {"msg": "Invalid token"}
+            return 200, self._auth_user({"id": claims["sub"], "email": claims.get("email")})
+        return 404, {"msg": f"No stub for {path}"}
+
+    @staticmethod
+    def _auth_user(user: dict) -> dict:
+        return {
+            "id": user["id"],
+            "email": user["email"],
+            "aud": "authenticated",
+            "role": "authenticated",
+            "app_metadata": {"provider": "email"},
+            "user_metadata": {},
+            "created_at": "2025-01-01T00:00:00Z",
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        self.requests += 1
+        await self._latency.wait()
+        body = await read_body(receive)
+        payload = json.loads(body) if body else None
+        params = parse_qsl(scope["query_string"].decode(), keep_blank_values=True)
+        headers = {key.decode().lower(): value.decode() for key, value in scope["headers"]}
+        path = scope["path"]
+
+        if path.startswith("/auth/v1"):
+            status, response = self._auth(path, dict(params), payload or {}, headers)
+            await send_json(send, status, response)
+            return
+
+        resource = path.removeprefix("/rest/v1/")
+        if resource.startswith("rpc/"):
+            await send_json(send, 200, self._rpc(resource.removeprefix("rpc/"), payload or {}))
+            return
+
+        method = scope["method"]
+        if method == "GET":
+            rows = self._select(resource, params)
+        elif method == "POST":
+            rows = self._insert(resource, payload, upsert="resolution=merge-duplicates" in headers.get("prefer", ""))
+        elif method == "PATCH":
+            rows = self._select(resource, params)
+            for row in rows:
+                row.update(payload)
+        elif method == "DELETE":
+            rows = self._select(resource, params)
+            deleted = {id(row) for row in rows}
+            self.tables[resource] = [row for row in self.table(resource) if id(row) not in deleted]
+        else:
+            await send_json(send, 405, {"message": f"{method} not supported by the stub"})
+            return
+        await send_json(send, 201 if method == "POST" else 200, rows, [(b"content-range", f"0-{max(len(rows) - 1, 0)}/*".encode())])
+
+
+class StubChatCompletions:
+    """An OpenAI-compatible /chat/completions endpoint answering every prompt with `content`."""
+
+    def __init__(self, content: str = json.dumps(STUB_EXTRACTION), latency: float = 0.05, jitter: float = 0.0, seed: int = 0):
+        self.content = content
+        self.requests = 0
+        self._latency = _Latency(latency, jitter, seed)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        self.requests += 1
+        request = json.loads(await read_body(receive) or b"{}")
+        await self._latency.wait()
+        if not scope["path"].endswith("/chat/completions"):
+            await send_json(send, 404, {"error": {"message": f"No stub for {scope['path']}"}})
+            return
+        usage = {"prompt_tokens": 200, "completion_tokens": len(self.content) // 4}
+        if not request.get("stream"):
+            await send_json(send, 200, {
+                "id": uuid.uuid4().hex,
+                "object": "chat.completion",
+                "model": request.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": self.content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream")]})
+        for start in range(0, len(self.content), 16):
+            chunk = {"choices": [{"index": 0, "delta": {"content": self.content[start:start + 16]}}]}
+            await send({"type": "http.response.body", "body": f"data: {json.dumps(chunk)}\n\n".encode(), "more_body": True})
+        await send({"type": "http.response.body", "body": b"data: [DONE]\n\n"})
+
+
+class StubReceiptScanner:
+    """Stands in for the Donut pool: every scan takes `latency` seconds and returns STUB_SCAN."""
+
+    def __init__(self, latency: float = 0.2):
+        self.latency = latency
+
+    async def scan(self, image):
+        await asyncio.sleep(self.latency)
+        return STUB_SCAN
+
+    def stats(self) -> dict:
+        return {"size": 1, "stub": True}
@@ -0,0 +1,105 @@
+-- Daily spending rollups per user, maintained incrementally from the expenses table.
+--
+-- Every insert, update and delete on expenses (create_expense, update_expense,
+-- delete_expense, save_receipt_result, or anything else that writes the table) applies a
+-- +/- delta to one row per dimension, so dashboard reads scan O(days * keys) rows instead
+-- of every expense. Expenses without a date are left out of the rollups.
+
+create table if not exists spending_rollups (
+    user_id uuid not null,
+    day date not null,
+    dimension text not null check (dimension in ('total', 'category', 'merchant')),
+    key text not null default '',
+    amount numeric(14, 2) not null default 0,
+    expense_count integer not null default 0,
+    primary key (user_id, dimension, day, key)
+);
+
+create or replace function apply_spending_delta(
+    p_user_id uuid,
+    p_date timestamptz,
+    p_category text,
+    p_merchant text,
+    p_amount numeric,
+    p_count integer
+) returns void
+language plpgsql
+as $$
+declare
+    v_day date := p_date::date;
+begin
+    -- Undated expenses have no day to book against; the backfill skips them too
+    if p_user_id is null or p_date is null then
+        return;
+    end if;
+
+    insert into spending_rollups as r (user_id, day, dimension, key, amount, expense_count)
+    values
+        (p_user_id, v_day, 'total', '', p_amount, p_count),
+        (p_user_id, v_day, 'category', coalesce(p_category, ''), p_amount, p_count),
+        (p_user_id, v_day, 'merchant', coalesce(p_merchant, ''), p_amount, p_count)
+    on conflict (user_id, dimension, day, key) do update
+        set amount = r.amount + excluded.amount,
+            expense_count = r.expense_count + excluded.expense_count;
+
+    -- Drop buckets whose last expense went away so reads stay proportional to live data
+    delete from spending_rollups
+    where user_id = p_user_id and day = v_day and expense_count <= 0;
+end;
+$$;
+
+create or replace function maintain_spending_rollups() returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform apply_spending_delta(old.user_id::uuid, old.date, old.category, old.business_name, -old.amount, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform apply_spending_delta(new.user_id::uuid, new.date, new.category, new.business_name, new.amount, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists expenses_spending_rollups on expenses;
+create trigger expenses_spending_rollups
+    after insert or delete or update of user_id, amount, category, business_name, date on expenses
+    for each row execute function maintain_spending_rollups();
+
+-- Totals by category, by merchant and by day/week/month for [p_start, p_end)
+create or replace function spending_summary(
+    p_user_id uuid,
+    p_start date,
+    p_end date,
+    p_granularity text default 'day'
+) returns table (dimension text, key text, amount numeric, expense_count bigint)
+language sql
+stable
+as $$
+    select r.dimension, r.key, sum(r.amount), sum(r.expense_count)
+    from spending_rollups r
+    where r.user_id = p_user_id
+      and r.dimension in ('category', 'merchant')
+      and r.day >= p_start and r.day < p_end
+    group by r.dimension, r.key
+    union all
+    select 'period', date_trunc(p_granularity, r.day)::date::text, sum(r.amount), sum(r.expense_count)
+    from spending_rollups r
+    where r.user_id = p_user_id
+      and r.dimension = 'total'
+      and r.day >= p_start and r.day < p_end
+    group by 2;
+$$;
+
+-- Backfill from existing expenses (safe to re-run: recomputes every bucket)
+delete from spending_rollups;
+insert into spending_rollups (user_id, day, dimension, key, amount, expense_count)
+select user_id::uuid, date::date, 'total', '', sum(amount), count(*)
+from expenses where user_id is not null and date is not null group by 1, 2
+union all
+select user_id::uuid, date::date, 'category', coalesce(category, ''), sum(amount), count(*)
+from expenses where user_id is not null and date is not null group by 1, 2, 4
+union all
+select user_id::uuid, date::date, 'merchant', coalesce(business_name, ''), sum(amount), count(*)
+from expenses where user_id is not null and date is not null group by 1, 2, 4;
@@ -0,0 +1,91 @@
+-- Running spent-to-date counters per user and budget period, plus over-limit alerts.
+--
+-- Counters are keyed by the period start (date_trunc week/month/year), so a new period
+-- starts a fresh row and the "reset" at period boundaries needs no scheduled job.
+-- Requires 001_spending_rollups.sql.
+
+create table if not exists spending_periods (
+    user_id uuid not null,
+    period text not null check (period in ('week', 'month', 'year')),
+    period_start date not null,
+    spent numeric(14, 2) not null default 0,
+    primary key (user_id, period, period_start)
+);
+
+-- One row per budget and period the first time spending goes over the limit.
+-- Subscribers (the API's realtime listener) are notified of inserts without polling.
+create table if not exists budget_alerts (
+    id bigint generated always as identity primary key,
+    user_id uuid not null,
+    budget_id text not null,
+    budget_name text,
+    period text not null,
+    period_start date not null,
+    spent numeric(14, 2) not null,
+    spending_limit numeric(14, 2) not null,
+    created_at timestamptz not null default now(),
+    unique (budget_id, period_start)
+);
+
+create or replace function apply_spending_delta(
+    p_user_id uuid,
+    p_date timestamptz,
+    p_category text,
+    p_merchant text,
+    p_amount numeric,
+    p_count integer
+) returns void
+language plpgsql
+as $$
+declare
+    v_day date := p_date::date;
+begin
+    -- Undated expenses have no day to book against; the backfill skips them too
+    if p_user_id is null or p_date is null then
+        return;
+    end if;
+
+    insert into spending_rollups as r (user_id, day, dimension, key, amount, expense_count)
+    values
+        (p_user_id, v_day, 'total', '', p_amount, p_count),
+        (p_user_id, v_day, 'category', coalesce(p_category, ''), p_amount, p_count),
+        (p_user_id, v_day, 'merchant', coalesce(p_merchant, ''), p_amount, p_count)
+    on conflict (user_id, dimension, day, key) do update
+        set amount = r.amount + excluded.amount,
+            expense_count = r.expense_count + excluded.expense_count;
+
+    -- Drop buckets whose last expense went away so reads stay proportional to live data
+    delete from spending_rollups
+    where user_id = p_user_id and day = v_day and expense_count <= 0;
+
+    insert into spending_periods as s (user_id, period, period_start, spent)
+    select p_user_id, p.period, date_trunc(p.period, v_day)::date, p_amount
+    from unnest(array['week', 'month', 'year']) as p(period)
+    on conflict (user_id, period, period_start) do update
+        set spent = s.spent + excluded.spent;
+
+    if p_amount > 0 then
+        insert into budget_alerts (user_id, budget_id, budget_name, period, period_start, spent, spending_limit)
+        select p_user_id, b.id::text, b.name, s.period, s.period_start, s.spent, b.spending_limit
+        from budgets b
+        join spending_periods s
+          on s.user_id = p_user_id
+         and s.period = case b.duration when 'weekly' then 'week' when 'monthly' then 'month' else 'year' end
+         and s.period_start = date_trunc(s.period, v_day)::date
+        where b.user_id::uuid = p_user_id
+          and s.spent > b.spending_limit
+        on conflict (budget_id, period_start) do nothing;
+    end if;
+end;
+$$;
+
+-- Backfill the counters from existing expenses (safe to re-run)
+delete from spending_periods;
+insert into spending_periods (user_id, period, period_start, spent)
+select e.user_id::uuid, p.period, date_trunc(p.period, e.date)::date, sum(e.amount)
+from expenses e
+cross join unnest(array['week', 'month', 'year']) as p(period)
+where e.user_id is not null and e.date is not null
+group by 1, 2, 3;
+
+alter publication supabase_realtime add table budget_alerts;
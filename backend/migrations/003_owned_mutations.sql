@@ -0,0 +1,59 @@
+-- Ownership-checked delete/update in one round trip.
+--
+-- The row is changed only if it belongs to p_user_id, and the changed row is returned.
+-- When nothing matched, a primary-key lookup (same statement, no extra request) tells
+-- "not_found" apart from "forbidden".
+--
+-- Returns {"status": "ok" | "not_found" | "forbidden", "row": {...} | null}
+
+create or replace function mutate_owned_row(
+    p_table text,
+    p_id text,
+    p_user_id text,
+    p_patch jsonb default null
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_id_type text;
+    v_assignments text;
+    v_row jsonb;
+    v_owner text;
+    v_exists boolean;
+begin
+    if p_table not in ('budgets', 'goals') then
+        raise exception 'mutate_owned_row does not support table %', p_table;
+    end if;
+
+    -- Compare ids in their own type so the primary key index is used
+    select format_type(atttypid, atttypmod) into v_id_type
+    from pg_attribute
+    where attrelid = p_table::regclass and attname = 'id';
+
+    if p_patch is null then
+        execute format(
+            'delete from %I t where t.id = $1::%s and t.user_id::text = $2 returning to_jsonb(t.*)',
+            p_table, v_id_type
+        ) into v_row using p_id, p_user_id;
+    else
+        select string_agg(format('%I = r.%I', key, key), ', ') into v_assignments
+        from jsonb_object_keys(p_patch - 'id' - 'user_id') as key;
+        if v_assignments is null then
+            raise exception 'mutate_owned_row needs at least one column to update';
+        end if;
+        execute format(
+            'update %I t set %s from jsonb_populate_record(null::%I, $3) r '
+            'where t.id = $1::%s and t.user_id::text = $2 returning to_jsonb(t.*)',
+            p_table, v_assignments, p_table, v_id_type
+        ) into v_row using p_id, p_user_id, p_patch;
+    end if;
+
+    if v_row is not null then
+        return jsonb_build_object('status', 'ok', 'row', v_row);
+    end if;
+
+    execute format('select true, t.user_id::text from %I t where t.id = $1::%s', p_table, v_id_type)
+        into v_exists, v_owner using p_id;
+    return jsonb_build_object('status', case when v_exists then 'forbidden' else 'not_found' end, 'row', null);
+end;
+$$;
@@ -1,3 +1,9 @@
-#from .main import app
+__all__ = ["app"]
 
-__all__ = ["app"]
\ No newline at end of file
+
+def __getattr__(name):
+    # Importing the app builds every router, so only do it when someone asks for it
+    if name == "app":
+        from .main import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
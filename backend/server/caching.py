@@ -0,0 +1,32 @@
+from typing import Optional
+
+from fastapi import Response
+
+from utils.user_cache import UserCache
+
+
+def etag_matches(entry: dict, if_none_match: Optional[str]) -> bool:
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or entry["etag"] in tags
+
+
+async def cached_json(cache: UserCache, user_id, resource: str, variant: str, load, if_none_match: Optional[str] = None) -> Response:
+    """
+    Serve a per-user JSON response through `cache`, answering 304 when the client already has it.
+
+    Args:
+        cache (UserCache): The read-through cache.
+        user_id: Owner of the data; the cache is never shared between users.
+        resource (str): "expenses", "budgets" or "goals", as invalidated by the write handlers.
+        variant (str): Everything else the response depends on, e.g. the query parameters.
+        load: Coroutine function returning (JSON body bytes, extra headers) on a miss.
+        if_none_match (str): The request's If-None-Match header.
+    """
+    entry = await cache.get_or_load(user_id, resource, variant, load)
+    # private: responses are per user, no-cache: revalidate with the ETag every time
+    headers = {**entry["headers"], "ETag": entry["etag"], "Cache-Control": "private, no-cache"}
+    if etag_matches(entry, if_none_match):
+        return Response(status_code=304, headers=headers)
+    return Response(entry["body"], media_type="application/json", headers=headers)
@@ -0,0 +1,46 @@
+from fastapi import HTTPException, Request
+
+from utils.supabase_client import create_auth_client
+
+
+def receipt_scanner_failed(app) -> bool:
+    """True once the background warm-up has finished without a working scanner."""
+    warmup = app.state.receipt_scanner_ready
+    return warmup.done() and (warmup.cancelled() or warmup.exception() is not None)
+
+
+def get_receipt_scanner(request: Request):
+    """Hand out the process-wide receipt scanner (a pool, optionally batched) created in the app lifespan."""
+    if receipt_scanner_failed(request.app) or request.app.state.receipt_scanner is None:
+        raise HTTPException(status_code=503, detail="Receipt scanner failed to load")
+    return request.app.state.receipt_scanner
+
+
+def get_receipt_cache(request: Request):
+    """Hand out the process-wide ReceiptCache created in the app lifespan."""
+    return request.app.state.receipt_cache
+
+
+def get_db(request: Request):
+    """Hand out the shared, connection-pooled Supabase client created in the app lifespan."""
+    return request.app.state.db
+
+
+def get_auth_client(request: Request):
+    """A per-request, session-less auth client for sign-in and sign-up (never the shared client)."""
+    return create_auth_client(request.app.state.db)
+
+
+def get_budget_alerts(request: Request):
+    """Hand out the BudgetAlertBroker created in the app lifespan."""
+    return request.app.state.budget_alerts
+
+
+def get_receipt_jobs(request: Request):
+    """Hand out the persistent ReceiptJobQueue created in the app lifespan."""
+    return request.app.state.receipt_jobs
+
+
+def get_user_cache(request: Request):
+    """Hand out the per-user read-through UserCache."""
+    return request.app.state.user_cache
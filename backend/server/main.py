@@ -1,17 +1,120 @@
-from fastapi import FastAPI, UploadFile, File
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from server.routes import expenses_router, goals_router, suggestions_router, budgets_router, users_router, tracking_router
-from supabase import create_client
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from server.routes import expenses_router, goals_router, suggestions_router, budgets_router, users_router, tracking_router, analytics_router
 import os
+import asyncio
 import dotenv
-from utils import ReceiptScanner
+from utils import create_supabase_client, close_supabase_client, pool_stats, ReceiptScannerPool, BatchingReceiptScanner, OCRWorkerPool, OCRQueueFull, ReceiptCache, ReceiptScannerUnavailable, ReceiptTooLarge, read_upload
+from server.middleware import IdempotencyMiddleware, TimingMiddleware, UploadSizeLimitMiddleware
+from utils.llm_gateway import close_llm_gateways
+from utils.budget_tracker import BudgetAlertBroker
+from utils.receipt_jobs import ReceiptJobQueue, ReceiptJobWorkers
+from utils.idempotency import IdempotencyStore
+from utils.user_cache import UserCache
+from utils.log import get_logger
+from utils.metrics import render_prometheus
+from utils.profiler import profile
+from server.routes.tracking import ingest_receipt
+from server.dependencies import get_receipt_scanner, get_receipt_cache, get_db, receipt_scanner_failed
+from supabase import AsyncClient
 
 dotenv.load_dotenv()
 
-app = FastAPI(swagger_ui_parameters={"withCredentials": True})
 
-supabase_client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+# api: CRUD, auth, analytics and suggestions only, never loads Donut
+# ocr: only the receipt scanning routes
+# all: both (the default)
+MODE = os.getenv("BUDGETBUDDY_MODE", "all")
+if MODE not in ("api", "ocr", "all"):
+    raise ValueError(f"BUDGETBUDDY_MODE must be api, ocr or all, not {MODE!r}")
+SERVES_API = MODE in ("api", "all")
+SERVES_OCR = MODE in ("ocr", "all")
+# /debug/profile samples every thread's stack; keep it off unless asked for
+ENABLE_PROFILER = os.getenv("ENABLE_PROFILER", "0") == "1"
 
+log = get_logger(__name__)
+
+
+async def start_receipt_scanner(app: FastAPI):
+    """Create the receipt scanner and load its model; returns once the model is ready."""
+    # Load the Donut weights once per process instead of once per upload
+    if int(os.getenv("OCR_WORKER_PROCESSES", "0")) > 0:
+        # Scan in separate processes so OCR never holds up the event loop
+        app.state.receipt_scanner = OCRWorkerPool.from_env()
+        await app.state.receipt_scanner.start()
+    else:
+        scanner_pool = ReceiptScannerPool.from_env()
+        app.state.receipt_scanner = scanner_pool
+        if int(os.getenv("RECEIPT_BATCH_SIZE", "1")) > 1:
+            # Group concurrent uploads into one Donut pass
+            app.state.receipt_scanner = BatchingReceiptScanner.from_env(scanner_pool)
+            await app.state.receipt_scanner.start()
+        await scanner_pool.start()
+
+
+def _report_scanner_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        log.error("receipt_scanner_load_failed", error=repr(task.exception()))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client for every router instead of one per module or request
+    app.state.db = await create_supabase_client()
+    if SERVES_API:
+        app.state.budget_alerts = BudgetAlertBroker()
+        await app.state.budget_alerts.start(app.state.db)
+    if SERVES_OCR:
+        app.state.receipt_cache = ReceiptCache.from_env()
+        # Stays None if building the scanner fails (e.g. a malformed env var)
+        app.state.receipt_scanner = None
+        warmup = asyncio.create_task(start_receipt_scanner(app))
+        if os.getenv("RECEIPT_SCANNER_WARMUP", "background") == "startup":
+            await warmup
+        else:
+            # Serve /health and CRUD right away; scans queue until the model is loaded.
+            # sleep(0) lets the warm-up create the scanner's queues before the first request.
+            warmup.add_done_callback(_report_scanner_failure)
+            await asyncio.sleep(0)
+        app.state.receipt_scanner_ready = warmup
+        # Uploads to /api/receipts/jobs are persisted here and processed in the background
+        app.state.receipt_jobs = ReceiptJobQueue.from_env()
+        app.state.receipt_job_workers = ReceiptJobWorkers.from_env(
+            app.state.receipt_jobs,
+            lambda job: ingest_receipt(job["image"], job["user_id"], app.state.receipt_scanner, app.state.receipt_cache, app.state.db, app.state.user_cache),
+            # An unreadable image will not get better on retry
+            permanent_errors=(FileNotFoundError,)
+        )
+        await app.state.receipt_job_workers.start()
+    yield
+    if SERVES_OCR:
+        await app.state.receipt_job_workers.stop()
+        app.state.receipt_jobs.close()
+        app.state.receipt_scanner_ready.cancel()
+        if isinstance(app.state.receipt_scanner, OCRWorkerPool):
+            await app.state.receipt_scanner.shutdown()
+        elif isinstance(app.state.receipt_scanner, BatchingReceiptScanner):
+            await app.state.receipt_scanner.stop()
+        app.state.receipt_cache.close()
+    if SERVES_API:
+        await app.state.budget_alerts.stop()
+    await close_llm_gateways()
+    await app.state.user_cache.aclose()
+    await close_supabase_client(app.state.db)
+
+
+app = FastAPI(swagger_ui_parameters={"withCredentials": True}, lifespan=lifespan, default_response_class=ORJSONResponse)
+app.state.idempotency = IdempotencyStore.from_env()
+app.state.user_cache = UserCache.from_env()
+
+# Innermost, so replayed responses still get fresh CORS headers
+app.add_middleware(
+    IdempotencyMiddleware,
+    store=app.state.idempotency,
+    prefixes=("/api/expenses", "/api/budgets", "/api/goals", "/api/track-receipt", "/api/receipts/jobs"),
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,38 +127,88 @@ app.add_middleware(
     allow_credentials=True,  # Allow cookies/session authentication
     allow_methods=["*"],  # Allow all HTTP methods
     allow_headers=["*"],  # Allow all headers
-    expose_headers=["set-cookie"]
+    expose_headers=["set-cookie", "X-Next-Cursor", "Idempotent-Replayed"]
 )
 
+# Refuse oversized receipt uploads before their bodies are read
+app.add_middleware(UploadSizeLimitMiddleware, paths=("/photo-receipts/", "/api/track-receipt", "/api/receipts/jobs"))
+
+# Outermost, so per-route latency includes every other middleware
+app.add_middleware(TimingMiddleware)
 
 # Include routers
-app.include_router(expenses_router)
-app.include_router(goals_router)
-app.include_router(tracking_router)
-app.include_router(users_router)
-app.include_router(suggestions_router)
-app.include_router(budgets_router)
+if SERVES_API:
+    app.include_router(expenses_router)
+    app.include_router(goals_router)
+    app.include_router(users_router)
+    app.include_router(suggestions_router)
+    app.include_router(budgets_router)
+    app.include_router(analytics_router)
+if SERVES_OCR:
+    app.include_router(tracking_router)
 
 @app.get("/health")
 async def health():
     return {"message": "Health Check"}
 
+async def receipt_scanner_health(request: Request, cache: ReceiptCache = Depends(get_receipt_cache)):
+    warmup = request.app.state.receipt_scanner_ready
+    # Ready only once the model loaded; a failed warm-up is reported instead of looking done
+    status = {"ready": warmup.done() and not receipt_scanner_failed(request.app)}
+    if receipt_scanner_failed(request.app):
+        status["error"] = "cancelled" if warmup.cancelled() else repr(warmup.exception())
+    scanner = request.app.state.receipt_scanner
+    return {**status, **(scanner.stats() if scanner is not None else {}), "cache": cache.stats()}
+
+@app.get("/health/db")
+async def db_health(db: AsyncClient = Depends(get_db)):
+    return pool_stats(db)
+
+@app.get("/health/user-cache")
+async def user_cache_health(request: Request):
+    return request.app.state.user_cache.stats()
+
+@app.get("/health/idempotency")
+async def idempotency_health(request: Request):
+    return request.app.state.idempotency.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Latency histograms and stage timings in the Prometheus text format."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+async def debug_profile(seconds: float = Query(default=10, gt=0, le=60)):
+    """Sample the process for `seconds` and return collapsed stacks for a flamegraph."""
+    if not ENABLE_PROFILER:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(await profile(seconds))
+
 # TODO: Update user's budget based on receipt
-@app.post("/photo-receipts/")
-async def create_photo_receipt(file: UploadFile = File(...)):
-    # Save the uploaded file temporarily
-    temp_file_path = f"temp_{file.filename}"
+async def create_photo_receipt(
+    file: UploadFile = File(...),
+    scanner: ReceiptScannerPool = Depends(get_receipt_scanner),
+    cache: ReceiptCache = Depends(get_receipt_cache)
+):
     try:
-        contents = await file.read()
-        with open(temp_file_path, "wb") as f:
-            f.write(contents)
+        contents = await read_upload(file)
         
-        # Process the receipt
-        scanner = ReceiptScanner()
-        result = scanner.scan_receipt(temp_file_path)
+        cached = cache.get(contents)
+        if cached is not None:
+            return cached["scan"]
+        
+        # Process the receipt straight from memory
+        result = await scanner.scan(contents)
+        cache.put(contents, result)
         
         return result
-    finally:
-        # Clean up the temporary file
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
\ No newline at end of file
+    except ReceiptTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except OCRQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except ReceiptScannerUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+if SERVES_OCR:
+    app.get("/health/receipt-scanner")(receipt_scanner_health)
+    app.post("/photo-receipts/")(create_photo_receipt)
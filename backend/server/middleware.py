@@ -0,0 +1,197 @@
+import hashlib
+import re
+import time
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from utils.idempotency import IdempotencyConflict, IdempotencyStore
+from utils.metrics import get_histogram
+from utils.receipt_scanner import MAX_UPLOAD_BYTES
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject uploads to `paths` whose declared Content-Length exceeds `max_bytes`.
+
+    This answers 413 before the multipart body is read at all; uploads without a
+    Content-Length are still capped while being read by `read_upload`.
+    """
+
+    def __init__(self, app: ASGIApp, paths: tuple = (), max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.paths = set(paths)
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and scope["path"] in self.paths:
+            headers = dict(scope["headers"])
+            content_length = headers.get(b"content-length")
+            if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+                response = JSONResponse(
+                    status_code=413,
+                    content={"detail": f"Receipt image is larger than {self.max_bytes} bytes"},
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class TimingMiddleware:
+    """
+    Record every HTTP request in the `http_request_duration_seconds` histogram.
+
+    Requests are labelled with the route template (`/api/goals/{goal_id}`, not the raw
+    path) so that ids do not blow up the number of series; unmatched paths share one label.
+    The clock stops when the last body chunk is sent, so streamed responses count in full.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            get_histogram(
+                "http_request_duration_seconds",
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status),
+            ).observe(time.perf_counter() - started)
+
+
+# Responses that say "try again" must not be replayed to the retry
+UNSTORED_STATUSES = {408, 429}
+
+MULTIPART_BOUNDARY = re.compile(rb'boundary="?([^";]+)"?', re.IGNORECASE)
+
+
+def body_fingerprint(content_type: bytes, body: bytes) -> bytes:
+    """
+    Digest of a request body for comparing retries.
+
+    Multipart boundaries are random per request, so a retried upload differs byte for
+    byte; those bodies are digested part by part (headers and contents) without them.
+    """
+    boundary = MULTIPART_BOUNDARY.search(content_type) if content_type.startswith(b"multipart/") else None
+    if boundary is None:
+        return hashlib.sha256(body).digest()
+    # Drop the preamble before the first delimiter and the "--" and epilogue after the last
+    parts = (b"\r\n" + body).split(b"\r\n--" + boundary.group(1))[1:-1]
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(hashlib.sha256(part).digest())
+    return digest.digest()
+
+
+class IdempotencyMiddleware:
+    """
+    Honour an `Idempotency-Key` header on write requests under `prefixes`.
+
+    The first request with a key runs normally and its response is kept in `store`;
+    retries with the same key get that response back (marked `Idempotent-Replayed: true`)
+    without touching the handler, and retries that arrive while it is still running wait
+    for it. Keys are scoped to the caller's credentials (or address, for anonymous
+    callers) and the method and path, and reusing a key for a different body or upload
+    is answered with 422. Server errors, 408/429 and responses larger than
+    `max_response_bytes` are not kept, so they can be retried.
+    Request bodies are buffered to fingerprint them, up to `max_request_bytes`.
+    """
+
+    def __init__(self, app: ASGIApp, store: IdempotencyStore, prefixes: tuple = (), methods: tuple = ("POST", "PUT", "PATCH", "DELETE"), max_response_bytes: int = 1024 * 1024, max_request_bytes: int = 2 * MAX_UPLOAD_BYTES):
+        self.app = app
+        self.store = store
+        self.prefixes = tuple(prefixes)
+        self.methods = set(methods)
+        self.max_response_bytes = max_response_bytes
+        self.max_request_bytes = max_request_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in self.methods or not scope["path"].startswith(self.prefixes):
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        idempotency_key = headers.get(b"idempotency-key")
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not 0 < len(idempotency_key) <= 255:
+            await JSONResponse(status_code=400, content={"detail": "Idempotency-Key must be 1 to 255 characters"})(scope, receive, send)
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if len(body) > self.max_request_bytes:
+                await JSONResponse(status_code=413, content={"detail": f"Request body is larger than {self.max_request_bytes} bytes"})(scope, receive, send)
+                return
+            if not message.get("more_body"):
+                break
+
+        credentials = headers.get(b"authorization", b"") + b"|" + headers.get(b"cookie", b"")
+        if credentials == b"|" and scope.get("client"):
+            # Anonymous callers do not share one key space
+            credentials += scope["client"][0].encode()
+        key = hashlib.sha256(b"|".join((credentials, scope["method"].encode(), scope["path"].encode(), idempotency_key))).hexdigest()
+        fingerprint = hashlib.sha256(scope["query_string"] + b"|" + body_fingerprint(headers.get(b"content-type", b""), body)).hexdigest()
+
+        try:
+            stored = await self.store.acquire(key, fingerprint)
+        except IdempotencyConflict as e:
+            await JSONResponse(status_code=422, content={"detail": str(e)})(scope, receive, send)
+            return
+        if stored is not None:
+            await send({"type": "http.response.start", "status": stored["status"], "headers": [*stored["headers"], (b"idempotent-replayed", b"true")]})
+            await send({"type": "http.response.body", "body": stored["body"]})
+            return
+
+        body_sent = False
+
+        async def replay_body():
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        response = {"status": None, "headers": [], "body": b""}
+        storable = True
+
+        async def capture(message):
+            nonlocal storable
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body" and storable:
+                response["body"] += message.get("body", b"")
+                if len(response["body"]) > self.max_response_bytes:
+                    storable = False
+                    response["body"] = b""
+            await send(message)
+
+        complete = False
+        try:
+            await self.app(scope, replay_body, capture)
+            complete = True
+        finally:
+            keep = complete and storable and response["status"] is not None and response["status"] < 500 and response["status"] not in UNSTORED_STATUSES
+            self.store.release(key, response if keep else None)
@@ -4,6 +4,7 @@ from .tracking import router as tracking_router
 from .users import router as users_router
 from .budgets import router as budgets_router
 from .suggestions import router as suggestions_router
+from .analytics import router as analytics_router
 
 __all__ = [
     "expenses_router",
@@ -12,4 +13,5 @@ __all__ = [
     "budgets_router",
     "users_router",
     "tracking_router",
+    "analytics_router",
 ]
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from datetime import date, timedelta
+from typing import Optional, Literal
+from supabase import AsyncClient
+from .users import get_current_user
+from server.dependencies import get_db
+from utils.analytics import spending_summary
+
+router = APIRouter()
+
+
+@router.get("/api/analytics/spending")
+async def get_spending(
+    start: Optional[date] = Query(None, description="First day of the range (defaults to 30 days before end)"),
+    end: Optional[date] = Query(None, description="Last day of the range, inclusive (defaults to today)"),
+    granularity: Literal["day", "week", "month"] = "day",
+    current_user: dict = Depends(get_current_user),
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Total the current user's spending by category, by merchant and by day/week/month.
+
+    Args:
+        start (date): First day of the range.
+        end (date): Last day of the range, inclusive.
+        granularity (str): Period size for the time series.
+        current_user (User): The current authenticated user.
+
+    Returns:
+        dict: The overall total and the totals by category, merchant and period.
+    """
+    end = end or date.today()
+    start = start or end - timedelta(days=30)
+    try:
+        return await spending_summary(db, current_user.id, start, end + timedelta(days=1), granularity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,15 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi.responses import StreamingResponse
 import os
+import json
+import orjson
+import asyncio
+from datetime import date
 from .users import get_current_user  # Assuming you have a way to get the current user
 from typing import Optional, Literal
 from pydantic import BaseModel
-from utils.supabase_client import supabase_client
+from supabase import AsyncClient
+from server.caching import cached_json
+from server.dependencies import get_db, get_budget_alerts, get_user_cache
+from utils.database import mutate_owned
+from utils.budget_tracker import BudgetAlertBroker, attach_utilization, current_spending
+from utils.user_cache import UserCache
 from server.schemas import Budget
 router = APIRouter()
 
 
 @router.post("/api/budgets/create", response_model=Budget)
-async def create_budget(budget: Budget, current_user: dict = Depends(get_current_user)):
+async def create_budget(budget: Budget, current_user: dict = Depends(get_current_user), db: AsyncClient = Depends(get_db), user_cache: UserCache = Depends(get_user_cache)):
     """
     Create a new budget.
 
@@ -23,17 +33,27 @@ async def create_budget(budget: Budget, current_user: dict = Depends(get_current
 
     budget.user_id = current_user.id  
 
-    response = supabase_client.table("budgets").insert(budget.dict(exclude={"id"})).execute()
+    response = await db.table("budgets").insert(budget.dict(exclude={"id"})).execute()
 
     if not response.data:
         raise HTTPException(status_code=response.status_code, detail=response.data)
 
+    await user_cache.invalidate(current_user.id, "budgets")
     return response.data[0]
 
 @router.get("/api/budgets/view")
-async def view_budgets(current_user: dict = Depends(get_current_user)):
+async def view_budgets(
+    current_user: dict = Depends(get_current_user),
+    db: AsyncClient = Depends(get_db),
+    user_cache: UserCache = Depends(get_user_cache),
+    if_none_match: Optional[str] = Header(default=None)
+):
     """
-    View all budgets for the current user.
+    View all budgets for the current user, each with how much of it has been spent in the
+    current period (spent, remaining, utilization, over_limit).
+
+    Served from the per-user cache until a budget or expense changes; send the ETag back
+    in If-None-Match to get a 304 when nothing did.
 
     Args:
         current_user (User): The current authenticated user.
@@ -41,13 +61,38 @@ async def view_budgets(current_user: dict = Depends(get_current_user)):
     Returns:
         List[Budget]: The list of budgets for the current user.
     """
-    
-    data = supabase_client.table("budgets").select("*").eq("user_id", current_user.id).execute()
-    
-    return data.data
+    async def load():
+        data, spending = await asyncio.gather(
+            db.table("budgets").select("*").eq("user_id", current_user.id).execute(),
+            current_spending(db, current_user.id)
+        )
+        return orjson.dumps(attach_utilization(data.data, spending), default=str), {}
+
+    # Periods roll over at midnight, so the day is part of the key
+    return await cached_json(user_cache, current_user.id, "budgets", date.today().isoformat(), load, if_none_match)
+
+@router.get("/api/budgets/events")
+async def budget_events(current_user: dict = Depends(get_current_user), alerts: BudgetAlertBroker = Depends(get_budget_alerts)):
+    """
+    Stream over-limit alerts for the current user's budgets as server-sent events.
+
+    Sends an `over_limit` event the first time a budget goes over its limit in a period,
+    and a comment every 15 seconds to keep the connection open.
+    """
+    async def events():
+        with alerts.subscribe(current_user.id) as queue:
+            while True:
+                try:
+                    alert = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: over_limit\ndata: {json.dumps(alert, default=str)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @router.delete("/api/budgets/delete/{budget_id}")
-async def delete_budget(budget_id: str, current_user: dict = Depends(get_current_user)):
+async def delete_budget(budget_id: str, current_user: dict = Depends(get_current_user), db: AsyncClient = Depends(get_db), user_cache: UserCache = Depends(get_user_cache)):
     """
     Delete a budget by its ID.
 
@@ -58,20 +103,13 @@ async def delete_budget(budget_id: str, current_user: dict = Depends(get_current
     Returns:
         dict: A message indicating successful deletion.
     """
-    budget_data = supabase_client.table("budgets").select("*").eq("id", budget_id).execute()
+    status, deleted = await mutate_owned(db, "budgets", budget_id, current_user.id)
 
-    if not budget_data.data:
+    if status == "not_found":
         raise HTTPException(status_code=404, detail="Budget not found")
+    if status == "forbidden":
+        raise HTTPException(status_code=403, detail="User not authorized to delete this budget")
 
-    user_data = supabase_client.table("budgets").select("*").eq("id", budget_id).eq("user_id", current_user.id).execute().data[0] if supabase_client.table("budgets").select("*").eq("id", budget_id).eq("user_id", current_user.id).execute().data else None
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not authorized to delete this budget")
-
-    delete_response = supabase_client.table("budgets").delete().eq("id", budget_id).execute()
-    
-    # Check if the delete was successful
-    if not delete_response.data:
-        raise HTTPException(status_code=delete_response.status_code, detail="Failed to delete the budget")
-
-    budget_name = delete_response.data[0]["name"]
+    await user_cache.invalidate(current_user.id, "budgets")
+    budget_name = deleted["name"]
     return {"message": f"Budget '{budget_name}' deleted successfully"}
@@ -1,20 +1,24 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Header, UploadFile, File
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import List, Optional, Literal
 from pydantic import BaseModel
 import pydantic_core
 from postgrest.exceptions import APIError
 from datetime import datetime
-from utils.supabase_client import supabase_client
 from .users import get_current_user
 from uuid import UUID
 from datetime import datetime
 
-import os
-from supabase import create_client as open_sb, PostgrestAPIResponse as APIResponse
+from supabase import AsyncClient, PostgrestAPIResponse as APIResponse
 
-import json
+import orjson
 
 import utils.auth as bb_auth
+from server.caching import cached_json
+from server.dependencies import get_db, get_user_cache
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, apply_keyset, split_page
+from utils.expense_import import IMPORT_CHUNK_ROWS, PARSERS, ExpenseImporter, delete_expenses, detect_format
+from utils.user_cache import EXPENSE_RESOURCES, UserCache
 
 router = APIRouter()
 
@@ -29,33 +33,131 @@ class Expense(BaseModel):
     user_id: Optional[str] = None
     business: Optional[str] = None
 
+class ExpenseListParams:
+    """
+    Paging, projection and filter parameters shared by the expense listing endpoints.
+
+    Pages are newest first, keyed on (date, id), with undated expenses last; the cursor for
+    the next page is returned in the X-Next-Cursor header. Without `limit` or `cursor`, every
+    matching expense is returned at once, as before paging existed; a cursor without a
+    `limit` continues in pages of DEFAULT_PAGE_SIZE. `fields` limits the returned columns
+    (id and date are always included so the cursor can be built). Send `format=ndjson` or
+    `Accept: application/x-ndjson` to receive the page as newline-delimited JSON.
+    """
+
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit (with no cursor) for every expense"),
+        cursor: Optional[str] = None,
+        fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+        start: Optional[datetime] = Query(None, description="Only expenses on or after this time"),
+        end: Optional[datetime] = Query(None, description="Only expenses before this time"),
+        category: Optional[str] = Query(None, description="Comma-separated categories"),
+        format: Optional[Literal["json", "ndjson"]] = None,
+        accept: Optional[str] = Header(default=None),
+    ):
+        self.limit = DEFAULT_PAGE_SIZE if limit is None and cursor else limit
+        self.cursor = cursor
+        self.start = start
+        self.end = end
+        self.categories = [name.strip() for name in category.split(",") if name.strip()] if category else []
+        self.ndjson = format == "ndjson" or (format is None and "application/x-ndjson" in (accept or ""))
+        self.columns = None
+        if fields:
+            columns = {name.strip() for name in fields.split(",") if name.strip()}
+            unknown = columns - set(Expense.model_fields)
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown expense fields: {sorted(unknown)}")
+            self.columns = ["id", "date", *sorted(columns - {"id", "date"})]
+
+    @property
+    def select(self) -> str:
+        return ",".join(self.columns) if self.columns else "*"
+
+    @property
+    def cache_variant(self) -> str:
+        """Everything a JSON page depends on, as a cache key."""
+        bounds = [value.isoformat() if value else "" for value in (self.start, self.end)]
+        return "|".join([str(self.limit), self.cursor or "", self.select, *bounds, ",".join(sorted(self.categories))])
+
+async def list_expenses(client, user_id, params: ExpenseListParams):
+    """
+    Fetch one page of a user's expenses with filters pushed down into the query.
+
+    Returns:
+        tuple: The page rows and the cursor for the next page (None on the last page).
+    """
+    query = client.table("expenses").select(params.select).eq("user_id", user_id)
+    if params.start:
+        query = query.gte("date", params.start.isoformat())
+    if params.end:
+        query = query.lt("date", params.end.isoformat())
+    if params.categories:
+        query = query.in_("category", params.categories)
+    try:
+        query = apply_keyset(query, params.cursor, params.limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return split_page((await query.execute()).data, params.limit)
+
+def expense_page_response(rows, next_cursor, params: ExpenseListParams):
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if params.ndjson:
+        return StreamingResponse(
+            (orjson.dumps(row) + b"\n" for row in rows),
+            media_type="application/x-ndjson",
+            headers=headers
+        )
+    # Rows come straight from PostgREST, so they are already JSON-shaped: no model round trip
+    return ORJSONResponse(rows, headers=headers)
+
+async def cached_expense_page(db, user_cache: UserCache, user_id, params: ExpenseListParams, if_none_match: Optional[str], not_found: bool = False):
+    """
+    Serve a JSON page of expenses through the per-user cache (NDJSON pages are not cached).
+
+    With `not_found`, an empty first page is a 404, as GET /api/expenses/view has always done.
+    """
+    async def page():
+        rows, next_cursor = await list_expenses(db, user_id, params)
+        if not_found and not rows and not params.cursor:
+            raise HTTPException(status_code=404, detail="Expenses not found")
+        return rows, next_cursor
+
+    async def load():
+        rows, next_cursor = await page()
+        return orjson.dumps(rows), {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+    if params.ndjson:
+        return expense_page_response(*await page(), params)
+    return await cached_json(user_cache, user_id, "expenses", params.cache_variant, load, if_none_match)
+
 @router.get("/api/expenses/view", response_model=List[Expense])
-async def get_expenses(current_user = Depends(get_current_user)):
+async def get_expenses(
+    params: ExpenseListParams = Depends(),
+    current_user = Depends(get_current_user),
+    db: AsyncClient = Depends(get_db),
+    user_cache: UserCache = Depends(get_user_cache),
+    if_none_match: Optional[str] = Header(default=None)
+):
     """
-    Fetch expenses for the authenticated user.
+    Fetch a page of expenses for the authenticated user.
     """
-    result = (
-        supabase_client
-        .table("expenses")
-        .select("*")
-        .filter("user_id", "eq", current_user.id)
-        .execute()
-    )
-    if not result.data:
-        # You can return an empty list instead of raising 404 if you prefer:
-        # return []
-        raise HTTPException(status_code=404, detail="Expenses not found")
-    return [Expense(**expense) for expense in result.data]
+    # You can return an empty list instead of raising 404 if you prefer: pass not_found=False
+    return await cached_expense_page(db, user_cache, current_user.id, params, if_none_match, not_found=True)
 
 @router.get("/api/expenses/", response_model=List[Expense])
-async def get_expenses(current_user: dict = Depends(get_current_user)):
-    result = supabase_client.table("expenses").select("*").eq("user_id", current_user.id).execute()
-
-    return result.data
+async def get_expenses(
+    params: ExpenseListParams = Depends(),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncClient = Depends(get_db),
+    user_cache: UserCache = Depends(get_user_cache),
+    if_none_match: Optional[str] = Header(default=None)
+):
+    return await cached_expense_page(db, user_cache, current_user.id, params, if_none_match)
 
 
 @router.put("/api/expenses/update/{expense_id}", response_model=Expense)
-async def update_expense(expense_id: str, expense: Expense, current_user = Depends(get_current_user)):
+async def update_expense(expense_id: str, expense: Expense, current_user = Depends(get_current_user), db: AsyncClient = Depends(get_db), user_cache: UserCache = Depends(get_user_cache)):
     """
     Update an existing expense record. 
     (Optionally, filter by user_id to ensure users can only update their own expenses.)
@@ -70,8 +172,8 @@ async def update_expense(expense_id: str, expense: Expense, current_user = Depen
         update_data["date"] = None  # Ensures null value is handled
 
     # Example (RECOMMENDED): Only update if user_id matches the current user
-    result = (
-        supabase_client
+    result = await (
+        db
         .table("expenses")
         .update(update_data)
         .eq("id", expense_id)
@@ -80,16 +182,17 @@ async def update_expense(expense_id: str, expense: Expense, current_user = Depen
     )
     if not result.data:
         raise HTTPException(status_code=500, detail="Failed to update expense")
+    await user_cache.invalidate(current_user.id, *EXPENSE_RESOURCES)
     return result.data[0]
 
 
 @router.delete("/api/expenses/delete/{expense_id}")
-async def delete_expense(expense_id: str, current_user = Depends(get_current_user)):
+async def delete_expense(expense_id: str, current_user = Depends(get_current_user), db: AsyncClient = Depends(get_db), user_cache: UserCache = Depends(get_user_cache)):
     """
     Delete an expense record belonging to the authenticated user.
     """
-    result = (
-        supabase_client
+    result = await (
+        db
         .table("expenses")
         .delete()
         .eq("id", expense_id)
@@ -98,6 +201,7 @@ async def delete_expense(expense_id: str, current_user = Depends(get_current_use
     )
     if not result.data:
         raise HTTPException(status_code=500, detail="Failed to delete expense")
+    await user_cache.invalidate(current_user.id, *EXPENSE_RESOURCES)
     return {"message": "Expense deleted"}
 @router.delete("/expenses/{expense_id}")
 async def delete_expense(expense_id: int):
@@ -105,7 +209,7 @@ async def delete_expense(expense_id: int):
     return {"message": "Expense deleted"} 
 
 @router.post("/api/expenses/create", response_model=bool)
-async def create_expense(body: dict):
+async def create_expense(body: dict, db: AsyncClient = Depends(get_db), user_cache: UserCache = Depends(get_user_cache)):
     """
     Add a new expense to the database of expenses. Returns a boolean indicating whether or not the action
     succeeded.
@@ -128,27 +232,28 @@ async def create_expense(body: dict):
     be added has a user id not matching the provided session id, the command will fail.
     """
     session_id: int = body["session_id"]
-    new_expense: str = json.dumps(body["new_expense"])
     try:
-        new_expense = Expense.model_validate_json(new_expense)
+        # Validated once, straight from the parsed body
+        new_expense = Expense.model_validate(body["new_expense"])
     except pydantic_core._pydantic_core.ValidationError as err:
         raise HTTPException(status_code=400, detail=err.errors())
     if new_expense.user_id != bb_auth.get_user_from_session(session_id):
         raise HTTPException(status_code=403, detail="Invalid session ID")
-    supabase = open_sb(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
     try:
-        result = (
-            supabase.table("expenses").insert(json.loads(new_expense.json())).execute()
+        result = await (
+            db.table("expenses").insert(new_expense.model_dump(mode="json")).execute()
         )
+        await user_cache.invalidate(new_expense.user_id, *EXPENSE_RESOURCES)
         return len(result.data) > 0
     except APIError as err:
         return False
 
 
 @router.post("/api/expenses/view", response_model=List[Expense])
-async def get_expenses(body: dict):
+async def get_expenses(body: dict, params: ExpenseListParams = Depends(), db: AsyncClient = Depends(get_db)):
     """
-    Retrive the expenses in the database for the current user.
+    Retrive a page of the expenses in the database for the current user. Accepts the same
+    query parameters as GET /api/expenses/view.
 
     Example request body:
 
@@ -162,16 +267,15 @@ async def get_expenses(body: dict):
     user_id = bb_auth.get_user_from_session(session_id)
     if user_id == -1:
         raise HTTPException(status_code=403, detail="Invalid session ID")
-    supabase = open_sb(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
     try:
-        result = supabase.table("expenses").select("*").eq("user_id", user_id).execute()
-        return [Expense.model_validate_json(json.dumps(obj)) for obj in result.data]
+        rows, next_cursor = await list_expenses(db, user_id, params)
+        return expense_page_response(rows, next_cursor, params)
     except APIError as err:
         return []
 
 
 @router.post("/api/expenses/delete", response_model=bool)
-async def delete_expense(body: dict):
+async def delete_expense(body: dict, db: AsyncClient = Depends(get_db), user_cache: UserCache = Depends(get_user_cache)):
     """
     Deletes the selected expense from the database. Returns a boolean indicating whether or not the
     action succeeded.
@@ -190,12 +294,101 @@ async def delete_expense(body: dict):
     user_id = bb_auth.get_user_from_session(session_id)
     if user_id == -1:
         raise HTTPException(status_code=403, detail="Invalid session ID")
-    supabase = open_sb(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
-    result = (
-        supabase.table("expenses")
+    result = await (
+        db.table("expenses")
         .delete()
         .eq("user_id", user_id)
         .eq("id", expense_id)
         .execute()
     )
+    await user_cache.invalidate(user_id, *EXPENSE_RESOURCES)
     return len(result.data) > 0
+
+
+class BulkDelete(BaseModel):
+    ids: List[str]
+
+async def _iterate(rows):
+    for row in rows:
+        yield row
+
+async def _read_chunks(file: UploadFile, size: int = 64 * 1024):
+    while chunk := await file.read(size):
+        yield chunk
+
+@router.post("/api/expenses/bulk")
+async def bulk_create_expenses(
+    expenses: List[dict],
+    mode: Literal["insert", "upsert"] = "insert",
+    current_user = Depends(get_current_user),
+    db: AsyncClient = Depends(get_db),
+    user_cache: UserCache = Depends(get_user_cache)
+):
+    """
+    Create (or, with mode=upsert, create or update) many expenses in one call.
+
+    Rows are validated with the Expense model and written in multi-row batches of
+    IMPORT_CHUNK_ROWS. Missing ids are generated and user_id is always the current user.
+
+    Returns:
+        dict: Counts per status and one result per row, in request order, with status
+        written, skipped (a credit), invalid, forbidden (the id belongs to someone else) or
+        failed.
+    """
+    importer = ExpenseImporter(db, current_user.id, Expense, mode=mode)
+    try:
+        results = [result async for result in importer.run(_iterate(expenses))]
+    finally:
+        await user_cache.invalidate(current_user.id, *EXPENSE_RESOURCES)
+    return {**importer.counts, "results": results}
+
+@router.post("/api/expenses/import")
+async def import_expenses(
+    file: UploadFile = File(...),
+    format: Optional[Literal["csv", "ndjson", "ofx"]] = None,
+    mode: Literal["insert", "upsert"] = "insert",
+    amounts: Optional[Literal["signed", "positive"]] = Query(None, description="signed: debits are negative and positive rows are credits (bank statements); positive: every row is an expense. Defaults to signed for OFX, positive otherwise"),
+    current_user = Depends(get_current_user),
+    db: AsyncClient = Depends(get_db),
+    user_cache: UserCache = Depends(get_user_cache)
+):
+    """
+    Import a CSV, NDJSON or OFX/QFX file of expenses, e.g. a bank statement export.
+
+    The upload is parsed and written IMPORT_CHUNK_ROWS rows at a time, so parsed rows are
+    held one chunk at a time; the response still lists every row. Credits (a "credit" type
+    column, or a positive amount in a signed statement) are skipped. OFX amounts are always
+    signed; CSV and NDJSON, such as the app's own export, are read as positive expenses
+    unless `amounts=signed` is passed.
+
+    Returns:
+        dict: Counts per status and one result per row, in file order, with status written,
+        skipped (a credit), invalid, forbidden or failed.
+    """
+    try:
+        format = format or detect_format(file.filename, file.content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    importer = ExpenseImporter(db, current_user.id, Expense, mode=mode, signed=format == "ofx" or amounts == "signed")
+    try:
+        results = [result async for result in importer.run(PARSERS[format](_read_chunks(file)))]
+    finally:
+        # Chunks are committed as they go, so even a failed import may have written rows
+        await user_cache.invalidate(current_user.id, *EXPENSE_RESOURCES)
+    return {**importer.counts, "results": results}
+
+@router.post("/api/expenses/bulk-delete")
+async def bulk_delete_expenses(body: BulkDelete, current_user = Depends(get_current_user), db: AsyncClient = Depends(get_db), user_cache: UserCache = Depends(get_user_cache)):
+    """
+    Delete many of the current user's expenses in one call.
+
+    Returns:
+        dict: The number deleted and a deleted/not_found status per requested id.
+    """
+    results = []
+    try:
+        for start in range(0, len(body.ids), IMPORT_CHUNK_ROWS):
+            results += await delete_expenses(db, current_user.id, body.ids[start:start + IMPORT_CHUNK_ROWS])
+    finally:
+        await user_cache.invalidate(current_user.id, *EXPENSE_RESOURCES)
+    return {"deleted": sum(result["status"] == "deleted" for result in results), "results": results}
@@ -1,20 +1,29 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
-from pydantic import BaseModel
-from datetime import datetime
-from supabase import create_client as open_sb
+from fastapi import APIRouter, HTTPException, Depends, Header
+from typing import List, Optional
+from pydantic import BaseModel, TypeAdapter
+from datetime import datetime, date, timedelta
+import asyncio
+import orjson
+from supabase import AsyncClient
 import os
 import utils.auth as bb_auth
 from ..schemas import GoalCreate, GoalResponse, GoalUpdate
 from .users import get_current_user
+from server.caching import cached_json
+from server.dependencies import get_db, get_user_cache
+from utils.database import mutate_owned
+from utils.analytics import spending_summary
+from utils.forecast import forecast_goals
+from utils.user_cache import UserCache
 
-supabase_client = open_sb(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+FORECAST_HISTORY_YEARS = 3
+GOAL_LIST = TypeAdapter(List[GoalResponse])
 
 router = APIRouter()
 
 
 @router.post("/api/goals/create", response_model=GoalResponse)
-async def create_goal(body: dict, current_user: dict = Depends(get_current_user)):
+async def create_goal(body: dict, current_user: dict = Depends(get_current_user), db: AsyncClient = Depends(get_db), user_cache: UserCache = Depends(get_user_cache)):
     """
     Create a new goal for the authenticated user
     Request body: {
@@ -38,11 +47,12 @@ async def create_goal(body: dict, current_user: dict = Depends(get_current_user)
         goal_data["user_id"] = user_id
 
         # Insert into database
-        result = supabase_client.table("goals").insert(goal_data).execute()
+        result = await db.table("goals").insert(goal_data).execute()
 
         if not result.data:
             raise HTTPException(status_code=500, detail="Failed to create goal")
-            
+
+        await user_cache.invalidate(user_id, "goals")
         return result.data[0]
 
     except ValueError as e:
@@ -51,24 +61,59 @@ async def create_goal(body: dict, current_user: dict = Depends(get_current_user)
         raise HTTPException(status_code=500, detail=str(e)) from e
 
 
+async def spending_history(db, user_id, today: date) -> tuple:
+    """Monthly spending totals for the last FORECAST_HISTORY_YEARS years, read from the rollups."""
+    summary = await spending_summary(db, user_id, today.replace(year=today.year - FORECAST_HISTORY_YEARS, day=1), today + timedelta(days=1), "month")
+    periods = summary["by_period"]
+    return [period["period"] for period in periods], [period["amount"] for period in periods]
+
 @router.get("/api/goals/view")
-async def get_goals(current_user: dict = Depends(get_current_user)):
+async def get_goals(
+    with_forecast: bool = False,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncClient = Depends(get_db),
+    user_cache: UserCache = Depends(get_user_cache),
+    if_none_match: Optional[str] = Header(default=None)
+):
     """
     Get all goals for the authenticated user
     Request body: {"session_id": string}
+
+    With `with_forecast=1`, each goal gets a `forecast` (projected completion date, whether
+    it will be met by its deadline, and the monthly savings needed), computed from the
+    user's spending history.
+
+    Served from the per-user cache until a goal (or, for forecasts, an expense) changes;
+    send the ETag back in If-None-Match to get a 304 when nothing did.
     """
     try:
         user_id = current_user.id
-        result = supabase_client.table("goals").select("*").eq("user_id", user_id).execute()
-        
-        return [GoalResponse(**goal) for goal in result.data]
+        today = date.today()
+
+        async def load():
+            if not with_forecast:
+                result = await db.table("goals").select("*").eq("user_id", user_id).execute()
+                # One validation pass over the list, serialized by pydantic-core
+                return GOAL_LIST.dump_json(GOAL_LIST.validate_python(result.data)), {}
+
+            result, (dates, amounts) = await asyncio.gather(
+                db.table("goals").select("*").eq("user_id", user_id).execute(),
+                spending_history(db, user_id, today)
+            )
+            goals = GOAL_LIST.dump_python(GOAL_LIST.validate_python(result.data), mode="json")
+            forecast = forecast_goals(dates, amounts, goals, today=today)
+            return orjson.dumps([{**goal, "forecast": goal_forecast} for goal, goal_forecast in zip(goals, forecast["goals"])]), {}
+
+        # Forecasts are relative to today
+        variant = f"forecast:{today.isoformat()}" if with_forecast else "plain"
+        return await cached_json(user_cache, user_id, "goals", variant, load, if_none_match)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
 
 @router.delete("/api/goals/delete/{goal_id}")
-async def delete_goal(goal_id: str, current_user: dict = Depends(get_current_user)):
+async def delete_goal(goal_id: str, current_user: dict = Depends(get_current_user), db: AsyncClient = Depends(get_db), user_cache: UserCache = Depends(get_user_cache)):
     """
     Delete a specific goal
     Request body: {
@@ -77,34 +122,19 @@ async def delete_goal(goal_id: str, current_user: dict = Depends(get_current_use
     }
     """
     try:
-        goal_data = supabase_client.table("goals").select("*").eq("id", goal_id).execute()
+        status, deleted = await mutate_owned(db, "goals", goal_id, current_user.id)
 
-        if not goal_data.data:
+        if status == "not_found":
             raise HTTPException(status_code=404, detail="Goal not found")
+        if status == "forbidden":
+            raise HTTPException(status_code=403, detail="User not authorized to delete this goal")
 
-        user_data = (
-            supabase_client.table("goals")
-            .select("*")
-            .eq("id", goal_id)
-            .eq("user_id", current_user.id)
-            .execute()
-            .data[0]
-            if supabase_client.table("goals").select("*").eq("id", goal_id).eq("user_id", current_user.id).execute().data
-            else None
-        )
-
-        if not user_data:
-            raise HTTPException(status_code=404, detail="User not authorized to delete this goal")
-
-        delete_response = supabase_client.table("goals").delete().eq("id", goal_id).execute()
-
-        # Check if the delete was successful
-        if not delete_response.data:
-            raise HTTPException(status_code=delete_response.status_code, detail="Failed to delete the goal")
-
-        goal_name = delete_response.data[0]["title"]
+        await user_cache.invalidate(current_user.id, "goals")
+        goal_name = deleted["title"]
         return {"message": f"Goal '{goal_name}' deleted successfully"}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
@@ -112,20 +142,12 @@ async def delete_goal(goal_id: str, current_user: dict = Depends(get_current_use
 async def update_goal(
     goal_id: str, 
     updated_goal: GoalUpdate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncClient = Depends(get_db),
+    user_cache: UserCache = Depends(get_user_cache)
 ):
     try:
-        # 1. Check if the goal exists
-        existing = supabase_client.table("goals").select("*").eq("id", goal_id).execute()
-        if not existing.data:
-            raise HTTPException(status_code=404, detail="Goal not found")
-
-        # 2. Check if the current user is authorized to update this goal
-        user_data = supabase_client.table("goals").select("*").eq("id", goal_id).eq("user_id", current_user.id).execute().data
-        if not user_data:
-            raise HTTPException(status_code=403, detail="User not authorized to update this goal")
-
-        # 3. Convert deadline to ISO format
+        # Convert deadline to ISO format
         iso_deadline = datetime.fromisoformat(updated_goal.deadline).isoformat()
 
         update_data = {
@@ -137,13 +159,19 @@ async def update_goal(
             "deadline": iso_deadline
         }
 
-        response = supabase_client.table("goals").update(update_data).eq("id", goal_id).execute()
-        if not response.data:
-            raise HTTPException(status_code=500, detail="Failed to update goal")
+        # Update only if the goal belongs to the current user, in one round trip
+        status, updated = await mutate_owned(db, "goals", goal_id, current_user.id, update_data)
+        if status == "not_found":
+            raise HTTPException(status_code=404, detail="Goal not found")
+        if status == "forbidden":
+            raise HTTPException(status_code=403, detail="User not authorized to update this goal")
 
-        return response.data[0]
+        await user_cache.invalidate(current_user.id, "goals")
+        return updated
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail="Invalid date format") from e
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
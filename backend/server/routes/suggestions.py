@@ -1,53 +1,168 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Literal
-import httpx
 import json
+import time
 from dotenv import load_dotenv
 import os
-import together
+from utils.llm_gateway import ThinkFilter, get_llm_gateway
+from utils.metrics import get_summary, span
+from utils.suggestion_cache import SuggestionCache, normalize_questionnaire
 from ..schemas import Budget, BudgetQuestionnaire, GoalQuestionnaire
 load_dotenv()
 
 router = APIRouter()
 
-together_client = together.Client()
-
-# Temp until Aryan's PR is merged
+# Identical (or, optionally, near-identical) questionnaires reuse an earlier suggestion
+suggestion_cache = SuggestionCache.from_env()
 
 async def get_llm_response(messages):
     """Get response from DeepSeek model via Together."""
-    response = together_client.chat.completions.create(
-        model="deepseek-ai/DeepSeek-R1-Distill-Llama-70B-free",
-        messages=messages
+    return await get_llm_gateway("together").complete(messages)
+
+async def stream_llm_response(messages):
+    """Stream the final answer from DeepSeek via Together, without its <think> section."""
+    think_filter = ThinkFilter()
+    async for chunk in get_llm_gateway("together").stream(messages):
+        answer = think_filter.feed(chunk)
+        if answer:
+            yield answer
+    answer = think_filter.flush()
+    if answer:
+        yield answer
+
+def budget_messages(questionnaire: BudgetQuestionnaire):
+    return [
+        {
+            "role": "system",
+            "content": """You are a knowledgeable financial advisor. Analyze the user's financial situation 
+            and suggest a monthly budget. 
+            OUTPUT INSTRUCTIONS, FOLLOW THEM EXACTLY. DO NOT VEER OFF FROM FORMAT. DO NOT INCLUDE ANY OTHER TEXT OR EXPLANATIONS:
+            Your response must be a valid JSON string in this exact format:
+            {"spending_limit": 1234.56, "duration": "monthly", "budget_name": "Basic Budget"}
+            """
+        },
+        {
+            "role": "user",
+            "content": f"""
+            Financial Situation: {questionnaire.financial_situation}
+            Spending Habits: {questionnaire.spending_habits}
+            Financial Goals: {questionnaire.financial_goals}
+            Lifestyle Preferences: {questionnaire.lifestyle_preferences}
+            Financial Concerns: {questionnaire.financial_concerns}
+            """
+        }
+    ]
+
+def goal_messages(questionnaire: GoalQuestionnaire):
+    return [
+        {
+            "role": "system",
+            "content": """You are a knowledgeable financial advisor. Analyze the user's financial situation 
+            and suggest 2-4 specific, actionable financial goals. Return them as a JSON array of strings.
+            OUTPUT INSTRUCTIONS, FOLLOW THEM EXACTLY. DO NOT VEER OFF FROM FORMAT. DO NOT INCLUDE ANY OTHER TEXT OR EXPLANATIONS:
+            Your response must be a valid JSON string in this exact format:
+            DO NOT INCLUDE ANY OTHER TEXT OR EXPLANATIONS:
+            ["Goal 1", "Goal 2", "Goal 3"]
+            """
+        },
+        {
+            "role": "user",
+            "content": f"""
+            Current Situation: {questionnaire.current_situation}
+            Future Aspirations: {questionnaire.future_aspirations}
+            Risk Comfort: {questionnaire.risk_comfort}
+            Timeline: {questionnaire.timeline_description}
+            Constraints: {questionnaire.constraints}
+            """
+        }
+    ]
+
+def parse_budget_suggestion(llm_response: str) -> Budget:
+    """Turn the LLM's final answer into a Budget, raising HTTPException if it is unusable."""
+    # Add error handling for JSON parsing
+    try:
+        with span("json_parse", target="budget_suggestion"):
+            budget_suggestion = json.loads(llm_response)
+    except json.JSONDecodeError as json_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to parse LLM response as JSON. Response: {llm_response}"
+        )
+    
+    # Validate required fields
+    required_fields = ["budget_name", "spending_limit", "duration"]
+    missing_fields = [field for field in required_fields if field not in budget_suggestion]
+    if missing_fields:
+        raise HTTPException(
+            status_code=500,
+            detail=f"LLM response missing required fields: {missing_fields}"
+        )
+    
+    return Budget(
+        name=budget_suggestion["budget_name"],
+        spending_limit=budget_suggestion["spending_limit"],
+        duration=budget_suggestion["duration"],
+        user_id=None # TODO: Add user_id
     )
-    return response.choices[0].message.content
+
+def parse_goal_suggestions(llm_response: str) -> List[str]:
+    """Turn the LLM's final answer into a list of goals, raising HTTPException if it is not JSON."""
+    try:
+        with span("json_parse", target="goal_suggestions"):
+            return json.loads(llm_response)
+    except json.JSONDecodeError as json_error:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to parse LLM response as JSON. Response: {llm_response}"
+        )
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_suggestion(messages, parse, metric_prefix: str, cache_kind: str, cache_text: str):
+    """
+    Relay the answer as server-sent events: `delta` events while it is generated, then a
+    `result` event with the parsed suggestion, or an `error` event. A cached suggestion
+    is sent as a single `result` event.
+    """
+    started = time.perf_counter()
+    cached = suggestion_cache.get(cache_kind, cache_text)
+    if cached is not None:
+        get_summary(f"{metric_prefix}.ttfb_seconds").observe(time.perf_counter() - started)
+        yield sse_event("result", cached)
+        return
+    first_byte = True
+    answer = ""
+    try:
+        async for chunk in stream_llm_response(messages):
+            if first_byte:
+                get_summary(f"{metric_prefix}.ttfb_seconds").observe(time.perf_counter() - started)
+                first_byte = False
+            answer += chunk
+            yield sse_event("delta", {"text": chunk})
+        result = jsonable_encoder(parse(answer.strip()))
+        suggestion_cache.put(cache_kind, cache_text, result)
+        yield sse_event("result", result)
+    except HTTPException as e:
+        yield sse_event("error", {"detail": e.detail})
+    except Exception as e:
+        yield sse_event("error", {"detail": str(e)})
+    finally:
+        get_summary(f"{metric_prefix}.total_seconds").observe(time.perf_counter() - started)
 
 @router.post("/api/suggest-budget/", response_model=Budget)
 async def suggest_budget(questionnaire: BudgetQuestionnaire):
     """Suggest a budget based on user's financial situation using LLM."""
     try:
-        messages = [
-            {
-                "role": "system",
-                "content": """You are a knowledgeable financial advisor. Analyze the user's financial situation 
-                and suggest a monthly budget. 
-                OUTPUT INSTRUCTIONS, FOLLOW THEM EXACTLY. DO NOT VEER OFF FROM FORMAT. DO NOT INCLUDE ANY OTHER TEXT OR EXPLANATIONS:
-                Your response must be a valid JSON string in this exact format:
-                {"spending_limit": 1234.56, "duration": "monthly", "budget_name": "Basic Budget"}
-                """
-            },
-            {
-                "role": "user",
-                "content": f"""
-                Financial Situation: {questionnaire.financial_situation}
-                Spending Habits: {questionnaire.spending_habits}
-                Financial Goals: {questionnaire.financial_goals}
-                Lifestyle Preferences: {questionnaire.lifestyle_preferences}
-                Financial Concerns: {questionnaire.financial_concerns}
-                """
-            }
-        ]
+        cache_text = normalize_questionnaire(questionnaire)
+        cached = suggestion_cache.get("budget", cache_text)
+        if cached is not None:
+            return Budget(**cached)
+        
+        messages = budget_messages(questionnaire)
         
         llm_response = await get_llm_response(messages)
         
@@ -59,78 +174,55 @@ async def suggest_budget(questionnaire: BudgetQuestionnaire):
             # Extract only the part after </think>
             llm_response = llm_response.split("</think>")[1]
         
-        # Add error handling for JSON parsing
-        try:
-            budget_suggestion = json.loads(llm_response)
-        except json.JSONDecodeError as json_error:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to parse LLM response as JSON. Response: {llm_response}"
-            )
-        
-        # Validate required fields
-        required_fields = ["budget_name", "spending_limit", "duration"]
-        missing_fields = [field for field in required_fields if field not in budget_suggestion]
-        if missing_fields:
-            raise HTTPException(
-                status_code=500,
-                detail=f"LLM response missing required fields: {missing_fields}"
-            )
-        
-        return Budget(
-            name=budget_suggestion["budget_name"],
-            spending_limit=budget_suggestion["spending_limit"],
-            duration=budget_suggestion["duration"],
-            user_id=None # TODO: Add user_id
-        )
+        budget = parse_budget_suggestion(llm_response)
+        suggestion_cache.put("budget", cache_text, jsonable_encoder(budget))
+        return budget
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/api/suggest-budget/stream")
+async def suggest_budget_stream(questionnaire: BudgetQuestionnaire):
+    """Stream a budget suggestion as server-sent events, skipping the model's reasoning."""
+    return StreamingResponse(
+        stream_suggestion(budget_messages(questionnaire), parse_budget_suggestion, "suggestions.budget", "budget", normalize_questionnaire(questionnaire)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/api/suggest-goals/", response_model=List[str])
 async def suggest_goals(questionnaire: GoalQuestionnaire):
     """Suggest financial goals based on user's situation using LLM."""
     try:
-        messages = [
-            {
-                "role": "system",
-                "content": """You are a knowledgeable financial advisor. Analyze the user's financial situation 
-                and suggest 2-4 specific, actionable financial goals. Return them as a JSON array of strings.
-                OUTPUT INSTRUCTIONS, FOLLOW THEM EXACTLY. DO NOT VEER OFF FROM FORMAT. DO NOT INCLUDE ANY OTHER TEXT OR EXPLANATIONS:
-                Your response must be a valid JSON string in this exact format:
-                DO NOT INCLUDE ANY OTHER TEXT OR EXPLANATIONS:
-                ["Goal 1", "Goal 2", "Goal 3"]
-                """
-            },
-            {
-                "role": "user",
-                "content": f"""
-                Current Situation: {questionnaire.current_situation}
-                Future Aspirations: {questionnaire.future_aspirations}
-                Risk Comfort: {questionnaire.risk_comfort}
-                Timeline: {questionnaire.timeline_description}
-                Constraints: {questionnaire.constraints}
-                """
-            }
-        ]
-        
+        cache_text = normalize_questionnaire(questionnaire)
+        cached = suggestion_cache.get("goals", cache_text)
+        if cached is not None:
+            return cached
         
+        messages = goal_messages(questionnaire)
         
         llm_response = await get_llm_response(messages)
         
         if "</think>" in llm_response:
             llm_response = llm_response.split("</think>")[1]
         
-        # Add error handling for JSON parsing
-        try:
-            budget_suggestion = json.loads(llm_response)
-        except json.JSONDecodeError as json_error:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to parse LLM response as JSON. Response: {llm_response}"
-            )
-            
-        return budget_suggestion
+        goals = parse_goal_suggestions(llm_response)
+        suggestion_cache.put("goals", cache_text, goals)
+        return goals
         
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/api/suggest-goals/stream")
+async def suggest_goals_stream(questionnaire: GoalQuestionnaire):
+    """Stream goal suggestions as server-sent events, skipping the model's reasoning."""
+    return StreamingResponse(
+        stream_suggestion(goal_messages(questionnaire), parse_goal_suggestions, "suggestions.goals", "goals", normalize_questionnaire(questionnaire)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/health/suggestion-cache")
+async def suggestion_cache_health():
+    """Hit rate and size of the suggestion cache, for tuning its size, TTL and similarity threshold."""
+    return suggestion_cache.stats()
@@ -1,85 +1,149 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from typing import Optional
 import os
-from utils import ReceiptScanner, save_receipt_result
-import together
-from server.routes.users import get_current_user
 import json
+import asyncio
+from utils.llm_gateway import get_llm_gateway
+from utils import ReceiptScannerPool, ReceiptScannerUnavailable, ReceiptCache, ReceiptFields, OCRQueueFull, ReceiptTooLarge, extract_receipt_fields, get_owned_expense, read_upload, save_receipt_result
+from utils.receipt_cache import content_key
+from utils.receipt_jobs import ReceiptJobQueue, UnsafeWebhookURL, resolve_webhook_url
+from utils.user_cache import EXPENSE_RESOURCES, UserCache
+from utils.log import get_logger
+from server.routes.users import get_current_user
+from server.dependencies import get_receipt_scanner, get_receipt_cache, get_receipt_jobs, get_db, get_user_cache
+from supabase import AsyncClient
 
 router = APIRouter()
+log = get_logger(__name__)
 
-together_client = together.Client()
+async def ingest_receipt(contents: bytes, user_id, scanner, cache: ReceiptCache, db, user_cache: UserCache):
+    """
+    Scan a receipt, extract its fields and save it as an expense.
 
-@router.post("/api/track-receipt")
-async def create_photo_receipt(file: UploadFile = File(...)):
-    # Save the uploaded file temporarily
-    temp_file_path = f"temp_{file.filename}"
+    Shared by the synchronous upload endpoint and the background job workers.
+
+    Returns:
+        dict: The saved expense, plus `duplicate`. A receipt this user already saved (a double
+        tap or a retried upload) is not inserted again: the existing expense is returned with
+        `duplicate` set, unless it has since been deleted. A photo that only looks like an
+        earlier one reuses its scan and fields but is saved as a new expense.
+    """
+    # A re-uploaded or retried photo skips OCR and the LLM entirely. Hashing and SQLite
+    # block, so the cache is used from a worker thread.
+    cached = await asyncio.to_thread(cache.get, contents, user_id)
+    if cached is not None and "category" in cached:
+        # Only the same bytes are the same receipt; a perceptual match just reuses the scan
+        if cached["key"] == content_key(contents):
+            expense_id = cached.get("expense_ids", {}).get(str(user_id))
+            if expense_id is not None:
+                existing = await get_owned_expense(db, expense_id, user_id)
+                if existing is not None:
+                    return {**existing, "duplicate": True}
+        result = cached["scan"]
+        fields = ReceiptFields(category=cached["category"], price=cached["price"], business_name=cached["business_name"])
+    else:
+        # Process the receipt straight from memory
+        result = cached["scan"] if cached is not None else await scanner.scan(contents)
+        
+        # One structured LLM call for category, price and business name
+        fields, usage = await extract_receipt_fields(result, get_llm_gateway())
+        log.debug("receipt_extraction", usage=usage)
+        # Cached before saving, so a retry after a failed insert still skips OCR and the LLM
+        await asyncio.to_thread(cache.put, contents, result, user_id=user_id, **fields.model_dump())
     
+    # Save the result to the database
+    expense = await save_receipt_result(db, result, user_id, fields.category, fields.price, fields.business_name)
+    await asyncio.to_thread(cache.put, contents, result, user_id=user_id, expense_id=expense.get("id"), **fields.model_dump())
+    await user_cache.invalidate(user_id, *EXPENSE_RESOURCES)
+    return {**expense, "duplicate": False}
+
+@router.post("/api/track-receipt")
+async def create_photo_receipt(
+    file: UploadFile = File(...),
+    scanner: ReceiptScannerPool = Depends(get_receipt_scanner),
+    cache: ReceiptCache = Depends(get_receipt_cache),
+    db: AsyncClient = Depends(get_db),
+    user_cache: UserCache = Depends(get_user_cache)
+):
     try:
-        contents = await file.read()
+        contents = await read_upload(file)
         current_user = await get_current_user(testing=True)
-        print(f"Current user: {current_user=}")
+        log.debug("receipt_upload", user_id=current_user["id"])
         user_id = current_user['id']
-        with open(temp_file_path, "wb") as f:
-            f.write(contents)
-        
-        # Process the receipt
-        scanner = ReceiptScanner()
-        result = scanner.scan_receipt(temp_file_path)
-        
-        # Convert the result dictionary to a JSON string
-        result_str = json.dumps(result)
-        
-        # Use an LLM to classify the receipt in a category
-        response = together_client.chat.completions.create(
-            model="deepseek-ai/DeepSeek-R1-Distill-Llama-70B-free",
-            messages=[
-                {"role": "system", "content": """You are an expert in classifying receipts into categories.\
-                    You will be given a parsed receipt (in form of a JSON object) and you will need to classify it into a category.\
-                    The categories are: \
-                    - Food\
-                    - Entertainment\
-                    - Shopping\
-                    - Travel\
-                    - Pets\
-                    - Medical\
-                    - Rent\
-                    - Transportation\
-                    - Other\
-                    ***IMPORTANT FORMATTING INSTRUCTIONS***\
-                    - Only respond with the category name, no other text\
-                    - If the receipt cannot be classified into any of the categories, respond with "Other"\
-                    """},
-                {"role": "user", "content": result_str}
-            ]
-        )
-        category = response.choices[0].message.content
-        
-        # Fetch price
-        response = together_client.chat.completions.create(
-            model="deepseek-ai/DeepSeek-R1-Distill-Llama-70B-free",
-            messages=[
-                {"role": "system", "content": "You are an expert in extracting prices from receipts. Specifically, the final price. IMPORTANT: ONLY RESPOND WITH THE FINAL PRICE, NO OTHER TEXT."},
-                {"role": "user", "content": f"Here is the receipt: {result_str}"}
-            ]
-        )
-        price = response.choices[0].message.content
-        
-        response = together_client.chat.completions.create(
-            model="deepseek-ai/DeepSeek-R1-Distill-Llama-70B-free",
-            messages=[
-                {"role": "system", "content": "You are an expert in extracting restaurant names from receipts. Specifically, the restaurant name. IMPORTANT: ONLY RESPOND WITH THE RESTAURANT NAME, NO OTHER TEXT. Do not include '$' in your response."},
-                {"role": "user", "content": f"Here is the receipt: {result_str}"}
-            ]
-        )
-        restaurant_name = response.choices[0].message.content
-        
-        # Save the result to the database
-        return await save_receipt_result(result, user_id, category, price, restaurant_name)
+        return await ingest_receipt(contents, user_id, scanner, cache, db, user_cache)
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except ReceiptTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except OCRQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except ReceiptScannerUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Timed out waiting for the receipt scanner")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        # Clean up the temporary file
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+
+def _job_response(job: dict) -> dict:
+    return {key: value for key, value in job.items() if key not in ("user_id", "webhook_url")}
+
+def _owned_job(jobs: ReceiptJobQueue, job_id: str, current_user) -> dict:
+    job = jobs.get(job_id)
+    if job is None or job["user_id"] != str(current_user.id):
+        raise HTTPException(status_code=404, detail="Receipt job not found")
+    return job
+
+# Refuses new jobs once the scanner has failed to load, since no worker could process them
+@router.post("/api/receipts/jobs", status_code=202, dependencies=[Depends(get_receipt_scanner)])
+async def create_receipt_job(
+    file: UploadFile = File(...),
+    webhook_url: Optional[str] = Form(None),
+    current_user = Depends(get_current_user),
+    jobs: ReceiptJobQueue = Depends(get_receipt_jobs)
+):
+    """
+    Queue a receipt for scanning and return immediately with a job id.
+
+    Follow the job with GET /api/receipts/jobs/{id}, its /events stream, or by passing a
+    `webhook_url` that receives the finished job as a JSON POST. The webhook must resolve to
+    a public address; redirects are not followed.
+    """
+    if webhook_url:
+        try:
+            await resolve_webhook_url(webhook_url)
+        except UnsafeWebhookURL as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    try:
+        contents = await read_upload(file)
+    except ReceiptTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    job = jobs.enqueue(contents, current_user.id, webhook_url)
+    return {**_job_response(job), "status_url": f"/api/receipts/jobs/{job['id']}"}
+
+@router.get("/api/receipts/jobs/{job_id}")
+async def get_receipt_job(job_id: str, current_user = Depends(get_current_user), jobs: ReceiptJobQueue = Depends(get_receipt_jobs)):
+    """Status of a receipt job: queued, running, done (with the saved expense) or dead (with the last error)."""
+    return _job_response(_owned_job(jobs, job_id, current_user))
+
+@router.get("/api/receipts/jobs/{job_id}/events")
+async def receipt_job_events(job_id: str, current_user = Depends(get_current_user), jobs: ReceiptJobQueue = Depends(get_receipt_jobs)):
+    """Stream the job's status changes as server-sent events, ending once it is done or dead-lettered."""
+    _owned_job(jobs, job_id, current_user)
+
+    async def events():
+        async for job in jobs.watch(job_id):
+            yield f"event: {job['status']}\ndata: {json.dumps(_job_response(job), default=str)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.post("/api/receipts/jobs/{job_id}/retry")
+async def retry_receipt_job(job_id: str, current_user = Depends(get_current_user), jobs: ReceiptJobQueue = Depends(get_receipt_jobs)):
+    """Requeue a dead-lettered job."""
+    if _owned_job(jobs, job_id, current_user)["status"] != "dead":
+        raise HTTPException(status_code=409, detail="Only dead-lettered jobs can be retried")
+    return _job_response(jobs.retry(job_id))
+
+@router.get("/health/receipt-jobs")
+async def receipt_jobs_health(jobs: ReceiptJobQueue = Depends(get_receipt_jobs)):
+    return jobs.stats()
@@ -6,26 +6,31 @@ import jwt
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import APIKeyCookie
-from utils.supabase_client import supabase_client
+from supabase import AsyncClient
+from server.dependencies import get_auth_client, get_db
+from utils.auth import token_verifier, InvalidToken, VerificationUnavailable
+from utils.log import get_logger
+from utils.metrics import span
 from server.schemas import User, UserCreate, UserLogin
 router = APIRouter()
+log = get_logger(__name__)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 cookie_auth = APIKeyCookie(name="access_token", auto_error=False)
 
 # users.py - Simplified validation endpoint
 @router.get("/api/validate-session")
-async def validate_session(access_token: Optional[str] = Cookie(default=None)):
+async def validate_session(access_token: Optional[str] = Cookie(default=None), db: AsyncClient = Depends(get_db)):
     if not access_token:
         return {"valid": False}
     
     try:
-        user = supabase_client.auth.get_user(access_token)
-        return {"valid": True, "user": user.user}
+        user = await authenticate(access_token, db)
+        return {"valid": True, "user": user}
     except:
         return {"valid": False}
 
 @router.post("/api/users/register", response_model=User)
-async def register_user(user: UserCreate):
+async def register_user(user: UserCreate, db: AsyncClient = Depends(get_db), auth = Depends(get_auth_client)):
     """
     Register a new user and return the user object.
 
@@ -41,7 +46,7 @@ async def register_user(user: UserCreate):
 
     
     try:
-        auth_response = supabase_client.auth.sign_up({
+        auth_response = await auth.sign_up({
             "email": user.email,
             "password": user.password
         })
@@ -53,14 +58,14 @@ async def register_user(user: UserCreate):
             "created_at": datetime.now(timezone.utc).isoformat()
         }
         
-        data = supabase_client.table("users").insert(user_data).execute()
+        data = await db.table("users").insert(user_data).execute()
         
         return User(**user_data)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/api/users/login")
-async def login_user(user: UserLogin, response: Response):
+async def login_user(user: UserLogin, response: Response, auth = Depends(get_auth_client)):
     """
     Authenticate a user and return the access token.
 
@@ -77,7 +82,7 @@ async def login_user(user: UserLogin, response: Response):
 
     
     try:
-        auth_response = supabase_client.auth.sign_in_with_password({
+        auth_response = await auth.sign_in_with_password({
             "email": user.email,
             "password": user.password
         })
@@ -100,9 +105,31 @@ async def login_user(user: UserLogin, response: Response):
         # }
 
     except Exception as e:
-        print("Login Error:", str(e))
+        log.warning("login_failed", error=str(e))
         raise HTTPException(status_code=401, detail="Invalid credentials")
-async def get_current_user(access_token: str = Cookie(default=None), testing: bool = False):
+
+async def authenticate(access_token: str, db: AsyncClient):
+    """
+    Resolve an access token to its user.
+
+    The token is verified locally (signature and expiry) and the result cached; Supabase
+    auth is only called when the token cannot be checked locally.
+    """
+    try:
+        return await token_verifier.verify_async(access_token)
+    except InvalidToken:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    except VerificationUnavailable:
+        user = await db.auth.get_user(access_token)
+        if user is None:
+            raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+        return user.user
+
+async def get_current_user(
+    access_token: str = Cookie(default=None),
+    testing: bool = False,
+    db: AsyncClient = Depends(get_db)
+):
     """
     Retrieve the current authenticated user.
 
@@ -122,12 +149,8 @@ async def get_current_user(access_token: str = Cookie(default=None), testing: bo
     if access_token is None:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
 
-    # Verify the token with Supabase
-    user = supabase_client.auth.get_user(access_token)
-    if user is None:
-        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-    
-    return user.user
+    with span("auth"):
+        return await authenticate(access_token, db)
 
 # users.py
 @router.post("/api/users/logout")
@@ -0,0 +1,47 @@
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from utils.analytics import spending_summary
+
+
+def rollup_client(rows):
+    db = MagicMock()
+    db.rpc.return_value.execute = AsyncMock(return_value=MagicMock(data=rows))
+    return db
+
+
+@pytest.mark.asyncio
+async def test_spending_summary_groups_rollup_rows():
+    db = rollup_client([
+        {"dimension": "category", "key": "Food", "amount": "12.50", "expense_count": 2},
+        {"dimension": "category", "key": "Transport", "amount": "30.00", "expense_count": 1},
+        {"dimension": "merchant", "key": "", "amount": "42.50", "expense_count": 3},
+        {"dimension": "period", "key": "2025-03-02", "amount": "30.00", "expense_count": 1},
+        {"dimension": "period", "key": "2025-03-01", "amount": "12.50", "expense_count": 2},
+    ])
+
+    summary = await spending_summary(db, "user-1", date(2025, 3, 1), date(2025, 3, 3), "day")
+
+    db.rpc.assert_called_once_with("spending_summary", {
+        "p_user_id": "user-1",
+        "p_start": "2025-03-01",
+        "p_end": "2025-03-03",
+        "p_granularity": "day",
+    })
+    assert summary["total"] == 42.5
+    assert summary["count"] == 3
+    assert [item["category"] for item in summary["by_category"]] == ["Transport", "Food"]
+    assert summary["by_merchant"] == [{"business_name": None, "amount": 42.5, "count": 3}]
+    assert [item["period"] for item in summary["by_period"]] == ["2025-03-01", "2025-03-02"]
+
+
+@pytest.mark.asyncio
+async def test_spending_summary_rejects_bad_ranges():
+    db = rollup_client([])
+    with pytest.raises(ValueError):
+        await spending_summary(db, "user-1", date(2025, 3, 1), date(2025, 3, 1))
+    with pytest.raises(ValueError):
+        await spending_summary(db, "user-1", date(2025, 3, 1), date(2025, 4, 1), "year")
+    db.rpc.assert_not_called()
@@ -0,0 +1,67 @@
+import time
+
+import jwt
+import pytest
+
+from utils.auth import InvalidToken, TokenVerifier, VerificationUnavailable
+
+SECRET = "super-secret-jwt-token-with-at-least-32-characters"
+USER_ID = "c4304cf3-d239-449f-986e-e879da77ae01"
+
+
+def make_token(secret=SECRET, expires_in=3600, **claims):
+    payload = {
+        "sub": USER_ID,
+        "email": "user@example.com",
+        "role": "authenticated",
+        "aud": "authenticated",
+        "exp": int(time.time()) + expires_in,
+        **claims,
+    }
+    return jwt.encode(payload, secret, algorithm="HS256")
+
+
+def test_valid_token_is_verified_and_cached():
+    verifier = TokenVerifier(secret=SECRET)
+    token = make_token()
+
+    user = verifier.verify(token)
+    assert user.id == USER_ID
+    assert user.email == "user@example.com"
+
+    assert verifier.verify(token) is user
+    assert verifier.stats()["hits"] == 1
+
+
+def test_expired_token_is_rejected():
+    verifier = TokenVerifier(secret=SECRET)
+    with pytest.raises(InvalidToken):
+        verifier.verify(make_token(expires_in=-10))
+
+
+def test_forged_token_is_rejected():
+    verifier = TokenVerifier(secret=SECRET)
+    with pytest.raises(InvalidToken):
+        verifier.verify(make_token(secret="another-secret-that-is-also-32-chars-long"))
+
+
+def test_unsigned_token_is_rejected():
+    verifier = TokenVerifier(secret=SECRET)
+    token = jwt.encode({"sub": USER_ID, "aud": "authenticated", "exp": int(time.time()) + 60}, None, algorithm="none")
+    with pytest.raises(InvalidToken):
+        verifier.verify(token)
+
+
+def test_missing_secret_falls_back():
+    verifier = TokenVerifier()
+    with pytest.raises(VerificationUnavailable):
+        verifier.verify(make_token())
+
+
+def test_cache_never_outlives_token():
+    verifier = TokenVerifier(secret=SECRET, cache_ttl=3600)
+    token = make_token(expires_in=1)
+    verifier.verify(token)
+    time.sleep(1.1)
+    with pytest.raises(InvalidToken):
+        verifier.verify(token)
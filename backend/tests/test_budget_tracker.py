@@ -0,0 +1,57 @@
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from utils.budget_tracker import BudgetAlertBroker, attach_utilization, current_spending, period_start
+
+TODAY = date(2025, 3, 12)  # a Wednesday
+
+
+def test_period_start_matches_date_trunc():
+    assert period_start("week", TODAY) == date(2025, 3, 10)
+    assert period_start("month", TODAY) == date(2025, 3, 1)
+    assert period_start("year", TODAY) == date(2025, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_current_spending_ignores_stale_periods():
+    db = MagicMock()
+    query = db.table.return_value.select.return_value.eq.return_value.in_.return_value
+    query.execute = AsyncMock(return_value=MagicMock(data=[
+        {"period": "week", "period_start": "2025-03-10", "spent": "40.00"},
+        {"period": "month", "period_start": "2025-03-01", "spent": "120.50"},
+        # Last year's counter never applies to the current year
+        {"period": "year", "period_start": "2025-03-01", "spent": "999"},
+    ]))
+
+    spending = await current_spending(db, "user-1", TODAY)
+
+    assert spending == {
+        "week": (date(2025, 3, 10), 40.0),
+        "month": (date(2025, 3, 1), 120.5),
+        "year": (date(2025, 1, 1), 0.0),
+    }
+
+
+def test_attach_utilization():
+    spending = {"week": (date(2025, 3, 10), 40.0), "month": (date(2025, 3, 1), 120.5), "year": (date(2025, 1, 1), 0.0)}
+    budgets = attach_utilization([
+        {"name": "Groceries", "spending_limit": 100, "duration": "monthly"},
+        {"name": "Fun", "spending_limit": 50, "duration": "weekly"},
+    ], spending)
+
+    assert budgets[0]["over_limit"] is True
+    assert budgets[0]["remaining"] == -20.5
+    assert budgets[1]["utilization"] == 0.8
+    assert budgets[1]["period_start"] == "2025-03-10"
+
+
+@pytest.mark.asyncio
+async def test_broker_delivers_alerts_only_to_their_user():
+    broker = BudgetAlertBroker()
+    with broker.subscribe("user-1") as mine, broker.subscribe("user-2") as theirs:
+        broker._on_insert({"data": {"record": {"user_id": "user-1", "budget_name": "Groceries"}}})
+        assert (await mine.get())["budget_name"] == "Groceries"
+        assert theirs.empty()
+    assert broker.stats()["listeners"] == 0
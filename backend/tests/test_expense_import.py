@@ -0,0 +1,192 @@
+import uuid
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+
+from server import app
+from server.dependencies import get_db
+from server.routes.expenses import Expense
+from server.routes.users import get_current_user
+from utils.expense_import import ExpenseImporter, delete_expenses, normalize_row, parse_csv, parse_ndjson, parse_ofx
+
+USER_ID = "c4304cf3-d239-449f-986e-e879da77ae01"
+
+OFX = b"""OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250301120000[-5:EST]<TRNAMT>-12.50<FITID>A1<NAME>STARBUCKS #123</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250302<TRNAMT>1000.00<FITID>A2<NAME>PAYROLL</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+async def chunked(data: bytes, size: int = 7):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def collect(rows):
+    return [row async for row in rows]
+
+
+@pytest.mark.asyncio
+async def test_parsers_handle_records_split_across_chunks():
+    csv_rows = await collect(parse_csv(chunked(b"date,amount,merchant\r\n2025-03-01,\"$1,204.50\",Rent Co\r\n")))
+    assert csv_rows == [{"date": "2025-03-01", "amount": "$1,204.50", "merchant": "Rent Co"}]
+
+    ndjson_rows = await collect(parse_ndjson(chunked(b'{"amount": 3}\nnot json\n[1, 2]\n')))
+    assert ndjson_rows[0] == {"amount": 3}
+    assert isinstance(ndjson_rows[1], ValueError)
+    assert str(ndjson_rows[2]) == "Expected a JSON object, not list"
+
+    ofx_rows = await collect(parse_ofx(chunked(OFX)))
+    assert ofx_rows == [
+        {"amount": "-12.50", "date": "2025-03-01T12:00:00", "business_name": "STARBUCKS #123", "ofx_fitid": "A1"},
+        {"amount": "1000.00", "date": "2025-03-02T00:00:00", "business_name": "PAYROLL", "ofx_fitid": "A2"},
+    ]
+
+
+def test_normalize_row():
+    row = normalize_row({"Payee": "Starbucks", "Amount": "-4.75", "user_id": "someone-else", "ofx_fitid": "A1"}, USER_ID)
+    assert row["business_name"] == "Starbucks"
+    assert row["amount"] == 4.75
+    assert row["category"] == "Food"
+    assert row["user_id"] == USER_ID
+    # Re-importing the same bank transaction produces the same id
+    assert row["id"] == str(uuid.uuid5(uuid.NAMESPACE_URL, f"{USER_ID}:A1"))
+
+
+def test_normalize_row_skips_credits():
+    # Signed statements: debits are negative, so a positive amount is money coming in
+    assert normalize_row({"amount": "1000.00", "name": "PAYROLL"}, USER_ID, signed=True) is None
+    assert normalize_row({"amount": "-12.50", "name": "Cafe"}, USER_ID, signed=True)["amount"] == 12.5
+    # A type column wins over the sign either way
+    assert normalize_row({"amount": "25", "type": "Credit"}, USER_ID) is None
+    assert normalize_row({"amount": "25", "type": "debit", "category": "Food"}, USER_ID, signed=True)["amount"] == 25
+    # Unsigned imports (the app's own exports) store expenses as positive amounts
+    assert normalize_row({"amount": 7, "category": "Pets"}, USER_ID)["amount"] == 7
+
+
+@pytest.mark.asyncio
+async def test_importer_writes_one_batch_per_chunk_with_per_row_results():
+    db = MagicMock()
+    db.table.return_value.insert.return_value.execute = AsyncMock()
+    importer = ExpenseImporter(db, USER_ID, Expense, chunk_size=2)
+
+    async def rows():
+        yield {"amount": "5", "category": "Food"}
+        yield {"amount": "not a number", "category": "Food"}
+        yield {"amount": 7, "category": "Pets"}
+
+    results = [result async for result in importer.run(rows())]
+
+    assert [result["status"] for result in results] == ["written", "invalid", "written"]
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert "amount" in results[1]["error"]
+    assert db.table.return_value.insert.call_count == 2
+    assert importer.counts == {"written": 2, "skipped": 0, "invalid": 1, "forbidden": 0, "failed": 0}
+
+
+@pytest.mark.asyncio
+async def test_importer_reports_credits_and_non_object_lines():
+    db = MagicMock()
+    db.table.return_value.insert.return_value.execute = AsyncMock()
+    importer = ExpenseImporter(db, USER_ID, Expense, signed=True)
+
+    ndjson = b'{"amount": "-4.50", "category": "Food"}\n[1, 2]\n{"amount": "20.00", "category": "Other"}\n'
+    results = [result async for result in importer.run(parse_ndjson(chunked(ndjson)))]
+
+    assert [result["status"] for result in results] == ["written", "invalid", "skipped"]
+    assert results[2]["reason"] == "credit"
+    payload = db.table.return_value.insert.call_args.args[0]
+    assert [row["amount"] for row in payload] == [4.5]
+
+
+def test_import_endpoint_returns_counts_and_per_row_results():
+    db = MagicMock()
+    db.table.return_value.insert.return_value.execute = AsyncMock()
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=USER_ID)
+    try:
+        response = TestClient(app).post("/api/expenses/import", files={"file": ("statement.ofx", OFX)})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    body = response.json()
+    assert body["written"] == 1 and body["skipped"] == 1
+    assert [result["status"] for result in body["results"]] == ["written", "skipped"]
+
+
+def test_import_reads_csv_and_ndjson_as_positive_expenses_unless_asked():
+    db = MagicMock()
+    db.table.return_value.insert.return_value.execute = AsyncMock()
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=USER_ID)
+    # What GET /api/expenses/?format=ndjson exports
+    export = b'{"amount": 4.5, "category": "Food"}\n{"amount": 12.0, "category": "Travel"}\n'
+    try:
+        client = TestClient(app)
+        default = client.post("/api/expenses/import", files={"file": ("export.ndjson", export)}).json()
+        signed = client.post("/api/expenses/import?amounts=signed", files={"file": ("export.ndjson", export)}).json()
+    finally:
+        app.dependency_overrides.clear()
+
+    assert default["written"] == 2 and default["skipped"] == 0
+    assert signed["written"] == 0 and signed["skipped"] == 2
+
+
+@pytest.mark.asyncio
+async def test_a_row_that_cannot_be_read_is_invalid_not_fatal(monkeypatch):
+    db = MagicMock()
+    db.table.return_value.insert.return_value.execute = AsyncMock()
+    importer = ExpenseImporter(db, USER_ID, Expense)
+
+    ndjson = b'{"amount": "12.5", "business_name": 123}\n{"amount": "3", "category": "Food"}\n{"amount": "boom"}\n'
+    real_normalize_row = normalize_row
+
+    def normalize(row, user_id, signed=False):
+        if row["amount"] == "boom":
+            raise TypeError("unexpected value")
+        return real_normalize_row(row, user_id, signed)
+
+    monkeypatch.setattr("utils.expense_import.normalize_row", normalize)
+    results = [result async for result in importer.run(parse_ndjson(chunked(ndjson)))]
+
+    assert [result["status"] for result in results] == ["invalid", "written", "invalid"]
+    assert "business_name" in results[0]["error"]
+    assert "unexpected value" in results[2]["error"]
+
+
+@pytest.mark.asyncio
+async def test_upsert_refuses_ids_owned_by_another_user():
+    taken, mine = str(uuid.uuid4()), str(uuid.uuid4())
+    db = MagicMock()
+    db.table.return_value.select.return_value.in_.return_value.execute = AsyncMock(
+        return_value=MagicMock(data=[{"id": taken, "user_id": "someone-else"}, {"id": mine, "user_id": USER_ID}])
+    )
+    db.table.return_value.upsert.return_value.execute = AsyncMock()
+    importer = ExpenseImporter(db, USER_ID, Expense, mode="upsert")
+
+    results = await importer.write_chunk(0, [
+        normalize_row({"id": taken, "amount": 1, "category": "Food"}, USER_ID),
+        normalize_row({"id": mine, "amount": 2, "category": "Food"}, USER_ID),
+    ])
+
+    assert [result["status"] for result in results] == ["forbidden", "written"]
+    payload = db.table.return_value.upsert.call_args.args[0]
+    assert [row["id"] for row in payload] == [mine]
+
+
+@pytest.mark.asyncio
+async def test_delete_expenses_reports_missing_ids():
+    db = MagicMock()
+    db.table.return_value.delete.return_value.eq.return_value.in_.return_value.execute = AsyncMock(
+        return_value=MagicMock(data=[{"id": "a"}])
+    )
+    assert await delete_expenses(db, USER_ID, ["a", "b"]) == [
+        {"id": "a", "status": "deleted"},
+        {"id": "b", "status": "not_found"},
+    ]
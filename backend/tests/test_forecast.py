@@ -0,0 +1,65 @@
+from datetime import date
+
+import numpy as np
+
+from utils.forecast import forecast_goals, monthly_totals, seasonality
+
+TODAY = date(2025, 3, 15)
+
+
+def goal(**overrides):
+    return {
+        "target_amount": 1200,
+        "current_amount": 0,
+        "actionable_amount": 100,
+        "frequency": "monthly",
+        "deadline": "2026-12-31T00:00:00",
+        **overrides,
+    }
+
+
+def test_monthly_totals_skip_the_current_month():
+    dates = np.array(["2025-01-05", "2025-01-20", "2025-03-01"], dtype="datetime64[D]")
+    months, totals = monthly_totals(dates, [10.0, 5.0, 99.0], TODAY)
+    assert totals.tolist() == [15.0, 0.0]
+    assert months.astype("datetime64[M]").astype(str).tolist() == ["2025-01", "2025-02"]
+
+
+def test_seasonality_needs_a_full_year():
+    months = np.arange(600, 606)
+    assert seasonality(months, np.ones(6)).tolist() == [1.0] * 12
+
+    months = np.arange(600, 624)  # two full years starting in January
+    totals = np.where(months % 12 == 11, 300.0, 100.0)  # December is expensive
+    index = seasonality(months, totals)
+    assert index[11] > 2 * index[0]
+
+
+def test_forecast_projects_every_goal_in_one_pass():
+    forecast = forecast_goals([], [], [
+        goal(),
+        goal(current_amount=1200),
+        goal(actionable_amount=25, frequency="weekly", deadline="2025-06-30"),
+        goal(actionable_amount=0),
+    ], today=TODAY)
+
+    steady, finished, behind, stalled = forecast["goals"]
+    assert steady["months_to_completion"] == 12
+    assert steady["projected_completion"] == "2026-03-31"
+    assert steady["on_track"] is True
+    assert finished["months_to_completion"] == 0
+    assert behind["monthly_savings"] == 108.71
+    assert behind["on_track"] is False
+    assert behind["required_monthly_savings"] > 300
+    assert stalled["projected_completion"] is None
+    assert stalled["on_track"] is False
+
+
+def test_expensive_months_slow_savings_down():
+    months = np.arange(np.datetime64("2023-01"), np.datetime64("2025-01"))
+    amounts = np.where(months.astype(np.int64) % 12 == 11, 600.0, 100.0)
+    forecast = forecast_goals(months.astype("datetime64[D]"), amounts, [goal()], today=TODAY)
+
+    assert forecast["seasonality"][11] > 1
+    # December's extra spending eats that month's savings, so the goal lands a month later
+    assert forecast["goals"][0]["months_to_completion"] == 13
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from server.middleware import IdempotencyMiddleware
+from utils.idempotency import IdempotencyConflict, IdempotencyStore
+
+
+def make_client():
+    app = FastAPI()
+    calls = []
+
+    @app.post("/api/expenses/create")
+    async def create(body: dict):
+        calls.append(body)
+        return {"created": len(calls)}
+
+    @app.post("/api/expenses/upload")
+    async def upload(file: UploadFile = File(...)):
+        calls.append(file.filename)
+        return {"uploaded": len(calls)}
+
+    @app.post("/api/expenses/fail")
+    async def fail():
+        calls.append(None)
+        raise RuntimeError("database unavailable")
+
+    app.add_middleware(IdempotencyMiddleware, store=IdempotencyStore(), prefixes=("/api/expenses",))
+    return TestClient(app, raise_server_exceptions=False), calls
+
+
+def test_retries_replay_the_first_response():
+    client, calls = make_client()
+    headers = {"Idempotency-Key": "abc"}
+
+    first = client.post("/api/expenses/create", json={"amount": 5}, headers=headers)
+    retry = client.post("/api/expenses/create", json={"amount": 5}, headers=headers)
+
+    assert first.json() == retry.json() == {"created": 1}
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert len(calls) == 1
+
+    # No key, or another user's cookie, means a separate request
+    client.post("/api/expenses/create", json={"amount": 5})
+    client.post("/api/expenses/create", json={"amount": 5}, headers=headers, cookies={"access_token": "other-user"})
+    assert len(calls) == 3
+
+
+def test_key_reuse_with_a_different_body_is_rejected():
+    client, calls = make_client()
+    client.post("/api/expenses/create", json={"amount": 5}, headers={"Idempotency-Key": "abc"})
+    response = client.post("/api/expenses/create", json={"amount": 6}, headers={"Idempotency-Key": "abc"})
+    assert response.status_code == 422
+    assert len(calls) == 1
+
+
+def test_uploads_are_compared_by_contents_not_boundary():
+    client, calls = make_client()
+    headers = {"Idempotency-Key": "abc"}
+
+    # httpx picks a fresh random boundary for every request
+    first = client.post("/api/expenses/upload", files={"file": ("receipt.jpg", b"first image", "image/jpeg")}, headers=headers)
+    retry = client.post("/api/expenses/upload", files={"file": ("receipt.jpg", b"first image", "image/jpeg")}, headers=headers)
+    assert first.json() == retry.json() == {"uploaded": 1}
+    assert retry.headers["Idempotent-Replayed"] == "true"
+
+    other = client.post("/api/expenses/upload", files={"file": ("receipt.jpg", b"second image", "image/jpeg")}, headers=headers)
+    assert other.status_code == 422
+    assert len(calls) == 1
+
+
+def test_anonymous_callers_do_not_share_keys():
+    client, calls = make_client()
+    alice = TestClient(client.app, client=("10.0.0.1", 5000))
+    bob = TestClient(client.app, client=("10.0.0.2", 5000))
+    alice.post("/api/expenses/create", json={"amount": 5}, headers={"Idempotency-Key": "abc"})
+    response = bob.post("/api/expenses/create", json={"amount": 5}, headers={"Idempotency-Key": "abc"})
+    assert "Idempotent-Replayed" not in response.headers
+    assert len(calls) == 2
+
+
+def test_server_errors_are_not_replayed():
+    client, calls = make_client()
+    assert client.post("/api/expenses/fail", headers={"Idempotency-Key": "abc"}).status_code == 500
+    assert client.post("/api/expenses/fail", headers={"Idempotency-Key": "abc"}).status_code == 500
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_wait_for_the_first_request():
+    store = IdempotencyStore()
+    runs = 0
+
+    async def handle():
+        nonlocal runs
+        stored = await store.acquire("key", "body")
+        if stored is not None:
+            return stored
+        runs += 1
+        await asyncio.sleep(0.01)
+        response = {"status": 201, "headers": [], "body": b"{}"}
+        store.release("key", response)
+        return response
+
+    responses = await asyncio.gather(*(handle() for _ in range(5)))
+    assert runs == 1
+    assert all(response["status"] == 201 for response in responses)
+    assert store.stats()["coalesced"] == 4
+
+    with pytest.raises(IdempotencyConflict):
+        await store.acquire("key", "another body")
+
+
+@pytest.mark.asyncio
+async def test_completed_responses_expire():
+    store = IdempotencyStore(ttl=0)
+    assert await store.acquire("key", "body") is None
+    store.release("key", {"status": 201, "headers": [], "body": b"{}"})
+    assert await store.acquire("key", "body") is None
+
+
+@pytest.mark.asyncio
+async def test_stored_responses_are_bounded_by_total_size():
+    store = IdempotencyStore(max_bytes=250)
+    for key in ("a", "b", "c"):
+        assert await store.acquire(key, "body") is None
+        store.release(key, {"status": 201, "headers": [(b"content-type", b"application/json")], "body": b"x" * 80})
+
+    # Each entry is 108 bytes, so only the two most recent fit
+    assert store.stats()["entries"] == 2
+    assert store.stats()["bytes"] == 216
+    assert await store.acquire("a", "body") is None
+    assert (await store.acquire("c", "body"))["status"] == 201
+
+    # A response larger than the whole budget is not kept at all
+    store.release("a", {"status": 201, "headers": [], "body": b"x" * 300})
+    assert await store.acquire("a", "body") is None
+    assert store.stats()["entries"] == 2
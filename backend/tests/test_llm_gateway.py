@@ -0,0 +1,108 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.llm_gateway import LLMError, LLMGateway, LLMTimeout
+
+
+class StubLLMServer:
+    """Local OpenAI-compatible chat completion server driven by a list of scripted replies."""
+
+    def __init__(self, replies, delay=0.0):
+        self.replies = list(replies)
+        self.delay = delay
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                with stub._lock:
+                    stub.requests += 1
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    status, body = stub.replies.pop(0) if len(stub.replies) > 1 else stub.replies[0]
+                time.sleep(stub.delay)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                with stub._lock:
+                    stub.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def completion(content):
+    return 200, {"choices": [{"message": {"role": "assistant", "content": content}}], "usage": {"prompt_tokens": 1, "completion_tokens": 1}}
+
+
+@pytest.mark.asyncio
+async def test_retries_rate_limits_and_server_errors():
+    stub = StubLLMServer([(429, {"error": "slow down"}), (503, {"error": "busy"}), completion("hello")])
+    gateway = LLMGateway(stub.url, backoff=0.01)
+    try:
+        assert await gateway.complete([{"role": "user", "content": "hi"}]) == "hello"
+        assert stub.requests == 3
+        assert gateway.retries == 2
+    finally:
+        await gateway.aclose()
+        stub.close()
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried():
+    stub = StubLLMServer([(400, {"error": "bad request"})])
+    gateway = LLMGateway(stub.url, backoff=0.01)
+    try:
+        with pytest.raises(LLMError):
+            await gateway.complete([{"role": "user", "content": "hi"}])
+        assert stub.requests == 1
+    finally:
+        await gateway.aclose()
+        stub.close()
+
+
+@pytest.mark.asyncio
+async def test_deadline_covers_the_whole_call():
+    stub = StubLLMServer([completion("too late")], delay=0.5)
+    gateway = LLMGateway(stub.url, timeout=0.1)
+    try:
+        started = time.perf_counter()
+        with pytest.raises(LLMTimeout):
+            await gateway.complete([{"role": "user", "content": "hi"}])
+        assert time.perf_counter() - started < 0.4
+    finally:
+        await gateway.aclose()
+        stub.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_limited_per_gateway():
+    stub = StubLLMServer([completion("ok")], delay=0.05)
+    gateway = LLMGateway(stub.url, max_concurrency=2)
+    try:
+        await asyncio.gather(*(gateway.complete([{"role": "user", "content": "hi"}]) for _ in range(6)))
+        assert stub.requests == 6
+        assert stub.max_in_flight <= 2
+    finally:
+        await gateway.aclose()
+        stub.close()
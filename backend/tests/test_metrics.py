@@ -0,0 +1,87 @@
+import json
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from server.middleware import TimingMiddleware
+from utils.log import JSONFormatter, StructuredLogger
+from utils.metrics import get_histogram, render_prometheus, span
+from utils.supabase_client import db_target
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = get_histogram("test_histogram_seconds", route="/a")
+    for value in (0.0005, 0.02, 0.02, 100):
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 4
+    assert snapshot["buckets"][0.001] == 1
+    assert snapshot["buckets"][0.025] == 3
+    assert snapshot["buckets"][float("inf")] == 4
+    assert get_histogram("test_histogram_seconds", route="/a") is histogram
+
+
+def test_span_records_stage_time_even_on_error():
+    try:
+        with span("test_stage", target="x"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    assert get_histogram("stage_seconds", stage="test_stage", target="x").snapshot()["count"] == 1
+
+
+def test_prometheus_rendering():
+    get_histogram("test_render_seconds", route='/quote"d').observe(0.01)
+    text = render_prometheus()
+    assert "# TYPE budgetbuddy_test_render_seconds histogram" in text
+    assert 'budgetbuddy_test_render_seconds_bucket{route="/quote\\"d",le="+Inf"} 1' in text
+    assert 'budgetbuddy_test_render_seconds_count{route="/quote\\"d"} 1' in text
+
+
+def test_timing_middleware_labels_by_route_template():
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    app.add_middleware(TimingMiddleware)
+    client = TestClient(app)
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/nowhere")
+
+    labels = {"method": "GET", "route": "/items/{item_id}", "status": "200"}
+    assert get_histogram("http_request_duration_seconds", **labels).snapshot()["count"] == 2
+    unmatched = {"method": "GET", "route": "unmatched", "status": "404"}
+    assert get_histogram("http_request_duration_seconds", **unmatched).snapshot()["count"] == 1
+
+
+def test_db_target_labels():
+    assert db_target("/rest/v1/expenses") == "expenses"
+    assert db_target("/rest/v1/rpc/spending_summary") == "rpc/spending_summary"
+    assert db_target("/auth/v1/user") == "auth"
+
+
+def test_structured_logger_skips_disabled_levels():
+    records = []
+    logger = logging.getLogger("budgetbuddy.test_metrics")
+    logger.setLevel(logging.INFO)
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger.addHandler(handler)
+    try:
+        log = StructuredLogger(logger)
+        log.debug("not_emitted", payload=object())
+        log.info("receipt_saved", user_id="user-1", amount=12.5)
+    finally:
+        logger.removeHandler(handler)
+
+    assert len(records) == 1
+    line = json.loads(JSONFormatter().format(records[0]))
+    assert line["event"] == "receipt_saved"
+    assert line["level"] == "info"
+    assert line["user_id"] == "user-1"
+    assert line["amount"] == 12.5
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from utils.ocr_workers import OCRQueueFull, OCRWorkerPool
+
+
+class SleepyScanner:
+    """Built in each worker process. The 'image' is how long to pretend to scan."""
+
+    def scan_receipt(self, image):
+        time.sleep(float(image or 0))
+        return os.getpid()
+
+
+def make_pool(**kwargs):
+    return OCRWorkerPool(scanner_factory=SleepyScanner, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_scan_runs_in_a_worker_process():
+    pool = make_pool()
+    with pytest.raises(RuntimeError):
+        await pool.scan(b"0")
+    await pool.start()
+    try:
+        assert await pool.scan(b"0") != os.getpid()
+    finally:
+        await pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_full_pool_rejects_new_receipts():
+    pool = make_pool(max_pending=1)
+    await pool.start()
+    try:
+        running = asyncio.create_task(pool.scan(b"0.3"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(OCRQueueFull):
+            await pool.scan(b"0")
+        assert pool.stats()["rejected"] == 1
+        await running
+        assert await pool.scan(b"0")
+    finally:
+        await pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_timed_out_job_keeps_its_slot_until_it_finishes():
+    pool = make_pool(max_pending=1, request_timeout=0.1)
+    await pool.start()
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.scan(b"0.5")
+        # The worker is still busy with the abandoned receipt, so there is no room yet
+        assert pool.stats()["pending"] == 1
+        with pytest.raises(OCRQueueFull):
+            await pool.scan(b"0")
+
+        await asyncio.sleep(0.6)
+        assert pool.stats()["pending"] == 0
+        assert await pool.scan(b"0")
+    finally:
+        await pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_workers_are_recycled_after_max_jobs():
+    pool = make_pool(max_jobs_per_worker=2)
+    await pool.start()
+    try:
+        # The warm-up job counts towards the first worker's limit
+        pids = [await pool.scan(b"0") for _ in range(4)]
+    finally:
+        await pool.shutdown()
+    assert len(set(pids)) >= 2
+
+
+@pytest.mark.asyncio
+async def test_shutdown_waits_for_running_jobs_and_refuses_new_ones():
+    pool = make_pool(max_pending=4)
+    await pool.start()
+    running = asyncio.create_task(pool.scan(b"0.2"))
+    await asyncio.sleep(0.05)
+    await pool.shutdown()
+
+    # The running receipt was finished, not dropped
+    assert await asyncio.wait_for(running, timeout=1)
+    with pytest.raises(RuntimeError):
+        await pool.scan(b"0")
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+
+from server import app
+from server.dependencies import get_db
+from server.routes.users import get_current_user
+
+client = TestClient(app)
+
+GOAL = {"title": "Trip", "target_amount": 1000, "current_amount": 100, "actionable_amount": 50, "frequency": "monthly", "deadline": "2026-01-01T00:00:00"}
+
+
+@pytest.fixture
+def db():
+    """A Supabase client double whose rpc answers come from `db.answer`."""
+    db = MagicMock()
+    db.rpc.return_value.execute = AsyncMock(side_effect=lambda: MagicMock(data=db.answer))
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id="user-1")
+    yield db
+    app.dependency_overrides.clear()
+
+
+def assert_single_round_trip(db):
+    assert db.rpc.call_count == 1
+    assert db.rpc.return_value.execute.await_count == 1
+    db.table.assert_not_called()
+
+
+@pytest.mark.parametrize("path, name", [("/api/budgets/delete/b1", "Budget 'Food'"), ("/api/goals/delete/g1", "Goal 'Trip'")])
+def test_delete_is_one_request(db, path, name):
+    db.answer = {"status": "ok", "row": {"name": "Food", "title": "Trip"}}
+    response = client.delete(path)
+    assert response.status_code == 200
+    assert name in response.json()["message"]
+    assert_single_round_trip(db)
+
+
+@pytest.mark.parametrize("status, code", [("not_found", 404), ("forbidden", 403)])
+@pytest.mark.parametrize("path", ["/api/budgets/delete/b1", "/api/goals/delete/g1"])
+def test_delete_tells_not_found_from_forbidden(db, path, status, code):
+    db.answer = {"status": status, "row": None}
+    assert client.delete(path).status_code == code
+    assert_single_round_trip(db)
+
+
+def test_update_goal_is_one_request(db):
+    db.answer = {"status": "ok", "row": {"id": "g1", **GOAL}}
+    response = client.put("/api/goals/update/g1", json=GOAL)
+    assert response.status_code == 200
+    assert response.json()["title"] == "Trip"
+    assert_single_round_trip(db)
+    assert db.rpc.call_args.args[1]["p_patch"]["title"] == "Trip"
+
+
+def test_update_goal_forbidden(db):
+    db.answer = {"status": "forbidden", "row": None}
+    assert client.put("/api/goals/update/g1", json=GOAL).status_code == 403
+    assert_single_round_trip(db)
@@ -0,0 +1,112 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+
+from server import app
+from server.dependencies import get_db, get_user_cache
+from server.routes.expenses import ExpenseListParams
+from server.routes.users import get_current_user
+from utils.user_cache import UserCache
+from utils.pagination import DEFAULT_PAGE_SIZE, apply_keyset, decode_cursor, encode_cursor, split_page
+
+
+class RecordingQuery:
+    """Stands in for a PostgREST query builder and records the calls made on it."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return method
+
+
+A, B, C, Y, Z = (f"00000000-0000-4000-8000-{n:012x}" for n in range(1, 6))
+ROWS = [
+    {"id": C, "date": "2025-03-03T10:00:00+00:00", "amount": 3.0},
+    {"id": B, "date": "2025-03-02T10:00:00+00:00", "amount": 2.0},
+    {"id": A, "date": "2025-03-01T10:00:00+00:00", "amount": 1.0},
+]
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(ROWS[0])
+    assert decode_cursor(cursor) == ["2025-03-03T10:00:00+00:00", C]
+
+
+@pytest.mark.parametrize("values", [
+    ["2025-03-03T10:00:00+00:00", 'x"),id.gt.("'],
+    ['2025-03-03",amount.gt."0', C],
+    ["yesterday", C],
+    [None, "c"],
+    [1, C],
+    [C],
+])
+def test_invalid_cursor(values):
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+    # Only a datetime (or null) and a UUID may reach the PostgREST filter
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor(dict(enumerate(values)), keys=tuple(range(len(values)))))
+
+
+def test_crafted_cursor_is_a_bad_request():
+    db = MagicMock()
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_user_cache] = UserCache
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=C)
+    cursor = encode_cursor({"date": "2025-03-03", "id": 'x"),user_id.neq.("'})
+    try:
+        response = TestClient(app).get("/api/expenses/", params={"cursor": cursor})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_split_page_returns_next_cursor_only_when_more_rows():
+    rows, next_cursor = split_page(ROWS, 2)
+    assert rows == ROWS[:2]
+    assert decode_cursor(next_cursor) == ["2025-03-02T10:00:00+00:00", B]
+
+    rows, next_cursor = split_page(ROWS, 3)
+    assert rows == ROWS
+    assert next_cursor is None
+
+
+def test_keyset_filter_and_order():
+    query = apply_keyset(RecordingQuery(), encode_cursor(ROWS[1]), 2)
+
+    names = [name for name, _, _ in query.calls]
+    assert names == ["or_", "order", "order", "limit"]
+    # Undated rows sort last, so they are still ahead of any dated cursor
+    assert query.calls[0][1][0] == f'date.lt."2025-03-02T10:00:00+00:00",and(date.eq."2025-03-02T10:00:00+00:00",id.lt."{B}"),date.is.null'
+    assert query.calls[1] == ("order", ("date",), {"desc": True, "nullsfirst": False})
+    assert query.calls[-1][1] == (3,)
+
+
+def test_page_ending_on_an_undated_row():
+    rows = [ROWS[0], {"id": Z, "date": None, "amount": 4.0}, {"id": Y, "date": None, "amount": 5.0}]
+    page, next_cursor = split_page(rows, 2)
+    assert page == rows[:2]
+    assert decode_cursor(next_cursor) == [None, Z]
+
+    query = apply_keyset(RecordingQuery(), next_cursor, 2)
+    assert query.calls[:2] == [("is_", ("date", "null"), {}), ("lt", ("id", Z), {})]
+
+
+def test_no_limit_returns_every_row():
+    query = apply_keyset(RecordingQuery(), None, None)
+    assert [name for name, _, _ in query.calls] == ["order", "order"]
+    assert split_page(ROWS, None) == (ROWS, None)
+
+
+def test_listing_is_unbounded_unless_paging_is_asked_for():
+    assert ExpenseListParams(limit=None, cursor=None, fields=None, start=None, end=None, category=None, format=None, accept=None).limit is None
+    cursor = encode_cursor(ROWS[1])
+    assert ExpenseListParams(limit=None, cursor=cursor, fields=None, start=None, end=None, category=None, format=None, accept=None).limit == DEFAULT_PAGE_SIZE
@@ -0,0 +1,89 @@
+import time
+from utils.receipt_cache import ReceiptCache, content_key
+
+SCAN = {"menu": [{"nm": "Burger", "price": "9.99"}], "total": {"total_price": "9.99"}}
+
+
+def test_same_bytes_hit_and_count():
+    cache = ReceiptCache()
+    assert cache.get(b"receipt") is None
+    cache.put(b"receipt", SCAN, category="Food", price="9.99", business_name="Diner")
+
+    entry = cache.get(b"receipt")
+    assert entry["scan"] == SCAN
+    assert entry["category"] == "Food"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert content_key(b"receipt") != content_key(b"receipt2")
+
+
+def test_lru_eviction():
+    cache = ReceiptCache(max_entries=2)
+    cache.put(b"a", SCAN)
+    cache.put(b"b", SCAN)
+    cache.get(b"a")
+    cache.put(b"c", SCAN)
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") is not None
+
+
+def test_ttl_expiry():
+    cache = ReceiptCache(ttl=0.01)
+    cache.put(b"receipt", SCAN)
+    time.sleep(0.02)
+    assert cache.get(b"receipt") is None
+
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    db_path = str(tmp_path / "receipts.sqlite")
+    cache = ReceiptCache(db_path=db_path)
+    cache.put(b"receipt", SCAN, category="Food")
+    cache.close()
+
+    restarted = ReceiptCache(db_path=db_path)
+    entry = restarted.get(b"receipt")
+    assert entry["scan"] == SCAN
+    assert entry["category"] == "Food"
+
+
+def photo(shade: int = 0, quality: int = 95) -> bytes:
+    """A receipt-like gradient; the same shade at another JPEG quality is a near-identical photo."""
+    import io
+    from PIL import Image
+
+    image = Image.new("L", (90, 160))
+    image.putdata([(x * 3 + y + shade * (x % 7)) % 256 for y in range(160) for x in range(90)])
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def test_exact_matches_are_shared_between_users():
+    cache = ReceiptCache()
+    cache.put(b"receipt", SCAN, user_id="user-1", category="Food")
+    assert cache.get(b"receipt", "user-2")["category"] == "Food"
+
+
+def test_perceptual_matches_only_reach_the_same_user():
+    cache = ReceiptCache(perceptual=True)
+    original, recompressed = photo(quality=95), photo(quality=60)
+    assert original != recompressed
+    cache.put(original, SCAN, user_id="user-1", category="Food", price="9.99")
+
+    # Someone else's receipt that merely looks alike must not inherit this price
+    assert cache.get(recompressed, "user-2") is None
+    assert cache.get(recompressed) is None
+    assert cache.get(recompressed, "user-1")["price"] == "9.99"
+
+
+def test_saved_expenses_are_remembered_per_user(tmp_path):
+    db_path = str(tmp_path / "receipts.sqlite")
+    cache = ReceiptCache(db_path=db_path)
+    cache.put(b"receipt", SCAN, user_id="user-1", category="Food")
+    cache.put(b"receipt", SCAN, user_id="user-1", expense_id="expense-1", category="Food")
+    cache.put(b"receipt", SCAN, user_id="user-2", expense_id="expense-2", category="Food")
+    cache.close()
+
+    entry = ReceiptCache(db_path=db_path).get(b"receipt")
+    assert entry["expense_ids"] == {"user-1": "expense-1", "user-2": "expense-2"}
+    assert entry["user_ids"] == ["user-1", "user-2"]
@@ -0,0 +1,61 @@
+import pytest
+from unittest.mock import AsyncMock
+
+from utils.receipt_extraction import extract_receipt_fields
+
+SCAN = {"menu": [{"nm": "Burger", "price": "9.99"}], "total": {"total_price": "9.99"}}
+UNREADABLE_SCAN = {"menu": [{"nm": "Item 1"}]}
+
+
+def completion(content, prompt_tokens=100, completion_tokens=20):
+    return {
+        "choices": [{"message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens},
+    }
+
+
+@pytest.mark.asyncio
+async def test_single_structured_call():
+    gateway = AsyncMock()
+    gateway.chat.return_value = completion(
+        '<think>It is a diner.</think>\n{"category": "food", "price": "$9.99", "business_name": "Joe\'s Diner"}'
+    )
+
+    fields, usage = await extract_receipt_fields(UNREADABLE_SCAN, gateway)
+
+    assert fields.category == "Food"
+    assert fields.price == 9.99
+    assert fields.business_name == "Joe's Diner"
+    assert gateway.chat.await_count == 1
+    assert usage["llm_calls"] == 1
+    assert usage["prompt_tokens"] == 100
+    assert usage["retried_fields"] == []
+
+
+@pytest.mark.asyncio
+async def test_only_invalid_field_is_retried():
+    gateway = AsyncMock()
+    gateway.chat.side_effect = [
+        completion('{"category": "Food", "price": "unknown", "business_name": "Joe\'s Diner"}'),
+        completion("<think>Total line says 9.99</think>$9.99"),
+    ]
+
+    fields, usage = await extract_receipt_fields(UNREADABLE_SCAN, gateway)
+
+    assert fields.price == 9.99
+    assert gateway.chat.await_count == 2
+    assert usage["retried_fields"] == ["price"]
+    assert usage["completion_tokens"] == 40
+
+
+@pytest.mark.asyncio
+async def test_confident_rules_skip_the_llm():
+    gateway = AsyncMock()
+
+    fields, usage = await extract_receipt_fields(SCAN, gateway)
+
+    assert fields.category == "Food"
+    assert fields.price == 9.99
+    assert fields.business_name is None
+    assert usage["source"] == "rules"
+    gateway.chat.assert_not_awaited()
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import socket
+
+import httpx
+import pytest
+
+from utils.receipt_jobs import ReceiptJobQueue, ReceiptJobWorkers, UnsafeWebhookURL, resolve_webhook_url
+
+
+def test_jobs_survive_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    queue = ReceiptJobQueue(path)
+    job = queue.enqueue(b"image", "user-1")
+    queue.close()
+
+    reopened = ReceiptJobQueue(path)
+    claimed = reopened.claim()
+    assert claimed["id"] == job["id"]
+    assert claimed["image"] == b"image"
+    assert reopened.get(job["id"])["status"] == "running"
+
+
+def test_failures_back_off_then_dead_letter():
+    queue = ReceiptJobQueue(max_attempts=2, retry_delay=0)
+    job = queue.enqueue(b"image", "user-1")
+
+    queue.claim()
+    assert queue.fail(job["id"], "timeout")["status"] == "queued"
+    queue.claim()
+    dead = queue.fail(job["id"], "timeout again")
+    assert dead["status"] == "dead"
+    assert dead["error"] == "timeout again"
+    assert queue.claim() is None
+
+    assert queue.retry(job["id"])["status"] == "queued"
+    assert queue.claim()["image"] == b"image"
+
+
+def test_expired_lease_is_handed_out_again():
+    queue = ReceiptJobQueue(lease_seconds=-1)
+    job = queue.enqueue(b"image", "user-1")
+    assert queue.claim()["attempts"] == 1
+    # The first worker died without reporting back
+    assert queue.claim()["attempts"] == 2
+    assert queue.get(job["id"])["status"] == "running"
+
+
+def test_only_the_current_claim_can_finish_a_job():
+    queue = ReceiptJobQueue(lease_seconds=-1)
+    job = queue.enqueue(b"image", "user-1")
+    stale = queue.claim()
+    current = queue.claim()
+
+    # The first worker's lease ran out and the job was handed out again
+    assert queue.complete(job["id"], {"amount": 1}, attempt=stale["attempts"]) is None
+    assert queue.fail(job["id"], "late", attempt=stale["attempts"]) is None
+    assert not queue.renew(job["id"], stale["attempts"])
+    assert queue.get(job["id"])["status"] == "running"
+    assert queue.complete(job["id"], {"amount": 2}, attempt=current["attempts"])["result"] == {"amount": 2}
+
+
+@pytest.mark.asyncio
+async def test_expired_last_attempt_is_dead_lettered_with_webhook(monkeypatch):
+    queue = ReceiptJobQueue(max_attempts=1, lease_seconds=-1)
+    requests = []
+
+    async def getaddrinfo(host, port, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("93.184.216.34", port))]
+
+    monkeypatch.setattr(asyncio.get_running_loop(), "getaddrinfo", getaddrinfo)
+
+    def deliver(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(200)
+
+    job = queue.enqueue(b"image", "user-1", "https://hooks.example.com/hook")
+    queue.claim()
+    # The worker died holding the job's only attempt
+    updates = queue.watch(job["id"])
+    assert (await anext(updates))["status"] == "running"
+
+    workers = ReceiptJobWorkers(queue, lambda job: None, workers=1, transport=httpx.MockTransport(deliver))
+    await workers.start()
+    try:
+        dead = await asyncio.wait_for(anext(updates), 1)
+        for _ in range(20):
+            if requests:
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        await updates.aclose()
+        await workers.stop()
+
+    assert dead["status"] == "dead"
+    assert dead["error"] == "Worker lease expired"
+    assert [(request["id"], request["status"]) for request in requests] == [(job["id"], "dead")]
+
+
+@pytest.mark.asyncio
+async def test_workers_renew_the_lease_of_a_slow_job():
+    queue = ReceiptJobQueue(lease_seconds=0.1)
+    handed_out_again = []
+
+    async def handler(job):
+        for _ in range(4):
+            await asyncio.sleep(0.1)
+            handed_out_again.append(queue.claim())
+        return {"amount": 12.5}
+
+    workers = ReceiptJobWorkers(queue, handler, workers=1)
+    await workers.start()
+    try:
+        job = queue.enqueue(b"image", "user-1")
+        updates = [update async for update in queue.watch(job["id"])]
+    finally:
+        await workers.stop()
+
+    assert handed_out_again == [None] * 4
+    assert updates[-1]["status"] == "done"
+    assert updates[-1]["attempts"] == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/hook",
+    "http://localhost:8000/hook",
+    "http://10.0.0.5/hook",
+    "http://192.168.1.1/hook",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://[::1]/hook",
+    "http://[::ffff:127.0.0.1]/hook",
+    "http://0.0.0.0/hook",
+    "ftp://93.184.216.34/hook",
+    "not a url",
+])
+async def test_webhooks_must_point_at_public_addresses(url):
+    with pytest.raises(UnsafeWebhookURL):
+        await resolve_webhook_url(url)
+
+
+@pytest.mark.asyncio
+async def test_webhook_is_posted_to_the_checked_address_without_redirects(monkeypatch):
+    queue = ReceiptJobQueue()
+    requests = []
+    dns = {"hooks.example.com": "93.184.216.34", "internal.example.com": "10.0.0.7"}
+
+    async def getaddrinfo(host, port, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (dns[host], port))]
+
+    monkeypatch.setattr(asyncio.get_running_loop(), "getaddrinfo", getaddrinfo)
+
+    def deliver(request):
+        requests.append(request)
+        return httpx.Response(302, headers={"Location": "http://169.254.169.254/"})
+
+    async def handler(job):
+        return {"amount": 12.5}
+
+    workers = ReceiptJobWorkers(queue, handler, workers=1, transport=httpx.MockTransport(deliver))
+    await workers.start()
+    try:
+        # Stored before the enqueue check existed, or the name now resolves somewhere private
+        private = queue.enqueue(b"image", "user-1", "http://internal.example.com/hook")
+        public = queue.enqueue(b"image", "user-1", "https://hooks.example.com:8443/hook")
+        for job in (private, public):
+            [update async for update in queue.watch(job["id"])]
+        await asyncio.sleep(0.05)
+    finally:
+        await workers.stop()
+
+    assert len(requests) == 1
+    # Connects to the address that was checked; the name is kept for Host and TLS
+    assert requests[0].url == "https://93.184.216.34:8443/hook"
+    assert requests[0].headers["host"] == "hooks.example.com:8443"
+    assert requests[0].extensions["sni_hostname"] == "hooks.example.com"
+
+
+@pytest.mark.asyncio
+async def test_workers_process_jobs_and_report_status_changes():
+    queue = ReceiptJobQueue(retry_delay=0)
+    attempts = []
+
+    async def handler(job):
+        attempts.append(job["id"])
+        if len(attempts) == 1:
+            raise RuntimeError("LLM unavailable")
+        return {"amount": 12.5}
+
+    workers = ReceiptJobWorkers(queue, handler, workers=1)
+    await workers.start()
+    try:
+        job = queue.enqueue(b"image", "user-1")
+        statuses = [update["status"] async for update in queue.watch(job["id"])]
+    finally:
+        await workers.stop()
+
+    assert statuses[0] in ("queued", "running")
+    assert statuses[-1] == "done"
+    finished = queue.get(job["id"])
+    assert finished["result"] == {"amount": 12.5}
+    assert finished["attempts"] == 2
+
+
+@pytest.mark.asyncio
+async def test_permanent_errors_skip_retries():
+    queue = ReceiptJobQueue(retry_delay=0)
+
+    async def handler(job):
+        raise FileNotFoundError("not an image")
+
+    workers = ReceiptJobWorkers(queue, handler, workers=1, permanent_errors=(FileNotFoundError,))
+    await workers.start()
+    try:
+        job = queue.enqueue(b"garbage", "user-1")
+        updates = [update async for update in queue.watch(job["id"])]
+    finally:
+        await workers.stop()
+
+    assert updates[-1]["status"] == "dead"
+    assert updates[-1]["attempts"] == 1
@@ -0,0 +1,88 @@
+from datetime import date
+
+import pytest
+
+from utils.receipt_rules import classify, detect_currency, extract_fields_by_rules, parse_amount
+
+
+def test_parse_amount_formats():
+    assert parse_amount("$1,234.50") == 1234.5
+    assert parse_amount("12,50") == 12.5
+    assert parse_amount("Rp 45.000") == 45000
+    assert parse_amount("no price") is None
+
+
+def test_restaurant_receipt():
+    prediction = {
+        "menu": [{"nm": "Cheese Burger", "cnt": "1", "price": "9.99"}, {"nm": "Fries", "price": "3.50"}],
+        "sub_total": {"subtotal_price": "13.49", "tax_price": "1.20"},
+        "total": {"total_price": "$14.69"},
+        "etc": "03/05/2024",
+    }
+
+    fields = extract_fields_by_rules(prediction)
+
+    assert fields["price"] == 14.69
+    assert fields["category"] == "Food"
+    assert fields["currency"] == "USD"
+    assert fields["date"] == date(2024, 3, 5)
+    assert fields["confidence"]["price"] >= 0.9
+
+
+def test_known_merchant_sets_category():
+    fields = extract_fields_by_rules({"store_info": {"nm": "Shell Oil #1234"}, "menu": {"nm": "Unleaded", "price": "40.00"}, "total": {"total_price": "40.00"}})
+
+    assert fields["business_name"] == "Shell Oil #1234"
+    assert fields["category"] == "Transportation"
+    assert fields["confidence"]["category"] >= 0.9
+
+
+@pytest.mark.parametrize("business_name, category", [
+    ("McDonald's #42", "Food"),
+    ("Uber Trip", "Transportation"),
+    ("Hilton Hotels", "Travel"),
+    # Merchant names inside other words are not matches
+    ("Marco's Pizzeria", "Other"),
+    ("Huber's Cafe", "Other"),
+    ("Steamboat House", "Other"),
+])
+def test_merchants_match_whole_words(business_name, category):
+    assert classify(business_name, [])[0] == category
+
+
+@pytest.mark.parametrize("items, category", [
+    (["Cat litter 10kg"], "Pets"),
+    (["Dogs treats"], "Pets"),
+    (["Green tea", "Cheeseburger"], "Food"),
+    (["Sandwiches"], "Food"),
+    (["Room 204, 2 nights"], "Travel"),
+    (["Bus fares"], "Transportation"),
+    # Keywords inside other words are not matches
+    (["Catfish Platter"], "Other"),
+    (["Catering tray"], "Other"),
+    (["Petite sirloin"], "Other"),
+    (["Team lunch voucher"], "Other"),
+    (["Farewell card"], "Other"),
+    (["Roomba filter"], "Other"),
+])
+def test_item_keywords_match_whole_words(items, category):
+    assert classify(None, items)[0] == category
+
+
+@pytest.mark.parametrize("texts, currency", [
+    (["Rp 45.000"], "IDR"),
+    (["TOTAL Rp45.000"], "IDR"),
+    (["Sharp Electronics", "Total 12.00"], None),
+    (["Europe Mart"], None),
+    (["Total 12.00 USD"], "USD"),
+    (["€ 9,50"], "EUR"),
+])
+def test_currency_codes_match_whole_words(texts, currency):
+    assert detect_currency(texts) == currency
+
+
+def test_unreadable_receipt_has_low_confidence():
+    fields = extract_fields_by_rules({"menu": [{"nm": "Item 1"}]})
+
+    assert fields["price"] is None
+    assert fields["confidence"]["price"] == 0.0
@@ -0,0 +1,259 @@
+import asyncio
+import io
+import threading
+import time
+
+import pytest
+from PIL import Image
+from starlette.datastructures import UploadFile
+
+from utils.receipt_scanner import (
+    BatchingReceiptScanner,
+    ReceiptScannerPool,
+    ReceiptScannerUnavailable,
+    ReceiptTooLarge,
+    load_receipt_image,
+    read_upload,
+)
+
+
+class FakeScanner:
+    """Stands in for Donut: echoes its input and records how many scans overlap."""
+
+    instances = 0
+
+    def __init__(self, delay: float = 0.02):
+        FakeScanner.instances += 1
+        self.delay = delay
+        self.batches = []
+
+    def scan_receipt(self, image):
+        if image == b"unreadable":
+            raise FileNotFoundError("cannot identify image file")
+        with _overlap:
+            time.sleep(self.delay)
+        return {"image": image}
+
+    def scan_receipts(self, images):
+        self.batches.append(list(images))
+        if b"unreadable" in images:
+            raise FileNotFoundError("cannot identify image file")
+        with _overlap:
+            time.sleep(self.delay)
+        return [{"image": image} for image in images]
+
+
+class Overlap:
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.current -= 1
+
+
+_overlap = Overlap()
+
+
+@pytest.fixture
+def overlap():
+    _overlap.peak = 0
+    return _overlap
+
+
+def test_pool_size_must_be_positive():
+    with pytest.raises(ValueError):
+        ReceiptScannerPool(size=0, scanner_factory=FakeScanner)
+
+
+@pytest.mark.asyncio
+async def test_pool_loads_every_scanner_at_start():
+    FakeScanner.instances = 0
+    pool = ReceiptScannerPool(size=3, scanner_factory=FakeScanner)
+    with pytest.raises(RuntimeError):
+        await pool.scan(b"receipt")
+
+    await pool.start()
+    assert FakeScanner.instances == 3
+    assert pool.stats()["load_seconds"]["count"] >= 3
+    assert await pool.scan(b"receipt") == {"image": b"receipt"}
+
+
+@pytest.mark.asyncio
+async def test_pool_size_bounds_concurrent_scans(overlap):
+    pool = ReceiptScannerPool(size=2, scanner_factory=FakeScanner)
+    await pool.start()
+
+    results = await asyncio.gather(*(pool.scan(bytes([i])) for i in range(6)))
+    assert results == [{"image": bytes([i])} for i in range(6)]
+    assert overlap.peak == 2
+    assert pool.stats()["in_use"] == 0
+    assert pool.stats()["waiting"] == 0
+
+
+@pytest.mark.asyncio
+async def test_scanner_returns_to_the_pool_after_a_failure():
+    pool = ReceiptScannerPool(size=1, scanner_factory=FakeScanner)
+    await pool.start()
+
+    with pytest.raises(FileNotFoundError):
+        await pool.scan(b"unreadable")
+    # The only scanner was handed back, so the next upload does not wait forever
+    assert await asyncio.wait_for(pool.scan(b"receipt"), timeout=1) == {"image": b"receipt"}
+
+
+def broken_model():
+    time.sleep(0.05)
+    raise OSError("model weights not found")
+
+
+@pytest.mark.asyncio
+async def test_failed_load_releases_waiting_and_later_scans():
+    pool = ReceiptScannerPool(size=2, scanner_factory=broken_model)
+    warmup = asyncio.create_task(pool.start())
+    await asyncio.sleep(0)
+    # Arrived during warm-up, so it is already waiting for a scanner when loading fails
+    waiters = [asyncio.create_task(pool.scan(b"receipt")) for _ in range(2)]
+
+    with pytest.raises(OSError):
+        await warmup
+    for waiter in waiters:
+        with pytest.raises(ReceiptScannerUnavailable):
+            await asyncio.wait_for(waiter, timeout=1)
+    with pytest.raises(ReceiptScannerUnavailable):
+        await pool.scan(b"receipt")
+
+
+@pytest.mark.asyncio
+async def test_batched_scans_fail_fast_when_the_model_did_not_load():
+    pool = ReceiptScannerPool(size=1, scanner_factory=broken_model)
+    batcher = BatchingReceiptScanner(pool, batch_window=0.01)
+    await batcher.start()
+    with pytest.raises(OSError):
+        await pool.start()
+    try:
+        with pytest.raises(ReceiptScannerUnavailable):
+            await asyncio.wait_for(batcher.scan(b"receipt"), timeout=1)
+    finally:
+        await batcher.stop()
+
+
+async def started_batcher(**kwargs):
+    scanner = FakeScanner()
+    pool = ReceiptScannerPool(size=1, scanner_factory=lambda: scanner)
+    await pool.start()
+    batcher = BatchingReceiptScanner(pool, **kwargs)
+    await batcher.start()
+    return batcher, scanner
+
+
+@pytest.mark.asyncio
+async def test_uploads_within_the_window_share_a_batch():
+    batcher, scanner = await started_batcher(max_batch_size=4, batch_window=0.05)
+    try:
+        results = await asyncio.gather(*(batcher.scan(bytes([i])) for i in range(6)))
+    finally:
+        await batcher.stop()
+
+    assert results == [{"image": bytes([i])} for i in range(6)]
+    assert [len(batch) for batch in scanner.batches] == [4, 2]
+    assert batcher.stats()["batch_size"]["max"] == 4
+
+
+@pytest.mark.asyncio
+async def test_a_bad_upload_only_fails_itself():
+    batcher, scanner = await started_batcher(max_batch_size=3, batch_window=0.05)
+    try:
+        results = await asyncio.gather(
+            batcher.scan(b"a"), batcher.scan(b"unreadable"), batcher.scan(b"b"), return_exceptions=True
+        )
+    finally:
+        await batcher.stop()
+
+    assert results[0] == {"image": b"a"}
+    assert isinstance(results[1], FileNotFoundError)
+    assert results[2] == {"image": b"b"}
+    # One failed batch pass, then the per-item retry
+    assert len(scanner.batches) == 1
+
+
+@pytest.mark.asyncio
+async def test_timed_out_callers_are_dropped_from_the_batch():
+    batcher, scanner = await started_batcher(max_batch_size=4, batch_window=0.05, request_timeout=0.01)
+    # Hold the only scanner so the first upload waits in the queue past its deadline
+    async with batcher.pool.acquire():
+        with pytest.raises(asyncio.TimeoutError):
+            await batcher.scan(b"late")
+    batcher.request_timeout = 1
+    try:
+        assert await batcher.scan(b"fresh") == {"image": b"fresh"}
+    finally:
+        await batcher.stop()
+
+    assert all(b"late" not in batch for batch in scanner.batches)
+
+
+def png_bytes(size=(40, 80), mode="RGBA") -> bytes:
+    buffer = io.BytesIO()
+    Image.new(mode, size, "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_read_upload_returns_the_contents():
+    upload = UploadFile(io.BytesIO(b"x" * 1000))
+    assert await read_upload(upload, max_bytes=1000) == b"x" * 1000
+
+
+@pytest.mark.asyncio
+async def test_read_upload_rejects_declared_oversize_without_reading():
+    body = io.BytesIO(b"x" * 10)
+    upload = UploadFile(body, size=5000)
+    with pytest.raises(ReceiptTooLarge):
+        await read_upload(upload, max_bytes=1000)
+    assert body.tell() == 0
+
+
+@pytest.mark.asyncio
+async def test_read_upload_stops_once_past_the_limit():
+    # No declared size (chunked upload): the limit is enforced while reading
+    upload = UploadFile(io.BytesIO(b"x" * 200_000))
+    with pytest.raises(ReceiptTooLarge):
+        await read_upload(upload, max_bytes=100_000)
+
+
+@pytest.mark.parametrize("wrap", [
+    lambda data, path: data,
+    lambda data, path: bytearray(data),
+    lambda data, path: io.BytesIO(data),
+    lambda data, path: str(path),
+    lambda data, path: UploadFile(io.BytesIO(data)),
+    lambda data, path: Image.open(io.BytesIO(data)),
+])
+def test_load_receipt_image_sources(tmp_path, wrap):
+    data = png_bytes()
+    path = tmp_path / "receipt.png"
+    path.write_bytes(data)
+
+    image = load_receipt_image(wrap(data, path))
+    assert image.mode == "RGB"
+    assert image.size == (40, 80)
+
+
+def test_load_receipt_image_downscales_to_max_side():
+    image = load_receipt_image(png_bytes(size=(400, 1000)), max_side=100)
+    assert max(image.size) == 100
+    assert image.size == (40, 100)
+
+
+def test_load_receipt_image_reads_an_upload_from_the_start():
+    upload = UploadFile(io.BytesIO(png_bytes()))
+    upload.file.seek(10)
+    assert load_receipt_image(upload).size == (40, 80)
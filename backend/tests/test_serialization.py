@@ -0,0 +1,39 @@
+import uuid
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+
+from server import app
+from server.dependencies import get_db
+
+client = TestClient(app)
+
+EXPENSE = {"id": str(uuid.uuid4()), "category": "Food", "amount": 4.99, "date": 1740716128876, "user_id": "user-1"}
+
+
+@pytest.fixture
+def db():
+    db = MagicMock()
+    db.table.return_value.insert.return_value.execute = AsyncMock(return_value=MagicMock(data=[EXPENSE]))
+    app.dependency_overrides[get_db] = lambda: db
+    yield db
+    app.dependency_overrides.clear()
+
+
+def test_create_expense_inserts_the_validated_row_as_json(db):
+    response = client.post("/api/expenses/create", json={"session_id": "user-1", "new_expense": EXPENSE})
+    assert response.status_code == 200
+    assert response.json() is True
+
+    inserted = db.table.return_value.insert.call_args.args[0]
+    assert inserted["id"] == EXPENSE["id"]
+    assert inserted["amount"] == 4.99
+    # The epoch-millisecond date is parsed once and sent on as an ISO timestamp
+    assert inserted["date"].startswith("2025-02-28T")
+
+
+def test_create_expense_rejects_invalid_rows(db):
+    response = client.post("/api/expenses/create", json={"session_id": "user-1", "new_expense": {**EXPENSE, "amount": "lots"}})
+    assert response.status_code == 400
+    db.table.return_value.insert.assert_not_called()
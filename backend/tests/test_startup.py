@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+IMPORT_TIME_BUDGET_SECONDS = float(os.getenv("IMPORT_TIME_BUDGET_SECONDS", "3.0"))
+HEAVY_MODULES = ("torch", "transformers", "donut", "timm", "PIL")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from server.main import app
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    "seconds": elapsed,
+    "heavy": [name for name in %r if name in sys.modules],
+    "paths": sorted({route.path for route in app.routes}),
+}))
+""" % (HEAVY_MODULES,)
+
+
+def import_app(mode: str) -> dict:
+    """Import the app in a fresh interpreter, as a cold Cloud Run instance would."""
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "BUDGETBUDDY_MODE": mode},
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_import_does_not_load_ocr_stack():
+    probe = import_app("all")
+    assert probe["heavy"] == []
+    assert probe["seconds"] < IMPORT_TIME_BUDGET_SECONDS
+
+
+def test_api_mode_leaves_out_receipt_routes():
+    paths = import_app("api")["paths"]
+    assert "/health" in paths
+    assert "/api/expenses/" in paths
+    assert "/api/track-receipt" not in paths
+    assert "/photo-receipts/" not in paths
+
+
+def test_ocr_mode_serves_only_receipt_routes():
+    paths = import_app("ocr")["paths"]
+    assert "/api/track-receipt" in paths
+    assert "/health/receipt-scanner" in paths
+    assert "/api/expenses/" not in paths
@@ -8,10 +8,16 @@ from judgeval import JudgmentClient
 from judgeval.scorers import AnswerCorrectnessScorer, AnswerRelevancyScorer
 from judgeval.data import Example
 from unittest.mock import patch, AsyncMock
-from server.routes.suggestions import suggest_goals
+from server.routes.suggestions import suggest_goals, suggestion_cache
 
 client = TestClient(app)
 
+@pytest.fixture(autouse=True)
+def clear_suggestion_cache():
+    suggestion_cache.clear()
+    yield
+    suggestion_cache.clear()
+
 @pytest.fixture
 def sample_budget_questionnaire():
     return BudgetQuestionnaire(
@@ -127,3 +133,36 @@ def test_goal_questionnaire_validation():
     response = client.post("/api/suggest-goals/", json=invalid_questionnaire)
     assert response.status_code == 422  # Validation error
 
+
+@pytest.mark.asyncio
+async def test_suggest_budget_stream_skips_thinking(sample_budget_questionnaire):
+    async def fake_stream(messages):
+        for chunk in ["<think>The user earns", " $5000...</th", "ink>\n{\"budget_name\": \"Basic Monthly Budget\", ", "\"spending_limit\": 3000.0, \"duration\": \"monthly\"}"]:
+            yield chunk
+
+    with patch('server.routes.suggestions.get_llm_gateway') as mock_gateway:
+        mock_gateway.return_value.stream = fake_stream
+        
+        response = client.post("/api/suggest-budget/stream", json=sample_budget_questionnaire.model_dump())
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert "The user earns" not in response.text
+        assert "event: delta" in response.text
+        result = response.text.split("event: result\ndata: ")[1].split("\n")[0]
+        assert json.loads(result)["name"] == "Basic Monthly Budget"
+
+@pytest.mark.asyncio
+async def test_suggest_budget_served_from_cache(sample_budget_questionnaire, mock_llm_budget_response):
+    with patch('server.routes.suggestions.get_llm_response', new_callable=AsyncMock) as mock_get_llm:
+        mock_get_llm.return_value = mock_llm_budget_response
+        
+        first = client.post("/api/suggest-budget/", json=sample_budget_questionnaire.model_dump())
+        # Same answers with different spacing and capitalisation
+        repeat = sample_budget_questionnaire.model_copy(update={"spending_habits": "  I tend to spend a lot on DINING out "})
+        second = client.post("/api/suggest-budget/", json=repeat.model_dump())
+        
+        assert first.status_code == 200
+        assert second.json() == first.json()
+        assert mock_get_llm.await_count == 1
+        assert suggestion_cache.stats()["hits"] == 1
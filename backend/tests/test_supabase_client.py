@@ -0,0 +1,87 @@
+import asyncio
+
+import httpx
+import jwt
+import pytest
+
+from benchmarks.stubs import STUB_JWT_SECRET, StubPostgREST
+from server import app
+from server.dependencies import get_db
+from utils.supabase_client import InstrumentedTransport, close_supabase_client, create_supabase_client, pool_stats
+
+
+@pytest.mark.asyncio
+async def test_instrumented_transport_tracks_in_flight_requests():
+    release = asyncio.Event()
+
+    async def handler(request):
+        await release.wait()
+        return httpx.Response(200, json=[])
+
+    pool = InstrumentedTransport(httpx.MockTransport(handler), max_connections=4)
+    async with httpx.AsyncClient(transport=pool, base_url="http://supabase.test") as client:
+        requests = [asyncio.create_task(client.get("/rest/v1/expenses")) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        assert pool.stats()["in_flight"] == 3
+        assert pool.stats()["utilization"] == 0.75
+
+        release.set()
+        await asyncio.gather(*requests)
+
+    stats = pool.stats()
+    assert stats["in_flight"] == 0
+    assert stats["peak_in_flight"] == 3
+    assert stats["requests"] == 3
+
+
+@pytest.mark.asyncio
+async def test_client_sends_every_request_through_the_pool(monkeypatch):
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(200, json=[{"id": "e1"}])
+
+    monkeypatch.setenv("SUPABASE_URL", "http://supabase.test")
+    monkeypatch.setenv("SUPABASE_KEY", jwt.encode({"role": "anon"}, "supabase-client-test-secret-0123456789", algorithm="HS256"))
+    client = await create_supabase_client(transport=httpx.MockTransport(handler))
+    try:
+        response = await client.table("expenses").select("*").eq("user_id", "user-1").execute()
+    finally:
+        await close_supabase_client(client)
+
+    assert response.data == [{"id": "e1"}]
+    assert seen[0].url.path == "/rest/v1/expenses"
+    assert pool_stats(client)["requests"] == 1
+    assert client.http_client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_signing_in_leaves_the_shared_client_on_the_project_key(monkeypatch):
+    supabase = StubPostgREST(latency=0)
+    supabase.seed_user("ada@example.com", "hunter22")
+    sent = []
+
+    async def recording(scope, receive, send):
+        if scope["path"].startswith("/rest/v1"):
+            sent.append(dict(scope["headers"])[b"authorization"].decode())
+        await supabase(scope, receive, send)
+
+    project_key = jwt.encode({"role": "anon"}, STUB_JWT_SECRET, algorithm="HS256")
+    monkeypatch.setenv("SUPABASE_URL", "http://supabase.test")
+    monkeypatch.setenv("SUPABASE_KEY", project_key)
+    db = await create_supabase_client(transport=httpx.ASGITransport(app=recording))
+    monkeypatch.setattr(app.state, "db", db, raising=False)
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api.test") as api:
+            login = await api.post("/api/users/login", json={"email": "ada@example.com", "password": "hunter22"})
+        await db.table("expenses").select("*").execute()
+    finally:
+        app.dependency_overrides.clear()
+        await close_supabase_client(db)
+
+    assert login.status_code == 200
+    # Queries for everyone else still go out under the project key, not Ada's token
+    assert db.options.headers["Authorization"] == f"Bearer {project_key}"
+    assert sent == [f"Bearer {project_key}"]
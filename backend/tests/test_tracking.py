@@ -1,45 +1,190 @@
+import io
+from concurrent.futures import Future
+from types import SimpleNamespace
+
 import pytest
 import pytest_asyncio
 from fastapi.testclient import TestClient
+from PIL import Image
 from server import app
 import json
-from unittest.mock import patch
+from unittest.mock import patch, AsyncMock, MagicMock
 import os
 import sys
 import judgeval
+from server.dependencies import get_db, get_receipt_scanner, get_receipt_cache, get_receipt_jobs, get_user_cache
+from server.routes.users import get_current_user
+from utils.receipt_cache import ReceiptCache
+from utils.user_cache import UserCache
+from utils.receipt_scanner import MAX_UPLOAD_BYTES
 
 client = TestClient(app)
 
+USER_ID = "c4304cf3-d239-449f-986e-e879da77ae01"
+# A Donut prediction the rules cannot price confidently, so extraction asks the LLM
+SCAN = {"menu": [{"nm": "Sandwich", "cnt": "1"}], "store": "Test Store"}
+SAVED = {"id": "b7c6a2e4-52a5-4c2e-9d1c-0f4f3c2d9a11", "user_id": USER_ID, "amount": 29.01, "category": "Food", "business_name": "Test Store", "date": "2025-06-01T12:00:00+00:00"}
+
+@pytest.fixture
+def receipt_app():
+    """Stand-ins for everything the lifespan would create: database, scanner, caches and LLM."""
+    db = MagicMock()
+    db.table.return_value.insert.return_value.execute = AsyncMock(return_value=MagicMock(data=[SAVED]))
+    owned = db.table.return_value.select.return_value.eq.return_value.eq.return_value.limit.return_value
+    owned.execute = AsyncMock(return_value=MagicMock(data=[SAVED]))
+    scanner = MagicMock()
+    scanner.scan = AsyncMock(return_value=SCAN)
+    gateway = MagicMock()
+    gateway.chat = AsyncMock(return_value={
+        "choices": [{"message": {"content": json.dumps({"category": "Food", "price": 29.01, "business_name": "Test Store"})}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5},
+    })
+    user_cache = UserCache()
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_receipt_scanner] = lambda: scanner
+    receipt_cache = ReceiptCache()
+    app.dependency_overrides[get_receipt_cache] = lambda: receipt_cache
+    app.dependency_overrides[get_user_cache] = lambda: user_cache
+    with patch("server.routes.tracking.get_llm_gateway", return_value=gateway):
+        yield db, scanner, gateway, user_cache
+    app.dependency_overrides.clear()
+
 @pytest.mark.asyncio
-async def test_photo_receipt_upload():
-    # Create a mock image file
+async def test_photo_receipt_upload(receipt_app):
+    db, scanner, gateway, user_cache = receipt_app
     test_file_content = b"mock image content"
     test_filename = "test_receipt.jpg"
-    
-    # Mock the ReceiptScanner.scan_receipt method
-    mock_result = {"amount": 29.01, "merchant": "Test Store"}
-    with patch("server.routes.tracking.ReceiptScanner") as MockScanner:
-        mock_scanner_instance = MockScanner.return_value
-        mock_scanner_instance.scan_receipt.return_value = mock_result
-        
-        # Create test file and make request
-        files = {"file": (test_filename, test_file_content, "image/jpeg")}
-        response = client.post("/api/track-receipt", files=files)
-        
-        # Verify response
-        assert response.status_code == 200
-        assert response.json() == mock_result
-        
-        # Verify scanner was called
-        mock_scanner_instance.scan_receipt.assert_called_once()
-        
-        # Verify temporary file was cleaned up
-        temp_file = f"temp_{test_filename}"
-        assert not os.path.exists(temp_file)
+    await user_cache.get_or_load(USER_ID, "expenses", "all", AsyncMock(return_value=(b"[]", {})))
+
+    # Create test file and make request
+    files = {"file": (test_filename, test_file_content, "image/jpeg")}
+    response = client.post("/api/track-receipt", files=files)
+
+    # The saved expense comes back, not the raw scan
+    assert response.status_code == 200
+    assert response.json() == {**SAVED, "duplicate": False}
+    inserted = db.table.return_value.insert.call_args.args[0]
+    assert inserted == {"user_id": USER_ID, "amount": 29.01, "category": "Food", "business_name": "Test Store"}
+
+    # Scanned straight from the upload bytes, without a temporary file
+    scanner.scan.assert_awaited_once_with(test_file_content)
+    assert gateway.chat.await_count == 1
+    assert not os.path.exists(f"temp_{test_filename}")
+    # The user's cached expense listings were invalidated
+    assert user_cache.stats()["invalidations"] == 1
+
+@pytest.mark.asyncio
+async def test_photo_receipt_reupload_is_not_saved_twice(receipt_app):
+    db, scanner, gateway, user_cache = receipt_app
+    files = {"file": ("receipt.jpg", b"mock image content", "image/jpeg")}
+
+    first = client.post("/api/track-receipt", files=files)
+    second = client.post("/api/track-receipt", files=files)
+
+    assert first.json()["duplicate"] is False
+    assert second.status_code == 200
+    assert second.json() == {**SAVED, "duplicate": True}
+    assert db.table.return_value.insert.call_count == 1
+    assert scanner.scan.await_count == 1
+    assert gateway.chat.await_count == 1
+
+@pytest.mark.asyncio
+async def test_look_alike_receipt_reuses_the_scan_but_is_saved(receipt_app):
+    db, scanner, gateway, user_cache = receipt_app
+    cache = ReceiptCache(perceptual=True)
+    app.dependency_overrides[get_receipt_cache] = lambda: cache
+    photo = Image.new("L", (64, 64))
+    photo.paste(255, (0, 0, 32, 64))
+    encoded = []
+    for quality in (95, 60):
+        buffer = io.BytesIO()
+        photo.save(buffer, "JPEG", quality=quality)
+        encoded.append(buffer.getvalue())
+
+    first = client.post("/api/track-receipt", files={"file": ("receipt.jpg", encoded[0], "image/jpeg")})
+    # Another receipt from the same store looks the same to the perceptual hash
+    second = client.post("/api/track-receipt", files={"file": ("receipt.jpg", encoded[1], "image/jpeg")})
+
+    assert first.json()["duplicate"] is False
+    assert second.json()["duplicate"] is False
+    assert db.table.return_value.insert.call_count == 2
+    assert scanner.scan.await_count == 1
+    assert gateway.chat.await_count == 1
 
 @pytest.mark.asyncio
-async def test_photo_receipt_invalid_file():
-    # Test with empty file
+async def test_photo_receipt_reupload_after_delete_is_saved_again(receipt_app):
+    db, scanner, gateway, user_cache = receipt_app
+    files = {"file": ("receipt.jpg", b"mock image content", "image/jpeg")}
+    client.post("/api/track-receipt", files=files)
+
+    # The user deleted the expense, so the same receipt is a new expense again
+    owned = db.table.return_value.select.return_value.eq.return_value.eq.return_value.limit.return_value
+    owned.execute.return_value = MagicMock(data=[])
+    response = client.post("/api/track-receipt", files=files)
+
+    assert response.json()["duplicate"] is False
+    assert db.table.return_value.insert.call_count == 2
+    # Still served from the receipt cache
+    assert scanner.scan.await_count == 1
+
+@pytest.mark.asyncio
+async def test_photo_receipt_invalid_file(receipt_app):
+    db, scanner, gateway, user_cache = receipt_app
+    # The scanner cannot decode an empty upload
+    scanner.scan.side_effect = FileNotFoundError("cannot identify image file")
     files = {"file": ("empty.jpg", b"", "image/jpeg")}
     response = client.post("/api/track-receipt", files=files)
-    assert response.status_code == 404  # FastAPI validates file is not empty
+    assert response.status_code == 404
+    db.table.return_value.insert.assert_not_called()
+
+def test_photo_receipt_too_large():
+    files = {"file": ("huge.jpg", b"0" * (MAX_UPLOAD_BYTES + 1), "image/jpeg")}
+    response = client.post("/api/track-receipt", files=files)
+    assert response.status_code == 413
+
+def test_scans_are_refused_when_the_model_failed_to_load(receipt_app, monkeypatch):
+    db, scanner, gateway, user_cache = receipt_app
+    # Stands in for the warm-up task, which finished with the loading error
+    failed = Future()
+    failed.set_exception(OSError("model weights not found"))
+    monkeypatch.setattr(app.state, "receipt_scanner_ready", failed, raising=False)
+    monkeypatch.setattr(app.state, "receipt_scanner", scanner, raising=False)
+    scanner.stats = MagicMock(return_value={"size": 1})
+    del app.dependency_overrides[get_receipt_scanner]
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=USER_ID)
+
+    files = {"file": ("receipt.jpg", b"mock image content", "image/jpeg")}
+    assert client.post("/api/track-receipt", files=files).status_code == 503
+    assert client.post("/photo-receipts/", files=files).status_code == 503
+    assert client.post("/api/receipts/jobs", files=files).status_code == 503
+    scanner.scan.assert_not_called()
+
+    health = client.get("/health/receipt-scanner").json()
+    assert health["ready"] is False
+    assert "model weights not found" in health["error"]
+
+def test_receipt_jobs_refuse_private_webhooks(receipt_app):
+    jobs = MagicMock()
+    app.dependency_overrides[get_receipt_jobs] = lambda: jobs
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=USER_ID)
+
+    files = {"file": ("receipt.jpg", b"mock image content", "image/jpeg")}
+    response = client.post("/api/receipts/jobs", files=files, data={"webhook_url": "http://169.254.169.254/latest/meta-data/"})
+    assert response.status_code == 400
+    jobs.enqueue.assert_not_called()
+
+def test_health_reports_a_scanner_that_was_never_built(receipt_app, monkeypatch):
+    # OCRWorkerPool.from_env() raised, so there is no scanner object at all
+    failed = Future()
+    failed.set_exception(ValueError("invalid literal for int() with base 10: 'four'"))
+    monkeypatch.setattr(app.state, "receipt_scanner_ready", failed, raising=False)
+    monkeypatch.setattr(app.state, "receipt_scanner", None, raising=False)
+    del app.dependency_overrides[get_receipt_scanner]
+
+    health = client.get("/health/receipt-scanner")
+    assert health.status_code == 200
+    assert health.json()["ready"] is False
+    assert "invalid literal" in health.json()["error"]
+
+    files = {"file": ("receipt.jpg", b"mock image content", "image/jpeg")}
+    assert client.post("/api/track-receipt", files=files).status_code == 503
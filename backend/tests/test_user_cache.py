@@ -0,0 +1,175 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi import FastAPI, Header
+from fastapi.testclient import TestClient
+
+from server import app
+from server.caching import cached_json
+from server.dependencies import get_db, get_user_cache
+from server.routes.users import get_current_user
+from utils.user_cache import EXPENSE_RESOURCES, UserCache
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio for the shared tier."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def incr(self, key):
+        self.commands.append(key)
+        return self
+
+    def expire(self, key, seconds):
+        return self
+
+    async def execute(self):
+        for key in self.commands:
+            self.redis.data[key] = int(self.redis.data.get(key) or 0) + 1
+
+
+@pytest.mark.asyncio
+async def test_reads_are_cached_until_invalidated():
+    cache = UserCache()
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return b"[]", {}
+
+    first = await cache.get_or_load("user-1", "goals", "plain", load)
+    second = await cache.get_or_load("user-1", "goals", "plain", load)
+    assert first["etag"] == second["etag"]
+    assert len(loads) == 1
+
+    # Other users and other resources are untouched by an invalidation
+    await cache.get_or_load("user-2", "goals", "plain", load)
+    await cache.invalidate("user-1", "budgets")
+    await cache.get_or_load("user-1", "goals", "plain", load)
+    assert len(loads) == 2
+
+    await cache.invalidate("user-1", "goals")
+    await cache.get_or_load("user-1", "goals", "plain", load)
+    assert len(loads) == 3
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load():
+    cache = UserCache()
+    loads = 0
+
+    async def load():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return b"[1]", {}
+
+    entries = await asyncio.gather(*(cache.get_or_load("user-1", "expenses", "50", load) for _ in range(5)))
+    assert loads == 1
+    assert all(entry["body"] == b"[1]" for entry in entries)
+
+
+@pytest.mark.asyncio
+async def test_failed_loads_are_not_cached():
+    cache = UserCache()
+
+    async def fail():
+        raise RuntimeError("database unavailable")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_load("user-1", "budgets", "today", fail)
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_other_instances_through_redis():
+    redis = FakeRedis()
+    api, other = UserCache(redis=redis), UserCache(redis=redis)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return b'{"n": %d}' % len(loads), {}
+
+    await api.get_or_load("user-1", "budgets", "today", load)
+    # Filled by the first instance, so the second one does not load again
+    assert (await other.get_or_load("user-1", "budgets", "today", load))["body"] == b'{"n": 1}'
+
+    await other.invalidate("user-1", "budgets")
+    assert (await api.get_or_load("user-1", "budgets", "today", load))["body"] == b'{"n": 2}'
+    assert len(loads) == 2
+
+
+def test_etag_revalidation():
+    app = FastAPI()
+    cache = UserCache()
+
+    @app.get("/items")
+    async def items(if_none_match: str = Header(default=None)):
+        async def load():
+            return b'[{"id": 1}]', {"X-Next-Cursor": "abc"}
+        return await cached_json(cache, "user-1", "expenses", "all", load, if_none_match)
+
+    client = TestClient(app)
+    first = client.get("/items")
+    assert first.json() == [{"id": 1}]
+    assert first.headers["X-Next-Cursor"] == "abc"
+
+    revalidated = client.get("/items", headers={"If-None-Match": first.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["ETag"] == first.headers["ETag"]
+
+
+@pytest.mark.asyncio
+async def test_updating_an_expense_invalidates_the_users_reads():
+    cache = UserCache()
+    expense = {"id": str(uuid.uuid4()), "amount": 4.99, "category": "Food", "user_id": "user-1"}
+    db = MagicMock()
+    db.table.return_value.update.return_value.eq.return_value.eq.return_value.execute = AsyncMock(return_value=MagicMock(data=[expense]))
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_user_cache] = lambda: cache
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id="user-1")
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return b"[]", {}
+
+    try:
+        for resource in EXPENSE_RESOURCES:
+            await cache.get_or_load("user-1", resource, "plain", load)
+        response = TestClient(app).put(f"/api/expenses/update/{expense['id']}", json=expense)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    # Expenses, and the budgets and goals computed from them, are read again
+    for resource in EXPENSE_RESOURCES:
+        await cache.get_or_load("user-1", resource, "plain", load)
+    assert len(loads) == 2 * len(EXPENSE_RESOURCES)
@@ -1,6 +1,48 @@
-from .receipt_scanner import ReceiptScanner
-from .database import save_receipt_result
-from .auth import get_user_from_session
-from .supabase_client import supabase_client
+"""
+Helpers shared by the API and the OCR workers.
 
-__all__ = ["ReceiptScanner", "save_receipt_result", "get_user_from_session", "supabase_client"]
\ No newline at end of file
+Names are resolved lazily (PEP 562) so that `from utils import read_upload` does not
+import the receipt scanner's torch/donut stack, or anything else the caller does not use.
+"""
+import importlib
+
+_EXPORTS = {
+    "ReceiptScanner": "receipt_scanner",
+    "ReceiptScannerPool": "receipt_scanner",
+    "BatchingReceiptScanner": "receipt_scanner",
+    "ReceiptTooLarge": "receipt_scanner",
+    "ReceiptScannerUnavailable": "receipt_scanner",
+    "load_receipt_image": "receipt_scanner",
+    "read_upload": "receipt_scanner",
+    "OCRWorkerPool": "ocr_workers",
+    "OCRQueueFull": "ocr_workers",
+    "ReceiptCache": "receipt_cache",
+    "ReceiptFields": "receipt_extraction",
+    "extract_receipt_fields": "receipt_extraction",
+    "save_receipt_result": "database",
+    "get_owned_expense": "database",
+    "mutate_owned": "database",
+    "get_user_from_session": "auth",
+    "token_verifier": "auth",
+    "AuthenticatedUser": "auth",
+    "InvalidToken": "auth",
+    "VerificationUnavailable": "auth",
+    "create_supabase_client": "supabase_client",
+    "create_auth_client": "supabase_client",
+    "close_supabase_client": "supabase_client",
+    "pool_stats": "supabase_client",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,61 @@
+from datetime import date
+
+GRANULARITIES = ("day", "week", "month")
+
+
+def _bucket(row: dict) -> dict:
+    return {"amount": round(float(row["amount"]), 2), "count": int(row["expense_count"])}
+
+
+async def spending_summary(db, user_id, start: date, end: date, granularity: str = "day") -> dict:
+    """
+    Total a user's spending between `start` (inclusive) and `end` (exclusive).
+
+    Reads the spending_rollups table (see migrations/001_spending_rollups.sql) through the
+    spending_summary function, so the cost depends on the number of buckets, not expenses.
+    Expenses without a date belong to no day and are not counted.
+
+    Args:
+        db: The shared Supabase client
+        user_id: The user whose spending is totalled
+        start: First day of the range
+        end: Day after the last day of the range
+        granularity: Period size for the time series: day, week or month
+
+    Returns:
+        dict: The overall total plus totals by category, by merchant and by period.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {GRANULARITIES}")
+    if end <= start:
+        raise ValueError("end must be after start")
+
+    response = await db.rpc("spending_summary", {
+        "p_user_id": str(user_id),
+        "p_start": start.isoformat(),
+        "p_end": end.isoformat(),
+        "p_granularity": granularity,
+    }).execute()
+
+    by_category, by_merchant, by_period = [], [], []
+    for row in response.data or []:
+        if row["dimension"] == "category":
+            by_category.append({"category": row["key"], **_bucket(row)})
+        elif row["dimension"] == "merchant":
+            by_merchant.append({"business_name": row["key"] or None, **_bucket(row)})
+        else:
+            by_period.append({"period": row["key"], **_bucket(row)})
+
+    by_category.sort(key=lambda item: item["amount"], reverse=True)
+    by_merchant.sort(key=lambda item: item["amount"], reverse=True)
+    by_period.sort(key=lambda item: item["period"])
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "granularity": granularity,
+        "total": round(sum(item["amount"] for item in by_period), 2),
+        "count": sum(item["count"] for item in by_period),
+        "by_category": by_category,
+        "by_merchant": by_merchant,
+        "by_period": by_period,
+    }
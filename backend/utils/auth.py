@@ -1,3 +1,185 @@
-def get_user_from_session(session_id: int):
-    # TODO: authenticate actions from login sessions
-    return session_id
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+import jwt
+
+
+def get_user_from_session(session_id: int):
+    # TODO: authenticate actions from login sessions
+    return session_id
+
+
+@dataclass
+class AuthenticatedUser:
+    """The user described by a verified Supabase access token."""
+
+    id: str
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    role: Optional[str] = None
+    aud: Optional[str] = None
+    user_metadata: dict = field(default_factory=dict)
+    app_metadata: dict = field(default_factory=dict)
+    expires_at: int = 0
+
+
+class InvalidToken(Exception):
+    """Raised when an access token is malformed, forged or expired."""
+
+
+class VerificationUnavailable(Exception):
+    """Raised when a token cannot be checked locally (e.g. no key configured for its algorithm)."""
+
+
+class TokenVerifier:
+    """
+    Verify Supabase access tokens locally instead of calling the auth server.
+
+    HS256 tokens are checked against the project JWT secret; asymmetric tokens against
+    the project's JWKS, which PyJWKClient fetches once and caches. Verified users are
+    kept in a bounded LRU keyed by a hash of the token, for at most `cache_ttl` seconds
+    and never past the token's own expiry.
+
+    Args:
+        secret (str): The project JWT secret, if tokens are HS256-signed.
+        jwks_url (str): The project's JWKS endpoint, for asymmetric signing keys.
+        audience (str): Expected `aud` claim.
+        cache_size (int): Verified tokens to remember.
+        cache_ttl (float): Longest time a verification result is reused.
+        jwks_ttl (float): How long fetched signing keys are trusted before refetching.
+    """
+
+    ASYMMETRIC_ALGORITHMS = ("RS256", "ES256", "EdDSA")
+
+    def __init__(self, secret: str = None, jwks_url: str = None, audience: str = "authenticated", cache_size: int = 4096, cache_ttl: float = 300, jwks_ttl: float = 3600):
+        self.secret = secret
+        self.audience = audience
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._jwks_client = jwt.PyJWKClient(jwks_url, cache_keys=True, lifespan=jwks_ttl) if jwks_url else None
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls):
+        supabase_url = os.getenv("SUPABASE_URL")
+        jwks_url = os.getenv("SUPABASE_JWKS_URL") or (f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json" if supabase_url else None)
+        return cls(
+            secret=os.getenv("SUPABASE_JWT_SECRET") or None,
+            jwks_url=jwks_url,
+            cache_size=int(os.getenv("AUTH_CACHE_SIZE", "4096")),
+            cache_ttl=float(os.getenv("AUTH_CACHE_TTL", "300")),
+        )
+
+    @staticmethod
+    def _cache_key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def cached(self, token: str) -> Optional[AuthenticatedUser]:
+        """Return the user for an already-verified, still-valid token, or None."""
+        key = self._cache_key(token)
+        with self._lock:
+            entry = self._users.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            user, valid_until = entry
+            if time.time() >= valid_until:
+                del self._users[key]
+                self.misses += 1
+                return None
+            self._users.move_to_end(key)
+            self.hits += 1
+            return user
+
+    def _remember(self, token: str, user: AuthenticatedUser):
+        valid_until = min(time.time() + self.cache_ttl, user.expires_at)
+        with self._lock:
+            self._users[self._cache_key(token)] = (user, valid_until)
+            while len(self._users) > self.cache_size:
+                self._users.popitem(last=False)
+
+    def _signing_key(self, token: str, algorithm: str):
+        if algorithm == "HS256":
+            if not self.secret:
+                raise VerificationUnavailable("No JWT secret configured for HS256 tokens")
+            return self.secret
+        if algorithm in self.ASYMMETRIC_ALGORITHMS:
+            if self._jwks_client is None:
+                raise VerificationUnavailable("No JWKS configured for asymmetric tokens")
+            try:
+                return self._jwks_client.get_signing_key_from_jwt(token).key
+            except jwt.PyJWKClientConnectionError as e:
+                raise VerificationUnavailable(str(e)) from e
+            except jwt.PyJWKClientError as e:
+                raise InvalidToken(str(e)) from e
+        raise InvalidToken(f"Unsupported token algorithm {algorithm!r}")
+
+    def verify(self, token: str) -> AuthenticatedUser:
+        """
+        Check the token's signature, expiry and audience.
+
+        Returns:
+            AuthenticatedUser: The user the token was issued to.
+
+        Raises:
+            InvalidToken: If the token must be rejected.
+            VerificationUnavailable: If the token cannot be checked locally.
+        """
+        user = self.cached(token)
+        if user is not None:
+            return user
+        return self._verify_uncached(token)
+
+    def _verify_uncached(self, token: str) -> AuthenticatedUser:
+        try:
+            algorithm = jwt.get_unverified_header(token).get("alg")
+            claims = jwt.decode(
+                token,
+                self._signing_key(token, algorithm),
+                algorithms=[algorithm],
+                audience=self.audience,
+                options={"require": ["exp", "sub"]},
+            )
+        except jwt.InvalidTokenError as e:
+            raise InvalidToken(str(e)) from e
+
+        user = AuthenticatedUser(
+            id=claims["sub"],
+            email=claims.get("email"),
+            phone=claims.get("phone"),
+            role=claims.get("role"),
+            aud=claims.get("aud"),
+            user_metadata=claims.get("user_metadata") or {},
+            app_metadata=claims.get("app_metadata") or {},
+            expires_at=claims["exp"],
+        )
+        self._remember(token, user)
+        return user
+
+    async def verify_async(self, token: str) -> AuthenticatedUser:
+        """Like verify(), but a JWKS fetch on a cache miss happens off the event loop."""
+        user = self.cached(token)
+        if user is not None:
+            return user
+        return await asyncio.to_thread(self._verify_uncached, token)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._users),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
+
+
+token_verifier = TokenVerifier.from_env()
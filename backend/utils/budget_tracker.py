@@ -0,0 +1,125 @@
+import asyncio
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+
+from utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Budget.duration -> the spending_periods counter it is measured against
+PERIODS = {"weekly": "week", "monthly": "month", "yearly": "year"}
+
+
+def period_start(period: str, today: date) -> date:
+    """Start of the week (Monday), month or year containing `today`, as Postgres date_trunc computes it."""
+    if period == "week":
+        return today - timedelta(days=today.weekday())
+    if period == "month":
+        return today.replace(day=1)
+    if period == "year":
+        return today.replace(month=1, day=1)
+    raise ValueError(f"Unknown period: {period}")
+
+
+async def current_spending(db, user_id, today: date = None) -> dict:
+    """
+    Spent-to-date for the current week, month and year.
+
+    The counters are maintained by the database on every expense write (see
+    migrations/002_budget_utilization.sql), so this is a single primary-key lookup of at
+    most three rows.
+
+    Returns:
+        dict: {period: (period_start, spent)} for week, month and year.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    starts = {period: period_start(period, today) for period in PERIODS.values()}
+    response = await (
+        db.table("spending_periods")
+        .select("period,period_start,spent")
+        .eq("user_id", user_id)
+        .in_("period_start", sorted({start.isoformat() for start in starts.values()}))
+        .execute()
+    )
+    spent = {
+        row["period"]: float(row["spent"])
+        for row in response.data or []
+        if row["period_start"] == starts[row["period"]].isoformat()
+    }
+    return {period: (start, spent.get(period, 0.0)) for period, start in starts.items()}
+
+
+def attach_utilization(budgets: list, spending: dict) -> list:
+    """Add spent, remaining, utilization and over_limit for the current period to each budget row."""
+    for budget in budgets:
+        start, spent = spending[PERIODS[budget["duration"]]]
+        limit = float(budget["spending_limit"])
+        budget.update({
+            "period_start": start.isoformat(),
+            "spent": round(spent, 2),
+            "remaining": round(limit - spent, 2),
+            "utilization": round(spent / limit, 4) if limit > 0 else None,
+            "over_limit": spent > limit,
+        })
+    return budgets
+
+
+class BudgetAlertBroker:
+    """
+    Fan out over-limit alerts to the users listening on /api/budgets/events.
+
+    The database inserts a budget_alerts row the first time a budget goes over its limit
+    in a period. The broker subscribes to those inserts over Supabase Realtime, so alerts
+    arrive without polling no matter which process wrote the expense.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers = {}
+        self._channel = None
+
+    async def start(self, db):
+        try:
+            self._channel = db.channel("budget-alerts")
+            self._channel.on_postgres_changes("INSERT", schema="public", table="budget_alerts", callback=self._on_insert)
+            await self._channel.subscribe()
+        except Exception as e:
+            # The API keeps serving; only the events stream goes quiet
+            log.warning("budget_alerts_unavailable", error=str(e))
+            self._channel = None
+
+    async def stop(self):
+        if self._channel is not None:
+            await self._channel.unsubscribe()
+            self._channel = None
+
+    def _on_insert(self, payload):
+        record = payload.get("data", {}).get("record") or payload.get("record") or {}
+        if record:
+            self.publish(record)
+
+    def publish(self, alert: dict):
+        for queue in self._subscribers.get(str(alert.get("user_id")), ()):
+            if queue.full():
+                # A stalled listener loses its oldest alert rather than blocking everyone else
+                queue.get_nowait()
+            queue.put_nowait(alert)
+
+    @contextmanager
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(self.queue_size)
+        listeners = self._subscribers.setdefault(str(user_id), set())
+        listeners.add(queue)
+        try:
+            yield queue
+        finally:
+            listeners.discard(queue)
+            if not listeners:
+                self._subscribers.pop(str(user_id), None)
+
+    def stats(self) -> dict:
+        return {
+            "connected": self._channel is not None,
+            "users": len(self._subscribers),
+            "listeners": sum(len(queues) for queues in self._subscribers.values()),
+        }
@@ -1,35 +1,75 @@
-from utils.supabase_client import supabase_client
+from utils.log import get_logger
 
-async def save_receipt_result(result, user_id, category: str, price: str, restaurant_name: str):
+log = get_logger(__name__)
+
+
+async def save_receipt_result(db, result, user_id, category: str, price: float, restaurant_name: str):
     """
     Save the receipt scanning result to the Supabase database in the expenses table.
     
     Args:
+        db: The shared Supabase client
         result: The processed receipt data from the receipt scanner
         user_id: The UUID of the user who owns this expense
+        category: The expense category extracted from the receipt
+        price: The final price paid
+        restaurant_name: The business the receipt is from
         
     Returns:
-        The response from the Supabase insert operation
+        The saved expense row
     """
     try:
         # Format the receipt data to match the expenses table structure
-        print(f"{result=}")
-        
+        log.debug("receipt_scanned", result=result)
+
         expense_data = {
             "user_id": user_id,
-            "amount": float(price.split("</think>")[1].strip()[1:]),
-            "category": category.split("</think>")[1].strip(),
-            "business_name": restaurant_name.split("</think>")[1].strip(),
+            "amount": float(price),
+            "category": category,
+            "business_name": restaurant_name,
             # date will use the default CURRENT_TIMESTAMP if not provided
         }
         
-        print(f"{expense_data=}")
-        
+        log.debug("receipt_expense", expense=expense_data)
+
         # Insert the data into the 'expenses' table
-        response = supabase_client.table("expenses").insert(expense_data).execute()
+        response = await db.table("expenses").insert(expense_data).execute()
         
-        return expense_data
+        return response.data[0] if response.data else expense_data
     except Exception as e:
         # Log the error and re-raise it to be handled by the caller
-        print(f"Error saving receipt to database: {str(e)}")
+        log.error("receipt_save_failed", user_id=user_id, error=str(e))
         raise e
+
+
+async def get_owned_expense(db, expense_id, user_id):
+    """Return the expense with this id if it still exists and belongs to `user_id`, else None."""
+    response = await db.table("expenses").select("*").eq("id", str(expense_id)).eq("user_id", str(user_id)).limit(1).execute()
+    return response.data[0] if response.data else None
+
+
+async def mutate_owned(db, table: str, row_id, user_id, patch: dict = None) -> tuple:
+    """
+    Delete (or, given `patch`, update) a row only if it belongs to `user_id`, in one request.
+
+    Runs the mutate_owned_row database function (migrations/003_owned_mutations.sql), which
+    applies the change and returns the affected row in a single statement.
+
+    Args:
+        db: The shared Supabase client
+        table: "budgets" or "goals"
+        row_id: The id of the row to change
+        user_id: The user who must own the row
+        patch: Columns to update; None deletes the row
+
+    Returns:
+        tuple: (status, row) where status is "ok", "not_found" or "forbidden" and row is the
+        deleted or updated row (None unless status is "ok").
+    """
+    response = await db.rpc("mutate_owned_row", {
+        "p_table": table,
+        "p_id": str(row_id),
+        "p_user_id": str(user_id),
+        "p_patch": patch,
+    }).execute()
+    return response.data["status"], response.data["row"]
@@ -0,0 +1,283 @@
+import codecs
+import csv
+import json
+import re
+import uuid
+from datetime import datetime
+
+from pydantic import TypeAdapter, ValidationError
+
+from utils.receipt_rules import classify, parse_amount
+
+IMPORT_CHUNK_ROWS = 500
+FORMATS = ("csv", "ndjson", "ofx")
+
+# Column names commonly found in bank and budgeting-app exports
+COLUMN_ALIASES = {
+    "merchant": "business_name",
+    "payee": "business_name",
+    "description": "business_name",
+    "name": "business_name",
+    "value": "amount",
+    "total": "amount",
+    "transaction_date": "date",
+    "posted": "date",
+    "type": "transaction_type",
+    "trntype": "transaction_type",
+    "debit/credit": "transaction_type",
+}
+
+
+def detect_format(filename: str, content_type: str) -> str:
+    """Guess csv, ndjson or ofx from the upload's filename and content type."""
+    name = (filename or "").lower()
+    content_type = (content_type or "").lower()
+    if name.endswith((".ofx", ".qfx")) or "ofx" in content_type:
+        return "ofx"
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in content_type:
+        return "ndjson"
+    if name.endswith(".csv") or "csv" in content_type:
+        return "csv"
+    raise ValueError("Cannot tell the file format; pass format=csv, ndjson or ofx")
+
+
+def normalize_row(row: dict, user_id, signed: bool = False) -> dict:
+    """
+    Map an imported record onto the Expense fields.
+
+    Missing ids are generated, the owner is always the importing user, amounts such as
+    "$1,234.50" or "-12.00" become positive floats, and a missing category is guessed from
+    the merchant.
+
+    Credits (money coming in) are not expenses: a row whose type column says "credit", or,
+    when `signed` (bank statements, where debits are negative), a positive amount, is
+    returned as None for the caller to skip.
+    """
+    expense = {}
+    for key, value in row.items():
+        key = COLUMN_ALIASES.get(str(key).strip().lower(), str(key).strip().lower())
+        if value not in (None, "") and key not in expense:
+            expense[key] = value.strip() if isinstance(value, str) else value
+    transaction_type = str(expense.pop("transaction_type", "")).lower()
+    amount = parse_amount(expense.get("amount")) if isinstance(expense.get("amount"), (str, int, float)) else None
+    if transaction_type == "credit" or (signed and transaction_type != "debit" and amount is not None and amount > 0):
+        return None
+    if amount is not None:
+        expense["amount"] = abs(amount)
+    if not expense.get("category"):
+        merchant = expense.get("business_name")
+        # A non-text merchant is left for validation to report
+        expense["category"] = classify(merchant if isinstance(merchant, str) else None, [])[0]
+    if "id" not in expense:
+        # Bank transaction ids make re-importing the same statement idempotent under upsert
+        fitid = expense.pop("ofx_fitid", None)
+        expense["id"] = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{user_id}:{fitid}") if fitid else uuid.uuid4())
+    expense["user_id"] = str(user_id)
+    return expense
+
+
+async def iter_lines(chunks):
+    """Decode an async stream of byte chunks into lines without reading it all into memory."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending.strip():
+        yield pending.rstrip("\r")
+
+
+async def parse_csv(chunks):
+    """Yield one dict per CSV record, keyed by the header row. Quoted fields may not span lines."""
+    header = None
+    async for line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        values = next(csv.reader([line]))
+        if header is None:
+            header = values
+            continue
+        yield dict(zip(header, values))
+
+
+async def parse_ndjson(chunks):
+    """Yield one dict per NDJSON line; malformed lines are yielded as errors for the caller to report."""
+    async for line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield ValueError(f"Invalid JSON: {e}")
+            continue
+        yield row if isinstance(row, dict) else ValueError(f"Expected a JSON object, not {type(row).__name__}")
+
+
+OFX_TRANSACTION = re.compile(r"<STMTTRN>(.*?)</STMTTRN>", re.S | re.I)
+OFX_FIELD = re.compile(r"<(\w+)>([^<\r\n]*)")
+
+
+def _ofx_date(value: str) -> str:
+    # 20250301120000[-5:EST] -> 2025-03-01T12:00:00
+    digits = re.match(r"\d{8}(\d{6})?", value or "")
+    if digits is None:
+        return value
+    text = digits.group(0)
+    return datetime.strptime(text, "%Y%m%d%H%M%S" if len(text) == 14 else "%Y%m%d").isoformat()
+
+
+async def parse_ofx(chunks):
+    """
+    Yield the transactions of an OFX/QFX statement (SGML or XML) as expense records.
+
+    Amounts keep their sign (debits are negative), so import them with signed=True to skip
+    the credits.
+    """
+    decoder = codecs.getincrementaldecoder("latin-1")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        end = 0
+        for match in OFX_TRANSACTION.finditer(pending):
+            end = match.end()
+            fields = {name.upper(): value.strip() for name, value in OFX_FIELD.findall(match.group(1))}
+            yield {
+                "amount": fields.get("TRNAMT"),
+                "date": _ofx_date(fields.get("DTPOSTED")),
+                "business_name": fields.get("NAME") or fields.get("MEMO"),
+                "ofx_fitid": fields.get("FITID"),
+            }
+        pending = pending[end:]
+
+
+PARSERS = {"csv": parse_csv, "ndjson": parse_ndjson, "ofx": parse_ofx}
+
+
+class ExpenseImporter:
+    """
+    Validate and write expenses in chunks.
+
+    Each chunk is validated with one pass of the Expense model and written with one
+    multi-row insert (or upsert), which PostgREST runs as a single statement, so a chunk is
+    committed or rejected as a whole. Results are reported per row, in input order.
+    """
+
+    def __init__(self, db, user_id, model, mode: str = "insert", chunk_size: int = IMPORT_CHUNK_ROWS, signed: bool = False):
+        if mode not in ("insert", "upsert"):
+            raise ValueError("mode must be insert or upsert")
+        self.db = db
+        self.user_id = str(user_id)
+        self.mode = mode
+        self.chunk_size = chunk_size
+        # Bank statements sign their amounts; positive rows are then credits (see normalize_row)
+        self.signed = signed
+        self.adapter = TypeAdapter(list[model])
+        self.counts = {"written": 0, "skipped": 0, "invalid": 0, "forbidden": 0, "failed": 0}
+
+    def validate(self, rows: list) -> tuple:
+        """
+        Validate a chunk of normalized rows.
+
+        Returns:
+            tuple: ([(position, Expense)] for the valid rows, {position: error message}).
+        """
+        try:
+            expenses = self.adapter.validate_python(rows)
+            return list(zip(range(len(rows)), expenses)), {}
+        except ValidationError as e:
+            errors = {}
+            for error in e.errors(include_url=False):
+                position = error["loc"][0]
+                field = ".".join(str(part) for part in error["loc"][1:])
+                errors.setdefault(position, []).append(f"{field}: {error['msg']}" if field else error["msg"])
+        valid = [position for position in range(len(rows)) if position not in errors]
+        expenses = self.adapter.validate_python([rows[position] for position in valid])
+        return list(zip(valid, expenses)), {position: "; ".join(messages) for position, messages in errors.items()}
+
+    async def _owned_elsewhere(self, ids: list) -> set:
+        # An upsert must never overwrite another user's expense that happens to share an id
+        response = await self.db.table("expenses").select("id,user_id").in_("id", ids).execute()
+        return {row["id"] for row in response.data or [] if str(row["user_id"]) != self.user_id}
+
+    async def write_chunk(self, start: int, rows: list) -> list:
+        """Validate and write one chunk; returns a result dict per row."""
+        results = [None] * len(rows)
+        for position, row in enumerate(rows):
+            if isinstance(row, Exception):
+                results[position] = {"index": start + position, "status": "invalid", "error": str(row)}
+                rows[position] = {}
+            elif row is None:
+                results[position] = {"index": start + position, "status": "skipped", "reason": "credit"}
+                rows[position] = {}
+
+        valid, errors = self.validate(rows)
+        for position, error in errors.items():
+            if results[position] is None:
+                results[position] = {"index": start + position, "status": "invalid", "error": error}
+
+        records = [(position, expense.model_dump(mode="json")) for position, expense in valid]
+        if records and self.mode == "upsert":
+            forbidden = await self._owned_elsewhere([record["id"] for _, record in records])
+            for position, record in records:
+                if record["id"] in forbidden:
+                    results[position] = {"index": start + position, "status": "forbidden", "id": record["id"]}
+            records = [(position, record) for position, record in records if record["id"] not in forbidden]
+
+        if records:
+            table = self.db.table("expenses")
+            payload = [record for _, record in records]
+            try:
+                if self.mode == "upsert":
+                    await table.upsert(payload, on_conflict="id").execute()
+                else:
+                    await table.insert(payload).execute()
+                outcome = {"status": "written"}
+            except Exception as e:
+                outcome = {"status": "failed", "error": str(e)}
+            for position, record in records:
+                results[position] = {"index": start + position, "id": record["id"], **outcome}
+
+        for result in results:
+            self.counts[result["status"]] += 1
+        return results
+
+    async def run(self, rows):
+        """
+        Import an async iterable of raw records, yielding per-row results chunk by chunk.
+
+        Records may be exceptions (rows a parser could not read); they are reported as invalid.
+        Credits are reported as skipped.
+        """
+        chunk, start = [], 0
+        async for row in rows:
+            if not isinstance(row, Exception):
+                try:
+                    row = normalize_row(row, self.user_id, self.signed)
+                except Exception as e:
+                    # One malformed record is that row's problem, not the whole import's
+                    row = ValueError(f"Cannot read row: {type(e).__name__}: {e}")
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                for result in await self.write_chunk(start, chunk):
+                    yield result
+                start += len(chunk)
+                chunk = []
+        if chunk:
+            for result in await self.write_chunk(start, chunk):
+                yield result
+
+
+async def delete_expenses(db, user_id, ids: list) -> list:
+    """
+    Delete many of a user's expenses with one request.
+
+    Returns:
+        list: {"id", "status"} per requested id, where status is deleted or not_found.
+    """
+    ids = [str(expense_id) for expense_id in ids]
+    response = await db.table("expenses").delete().eq("user_id", str(user_id)).in_("id", ids).execute()
+    deleted = {str(row["id"]) for row in response.data or []}
+    return [{"id": expense_id, "status": "deleted" if expense_id in deleted else "not_found"} for expense_id in ids]
@@ -0,0 +1,126 @@
+from datetime import date
+
+import numpy as np
+
+# Days per contribution period for the free-form goals.frequency column
+PERIOD_DAYS = {
+    "daily": 1.0,
+    "weekly": 7.0,
+    "biweekly": 14.0,
+    "monthly": 365.25 / 12,
+    "quarterly": 365.25 / 4,
+    "yearly": 365.25,
+    "annually": 365.25,
+}
+DAYS_PER_MONTH = 365.25 / 12
+MIN_MONTHS_FOR_SEASONALITY = 12
+
+
+def monthly_totals(dates: np.ndarray, amounts: np.ndarray, today: date) -> tuple:
+    """
+    Sum spending per calendar month, up to but not including the current (partial) month.
+
+    Args:
+        dates: datetime64 array of expense dates (any resolution).
+        amounts: Expense amounts, same length as `dates`.
+        today: The current date.
+
+    Returns:
+        tuple: (month numbers since 1970-01 as an int array, total spent in each month).
+    """
+    current = np.datetime64(today, "M").astype(np.int64)
+    months = np.asarray(dates).astype("datetime64[M]").astype(np.int64)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    complete = months < current
+    months, amounts = months[complete], amounts[complete]
+    if months.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    first = months.min()
+    totals = np.bincount(months - first, weights=amounts, minlength=current - first)
+    return np.arange(first, current), totals
+
+
+def seasonality(months: np.ndarray, totals: np.ndarray) -> np.ndarray:
+    """
+    Spending index per calendar month (January first): 1.2 means 20% above the average month.
+
+    Returns all ones until there is a full year of history.
+    """
+    if months.size < MIN_MONTHS_FOR_SEASONALITY or totals.mean() <= 0:
+        return np.ones(12)
+    calendar = months % 12
+    per_month = np.bincount(calendar, weights=totals, minlength=12) / np.maximum(np.bincount(calendar, minlength=12), 1)
+    return per_month / totals.mean()
+
+
+def forecast_goals(dates, amounts, goals: list, today: date = None, horizon_months: int = 120) -> dict:
+    """
+    Project when each of a user's goals will be met, all goals in one vectorized pass.
+
+    Each goal saves `actionable_amount` per `frequency`. In months where the user usually
+    spends more than average (seasonality from the expense history), the extra spending
+    comes out of that month's savings.
+
+    Args:
+        dates: datetime64 array (or YYYY-MM-DD strings) of expense dates.
+        amounts: Expense amounts.
+        goals: Goal rows with target_amount, current_amount, actionable_amount, frequency and deadline.
+        today: The current date (defaults to today).
+        horizon_months: How far ahead to project; goals not met by then get no completion date.
+
+    Returns:
+        dict: Spending statistics for the user and one forecast per goal, in `goals` order.
+    """
+    today = today or date.today()
+    months, totals = monthly_totals(np.asarray(dates, dtype="datetime64[D]"), amounts, today)
+    average = float(totals.mean()) if totals.size else 0.0
+    trend = float(np.polyfit(np.arange(totals.size), totals, 1)[0]) if totals.size >= 2 else 0.0
+    index = seasonality(months, totals)
+    summary = {
+        "average_monthly_spending": round(average, 2),
+        "spending_trend_per_month": round(trend, 2),
+        "seasonality": np.round(index, 3).tolist(),
+    }
+    if not goals:
+        return {**summary, "goals": []}
+
+    target = np.array([float(goal["target_amount"]) for goal in goals])
+    current = np.array([float(goal["current_amount"]) for goal in goals])
+    period_days = np.array([PERIOD_DAYS.get(str(goal["frequency"]).strip().lower(), DAYS_PER_MONTH) for goal in goals])
+    monthly_savings = np.array([float(goal["actionable_amount"]) for goal in goals]) * DAYS_PER_MONTH / period_days
+    deadlines = np.array([str(goal["deadline"])[:10] for goal in goals], dtype="datetime64[D]")
+
+    # goals x horizon: savings in each future month, starting next month
+    this_month = np.datetime64(today, "M").astype(np.int64)
+    future = this_month + 1 + np.arange(horizon_months)
+    # Cheaper-than-usual months are not assumed to go to the goal, only pricier ones come out of it
+    overage = average * np.clip(index[future % 12] - 1, 0, None)
+    saved = np.clip(monthly_savings[:, None] - overage[None, :], 0, None)
+    reached = current[:, None] + np.cumsum(saved, axis=1) >= target[:, None]
+
+    done = current >= target
+    hit = reached.any(axis=1)
+    first = reached.argmax(axis=1)
+    # A goal is met by the end of the month in which its running total crosses the target
+    completion = (future[first] + 1).astype("datetime64[M]").astype("datetime64[D]") - 1
+    completion = np.where(done, np.datetime64(today, "D"), completion)
+    months_to_completion = np.where(done, 0, first + 1)
+
+    today_d = np.datetime64(today, "D")
+    months_left = (deadlines - today_d).astype(np.float64) / DAYS_PER_MONTH
+    remaining = np.clip(target - current, 0, None)
+    required = np.where(months_left > 0, remaining / np.maximum(months_left, 1e-9), np.nan)
+    effective = saved[:, :12].mean(axis=1)
+
+    forecasts = []
+    for i in range(len(goals)):
+        met = bool(done[i] or hit[i])
+        forecasts.append({
+            "monthly_savings": round(float(monthly_savings[i]), 2),
+            "effective_monthly_savings": round(float(effective[i]), 2),
+            "required_monthly_savings": None if np.isnan(required[i]) else round(float(required[i]), 2),
+            "projected_completion": str(completion[i]) if met else None,
+            "months_to_completion": int(months_to_completion[i]) if met else None,
+            "on_track": bool(met and completion[i] <= deadlines[i]),
+        })
+    return {**summary, "goals": forecasts}
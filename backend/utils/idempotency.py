@@ -0,0 +1,111 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an Idempotency-Key is reused for a different request."""
+
+
+def _size(response: dict) -> int:
+    return len(response["body"]) + sum(len(name) + len(value) for name, value in response["headers"])
+
+
+class IdempotencyStore:
+    """
+    Completed responses by idempotency key, plus the requests still running for a key.
+
+    Completed entries live in an LRU bounded by `max_entries` and by `max_bytes` of stored
+    bodies and headers, and expire after `ttl` seconds. While the first request for a key runs, duplicates wait for it instead of
+    doing the same work again; if it ends without a storable response, one of them runs
+    in its place. The store is per process, so with several workers a duplicate is only
+    caught when it reaches the same worker.
+
+    Args:
+        max_entries (int): Completed responses kept.
+        max_bytes (int): Total size of the completed responses kept.
+        ttl (float): Seconds a completed response is replayed for.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024, ttl: float = 24 * 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._completed = OrderedDict()
+        self._bytes = 0
+        self._in_flight = {}
+        self.replayed = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000")),
+            max_bytes=int(os.getenv("IDEMPOTENCY_MAX_BYTES", str(64 * 1024 * 1024))),
+            ttl=float(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600))),
+        )
+
+    def _get(self, key: str):
+        entry = self._completed.get(key)
+        if entry is None:
+            return None
+        expires_at, fingerprint, response = entry
+        if time.monotonic() >= expires_at:
+            self._evict(key)
+            return None
+        self._completed.move_to_end(key)
+        return fingerprint, response
+
+    async def acquire(self, key: str, fingerprint: str):
+        """
+        Claim `key` for a new request, or wait for and return the response already made for it.
+
+        Returns:
+            dict: The stored response to replay, or None if the caller should handle the
+            request and then call release().
+
+        Raises:
+            IdempotencyConflict: If the key was used for a request with a different fingerprint.
+        """
+        while True:
+            completed = self._get(key)
+            if completed is not None:
+                if completed[0] != fingerprint:
+                    raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+                self.replayed += 1
+                return completed[1]
+            pending = self._in_flight.get(key)
+            if pending is None:
+                self._in_flight[key] = (fingerprint, asyncio.get_running_loop().create_future())
+                return None
+            if pending[0] != fingerprint:
+                raise IdempotencyConflict("Idempotency-Key is in use by a different request")
+            self.coalesced += 1
+            # Shielded so a duplicate that gives up does not cancel the wait for the others
+            await asyncio.shield(pending[1])
+
+    def release(self, key: str, response: dict = None):
+        """Finish the request that acquired `key`, storing `response` (if any) for replays."""
+        fingerprint, done = self._in_flight.pop(key)
+        # One oversized response must not flush every other entry out of the store
+        if response is not None and _size(response) <= self.max_bytes:
+            if key in self._completed:
+                self._evict(key)
+            self._completed[key] = (time.monotonic() + self.ttl, fingerprint, response)
+            self._bytes += _size(response)
+            while len(self._completed) > self.max_entries or self._bytes > self.max_bytes:
+                self._evict(next(iter(self._completed)))
+        done.set_result(None)
+
+    def _evict(self, key: str):
+        self._bytes -= _size(self._completed.pop(key)[2])
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._completed),
+            "bytes": self._bytes,
+            "in_flight": len(self._in_flight),
+            "replayed": self.replayed,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import os
+import random
+import time
+
+import httpx
+
+from utils.metrics import get_histogram, get_summary
+
+DEFAULT_MODEL = "deepseek-ai/DeepSeek-R1-Distill-Llama-70B-free"
+
+# Connection settings per LLM provider; every provider gets its own pool and concurrency limit
+PROVIDERS = {
+    "together": {
+        "base_url": os.getenv("TOGETHER_BASE_URL", "https://api.together.xyz/v1"),
+        "api_key_env": "TOGETHER_API_KEY",
+        "max_concurrency": int(os.getenv("TOGETHER_MAX_CONCURRENCY", "8")),
+    },
+}
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised when an LLM provider returns an error that retrying did not fix."""
+
+
+class LLMTimeout(LLMError):
+    """Raised when a request could not complete before its deadline."""
+
+
+class LLMGateway:
+    """
+    Async client for one OpenAI-compatible chat completion provider.
+
+    All requests share one keep-alive connection pool, at most `max_concurrency` requests
+    are in flight at once, and each call has an overall deadline covering queueing,
+    every attempt and the backoff between attempts. 429 and 5xx responses and transport
+    errors are retried with full-jitter exponential backoff, honouring Retry-After.
+
+    Args:
+        base_url (str): Provider API root, e.g. https://api.together.xyz/v1.
+        api_key (str): Bearer token for the provider.
+        max_concurrency (int): Requests allowed in flight at once.
+        timeout (float): Default deadline in seconds for a call.
+        max_retries (int): Retries after the first attempt.
+        backoff (float): Base backoff in seconds.
+        transport: Optional httpx transport, used by tests and benchmarks.
+        name (str): Provider name used in metrics.
+    """
+
+    def __init__(self, base_url: str, api_key: str = None, max_concurrency: int = 8, timeout: float = 120.0, max_retries: int = 3, backoff: float = 0.5, transport=None, name: str = "llm"):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._transport = transport
+        self._max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = None
+        self.latency = get_summary(f"llm.{name}.latency_seconds")
+        self.stage_time = get_histogram("stage_seconds", stage="llm", target=name)
+        self.retries = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                transport=self._transport,
+                # Deadlines are enforced per call in chat(), not by httpx
+                timeout=None,
+                limits=httpx.Limits(max_connections=self._max_concurrency, max_keepalive_connections=self._max_concurrency),
+            )
+        return self._client
+
+    def _retry_delay(self, attempt: int, response: httpx.Response = None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("retry-after", "")
+            if retry_after.replace(".", "", 1).isdigit():
+                return float(retry_after)
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    async def chat(self, messages: list, model: str = DEFAULT_MODEL, timeout: float = None, **params) -> dict:
+        """
+        Create a chat completion.
+
+        Args:
+            messages (list): OpenAI-style chat messages.
+            model (str): Model name.
+            timeout (float): Deadline in seconds for the whole call, including retries.
+
+        Returns:
+            dict: The decoded completion response.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.timeout)
+        payload = {"model": model, "messages": messages, **params}
+        started = time.perf_counter()
+
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            response = None
+            try:
+                async with asyncio.timeout(remaining):
+                    async with self._semaphore:
+                        response = await self.client.post("/chat/completions", json=payload)
+            except TimeoutError:
+                break
+            except httpx.TransportError as err:
+                if attempt == self.max_retries:
+                    raise LLMError(f"LLM request failed: {err}") from err
+            else:
+                if response.status_code < 400:
+                    elapsed = time.perf_counter() - started
+                    self.latency.observe(elapsed)
+                    self.stage_time.observe(elapsed)
+                    return response.json()
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt == self.max_retries:
+                    raise LLMError(f"LLM request failed with {response.status_code}: {response.text}")
+
+            delay = self._retry_delay(attempt, response)
+            if loop.time() + delay >= deadline:
+                break
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+        raise LLMTimeout(f"LLM request did not complete within {timeout or self.timeout} seconds")
+
+    async def stream(self, messages: list, model: str = DEFAULT_MODEL, timeout: float = None, **params):
+        """
+        Stream a chat completion, yielding content deltas as they arrive.
+
+        Connection failures, 429 and 5xx responses are retried like chat() as long as
+        nothing has been yielded yet; once output has started, errors are raised.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.timeout)
+        payload = {"model": model, "messages": messages, "stream": True, **params}
+        started = time.perf_counter()
+        streamed = False
+
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            response = None
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=remaining)
+            except TimeoutError:
+                break
+            try:
+                async with self.client.stream("POST", "/chat/completions", json=payload, timeout=max(deadline - loop.time(), 0.001)) as response:
+                    if response.status_code < 400:
+                        async for line in response.aiter_lines():
+                            if loop.time() > deadline:
+                                raise LLMTimeout(f"LLM stream did not finish within {timeout or self.timeout} seconds")
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+                            choices = json.loads(data).get("choices") or [{}]
+                            delta = (choices[0].get("delta") or {}).get("content")
+                            if delta:
+                                streamed = True
+                                yield delta
+                        elapsed = time.perf_counter() - started
+                        self.latency.observe(elapsed)
+                        self.stage_time.observe(elapsed)
+                        return
+                    await response.aread()
+            except httpx.TimeoutException as err:
+                raise LLMTimeout(f"LLM stream did not finish within {timeout or self.timeout} seconds") from err
+            except httpx.TransportError as err:
+                if streamed or attempt == self.max_retries:
+                    raise LLMError(f"LLM request failed: {err}") from err
+            finally:
+                self._semaphore.release()
+
+            if response is not None and (response.status_code not in RETRYABLE_STATUS_CODES or attempt == self.max_retries):
+                raise LLMError(f"LLM request failed with {response.status_code}: {response.text}")
+            delay = self._retry_delay(attempt, response)
+            if loop.time() + delay >= deadline:
+                break
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+        raise LLMTimeout(f"LLM request did not complete within {timeout or self.timeout} seconds")
+
+    async def complete(self, messages: list, **kwargs) -> str:
+        """Create a chat completion and return just the message content."""
+        response = await self.chat(messages, **kwargs)
+        return response["choices"][0]["message"]["content"]
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class ThinkFilter:
+    """
+    Incrementally drop a DeepSeek-R1 reasoning section from streamed output.
+
+    Everything up to and including `</think>` is discarded. Output that instead starts
+    straight away with a JSON value is passed through immediately, since there is no
+    reasoning to skip.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._passing = False
+
+    def feed(self, chunk: str) -> str:
+        """Add a streamed chunk and return whatever part of the final answer is now known."""
+        if self._passing:
+            return chunk
+        self._buffer += chunk
+        end = self._buffer.find("</think>")
+        if end != -1:
+            self._passing = True
+            answer, self._buffer = self._buffer[end + len("</think>"):].lstrip(), ""
+            return answer
+        stripped = self._buffer.lstrip()
+        if stripped[:1] in ("{", "["):
+            self._passing = True
+            answer, self._buffer = stripped, ""
+            return answer
+        return ""
+
+    def flush(self) -> str:
+        """Return held-back text once the stream ends without ever closing a reasoning section."""
+        if self._passing or self._buffer.lstrip().startswith("<think>"):
+            return ""
+        answer, self._buffer = self._buffer.strip(), ""
+        return answer
+
+
+_gateways = {}
+
+
+def get_llm_gateway(provider: str = "together") -> LLMGateway:
+    """Return the shared gateway for `provider`, creating it on first use."""
+    gateway = _gateways.get(provider)
+    if gateway is None:
+        config = PROVIDERS[provider]
+        gateway = _gateways[provider] = LLMGateway(
+            config["base_url"],
+            api_key=os.getenv(config["api_key_env"]),
+            max_concurrency=config["max_concurrency"],
+            name=provider,
+        )
+    return gateway
+
+
+async def close_llm_gateways():
+    for gateway in list(_gateways.values()):
+        await gateway.aclose()
+    _gateways.clear()
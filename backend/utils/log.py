@@ -0,0 +1,72 @@
+import json
+import logging
+import os
+import sys
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, event and the structured fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class StructuredLogger:
+    """
+    Thin wrapper over a stdlib logger that takes an event name plus keyword fields.
+
+    The level check comes first, so a disabled `log.debug("receipt_saved", row=row)` on a
+    hot path costs one comparison: nothing is formatted or serialized.
+    """
+
+    def __init__(self, logger: logging.Logger):
+        self._logger = logger
+
+    def _log(self, level: int, event: str, fields: dict, exc_info=None):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, event: str, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, exc_info=None, **fields):
+        self._log(logging.ERROR, event, fields, exc_info=exc_info)
+
+
+_configured = False
+
+
+def configure_logging(level: str = None):
+    """Send the `budgetbuddy` loggers to stderr as JSON lines, at LOG_LEVEL (default INFO)."""
+    global _configured
+    root = logging.getLogger("budgetbuddy")
+    root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+    if not _configured:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JSONFormatter())
+        root.addHandler(handler)
+        # uvicorn's own handlers would print every line a second time
+        root.propagate = False
+        _configured = True
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Return the structured logger for a module, e.g. `get_logger(__name__)`."""
+    if not _configured:
+        configure_logging()
+    return StructuredLogger(logging.getLogger(f"budgetbuddy.{name}"))
@@ -0,0 +1,163 @@
+import bisect
+import itertools
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Summary:
+    """Thread-safe running count/sum/min/max of an observed value (usually seconds)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    def observe(self, value: float):
+        with self._lock:
+            self.count += 1
+            self.total += value
+            self.last = value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "sum": self.total,
+                "avg": self.total / self.count if self.count else None,
+                "min": self.min,
+                "max": self.max,
+                "last": self.last,
+            }
+
+
+_summaries: dict[str, Summary] = {}
+_registry_lock = threading.Lock()
+
+
+def get_summary(name: str) -> Summary:
+    """Return the process-wide summary registered under `name`, creating it on first use."""
+    with _registry_lock:
+        summary = _summaries.get(name)
+        if summary is None:
+            summary = _summaries[name] = Summary(name)
+        return summary
+
+
+def snapshot_all() -> dict:
+    with _registry_lock:
+        summaries = list(_summaries.values())
+    return {summary.name: summary.snapshot() for summary in summaries}
+
+
+# Upper bounds in seconds; spans cover everything from a cache hit to a Donut pass
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram, exported in Prometheus format."""
+
+    def __init__(self, name: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative = list(itertools.accumulate(self.counts))
+            return {
+                "count": self.count,
+                "sum": self.total,
+                "buckets": dict(zip((*self.buckets, float("inf")), cumulative)),
+            }
+
+
+_histograms: dict[tuple, Histogram] = {}
+
+
+def get_histogram(name: str, **labels) -> Histogram:
+    """Return the process-wide histogram for `name` and this label set, creating it on first use."""
+    key = (name, tuple(sorted(labels.items())))
+    histogram = _histograms.get(key)
+    if histogram is None:
+        with _registry_lock:
+            histogram = _histograms.setdefault(key, Histogram(name, key[1]))
+    return histogram
+
+
+@contextmanager
+def span(stage: str, **labels):
+    """
+    Time a block of code into the `stage_seconds{stage=...}` histogram.
+
+    Works in sync and async code alike:
+
+        with span("db", target="expenses"):
+            response = await query.execute()
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        get_histogram("stage_seconds", stage=stage, **labels).observe(time.perf_counter() - started)
+
+
+def _metric_name(name: str) -> str:
+    return "budgetbuddy_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _label_text(labels, extra: tuple = ()) -> str:
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus() -> str:
+    """Every summary and histogram in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for name, snapshot in sorted(snapshot_all().items()):
+        metric = _metric_name(name)
+        lines.append(f"# TYPE {metric} summary")
+        lines.append(f"{metric}_count {snapshot['count']}")
+        lines.append(f"{metric}_sum {snapshot['sum']}")
+        if snapshot["max"] is not None:
+            lines.append(f"# TYPE {metric}_max gauge")
+            lines.append(f"{metric}_max {snapshot['max']}")
+
+    with _registry_lock:
+        histograms = sorted(_histograms.values(), key=lambda histogram: (histogram.name, histogram.labels))
+    typed = set()
+    for histogram in histograms:
+        metric = _metric_name(histogram.name)
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} histogram")
+        snapshot = histogram.snapshot()
+        for bound, count in snapshot["buckets"].items():
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{metric}_bucket{_label_text(histogram.labels, (('le', le),))} {count}")
+        lines.append(f"{metric}_count{_label_text(histogram.labels)} {snapshot['count']}")
+        lines.append(f"{metric}_sum{_label_text(histogram.labels)} {snapshot['sum']}")
+    return "\n".join(lines) + "\n"
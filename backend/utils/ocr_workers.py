@@ -0,0 +1,161 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+
+from utils.metrics import get_summary
+from utils.receipt_scanner import ReceiptScanner, ReceiptScannerUnavailable
+
+# The warm model owned by the current worker process (set by the pool initializer)
+_worker_scanner = None
+
+
+def _init_worker(scanner_factory, torch_threads):
+    global _worker_scanner
+    # Split the cores between workers instead of letting every process claim all of them.
+    # The worker is a fresh spawned process, so torch reads this when the scanner imports it.
+    os.environ["OMP_NUM_THREADS"] = str(torch_threads)
+    _worker_scanner = scanner_factory()
+
+
+def _warm_up():
+    return os.getpid()
+
+
+def _scan_in_worker(image):
+    return _worker_scanner.scan_receipt(image)
+
+
+class OCRQueueFull(Exception):
+    """Raised when the OCR workers already have as many jobs as they are allowed to hold."""
+
+
+class OCRWorkerPool:
+    """
+    Receipt OCR on a pool of worker processes, each holding one warm Donut model.
+
+    Scanning is CPU-bound and holds the GIL for long stretches, so running it in separate
+    processes keeps the uvicorn event loop free for health checks, logins and listings.
+
+    Args:
+        workers (int): Number of worker processes.
+        max_pending (int): Jobs allowed in the pool at once (running plus queued).
+        reject_when_full (bool): Raise OCRQueueFull instead of waiting when `max_pending` is reached.
+        max_jobs_per_worker (int): Jobs a worker runs before it is replaced, which caps memory growth.
+        request_timeout (float): Seconds a caller waits for its result. A job that outlives its
+            caller keeps its slot until the worker is done with it.
+        scanner_factory: Picklable callable that builds the scanner in each worker process.
+    """
+
+    def __init__(self, workers: int = 1, max_pending: int = 8, reject_when_full: bool = True, max_jobs_per_worker: int = 200, request_timeout: float = 120.0, scanner_factory=ReceiptScanner):
+        if workers < 1:
+            raise ValueError("OCR worker pool needs at least one worker")
+        self.workers = workers
+        self.max_pending = max_pending
+        self.reject_when_full = reject_when_full
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.request_timeout = request_timeout
+        self._scanner_factory = scanner_factory
+        self._executor = None
+        self.load_error = None
+        self._slots = None
+        self._pending = 0
+        self.rejected = 0
+        self.load_time = get_summary("ocr_workers.load_seconds")
+        self.queue_wait = get_summary("ocr_workers.queue_wait_seconds")
+        self.inference_time = get_summary("ocr_workers.inference_seconds")
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            workers=int(os.getenv("OCR_WORKER_PROCESSES", "1")),
+            max_pending=int(os.getenv("OCR_MAX_PENDING", "8")),
+            reject_when_full=os.getenv("OCR_QUEUE_POLICY", "reject") == "reject",
+            max_jobs_per_worker=int(os.getenv("OCR_MAX_JOBS_PER_WORKER", "200")),
+            request_timeout=float(os.getenv("RECEIPT_SCAN_TIMEOUT", "120")),
+        )
+
+    async def start(self):
+        """Spawn the workers and wait until every one of them has loaded its model."""
+        # Worker recycling is not supported with fork, and fork is unsafe with torch threads anyway
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self._scanner_factory, max(1, (os.cpu_count() or 1) // self.workers)),
+            max_tasks_per_child=self.max_jobs_per_worker,
+        )
+        self._slots = asyncio.Semaphore(self.max_pending)
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(loop.run_in_executor(self._executor, _warm_up) for _ in range(self.workers)))
+        except Exception as e:
+            self.load_error = e
+            raise
+        self.load_time.observe(time.perf_counter() - started)
+
+    async def scan(self, image: bytes):
+        """Submit a receipt to the workers and await its prediction without blocking the event loop."""
+        if self._executor is None:
+            raise RuntimeError("OCR worker pool has not been started")
+        if self.load_error is not None:
+            raise ReceiptScannerUnavailable(f"OCR workers failed to load: {self.load_error!r}")
+        if self.reject_when_full and self._slots.locked():
+            self.rejected += 1
+            raise OCRQueueFull(f"OCR workers are busy ({self.max_pending} receipts pending)")
+
+        started = time.perf_counter()
+        self._pending += 1
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            self._pending -= 1
+            raise
+        self.queue_wait.observe(time.perf_counter() - started)
+        loop = asyncio.get_running_loop()
+        try:
+            job = self._executor.submit(_scan_in_worker, image)
+        except BaseException:
+            self._release()
+            raise
+        scan_started = time.perf_counter()
+        try:
+            # Shielded so a timeout or a disconnected caller does not lose track of a running job
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job)), timeout=self.request_timeout)
+        except BrokenExecutor as e:
+            # A worker died (or never loaded its model); no job can run until the pool is rebuilt
+            raise ReceiptScannerUnavailable(f"OCR workers are not running: {e!r}") from e
+        finally:
+            self.inference_time.observe(time.perf_counter() - scan_started)
+            # Drops the job if no worker has picked it up yet
+            job.cancel()
+            if job.done():
+                self._release()
+            else:
+                # Still running in a worker: it holds its slot until it actually finishes
+                job.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+
+    def _release(self):
+        self._pending -= 1
+        self._slots.release()
+
+    async def shutdown(self):
+        """Stop accepting work, drop queued jobs and wait for running ones to finish."""
+        if self._executor is None:
+            return
+        executor, self._executor = self._executor, None
+        await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "rejected": self.rejected,
+            "max_jobs_per_worker": self.max_jobs_per_worker,
+            "load_seconds": self.load_time.snapshot(),
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+            "inference_seconds": self.inference_time.snapshot(),
+        }
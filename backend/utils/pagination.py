@@ -0,0 +1,73 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(row: dict, keys: tuple = ("date", "id")) -> str:
+    """Opaque cursor pointing just past `row` in (date, id) order. The date may be null."""
+    return base64.urlsafe_b64encode(json.dumps([row[key] for key in keys]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """
+    Decode a cursor made by encode_cursor.
+
+    The values end up inside a PostgREST filter, so anything but an ISO datetime (or null)
+    followed by a UUID is refused.
+
+    Raises:
+        ValueError: If the cursor was not produced by encode_cursor.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError("Invalid cursor")
+    first_value, second_value = values
+    try:
+        if first_value is not None:
+            datetime.fromisoformat(first_value)
+        second_value = str(uuid.UUID(second_value))
+    except (TypeError, ValueError, AttributeError) as e:
+        raise ValueError("Invalid cursor") from e
+    return [first_value, second_value]
+
+
+def apply_keyset(query, cursor: str, limit: int, keys: tuple = ("date", "id")):
+    """
+    Restrict a PostgREST query to one page, newest first, using a keyset on `keys`.
+
+    Rows whose first key is null (expenses without a date) sort after every dated row.
+    One extra row is requested so the caller can tell whether another page follows
+    without running a count. A `limit` of None returns every row, still in page order.
+    """
+    first, second = keys
+    if cursor:
+        first_value, second_value = decode_cursor(cursor)
+        if first_value is None:
+            # Already into the undated tail: only undated rows with a smaller id remain
+            query = query.is_(first, "null").lt(second, second_value)
+        else:
+            query = query.or_(
+                f'{first}.lt."{first_value}",and({first}.eq."{first_value}",{second}.lt."{second_value}"),{first}.is.null'
+            )
+    query = query.order(first, desc=True, nullsfirst=False).order(second, desc=True)
+    return query if limit is None else query.limit(limit + 1)
+
+
+def split_page(rows: list, limit: int, keys: tuple = ("date", "id")) -> tuple:
+    """
+    Trim the look-ahead row fetched by apply_keyset.
+
+    Returns:
+        tuple: The page rows and the cursor for the next page (None on the last page).
+    """
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1], keys)
@@ -0,0 +1,46 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+
+
+def _collapse(frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> Counter:
+    """
+    Sample every thread's Python stack for `seconds`, `interval` seconds apart.
+
+    This is a plain sampling profiler: the process is never traced, so the only overhead is
+    the sampling thread waking up. Blocking; run it off the event loop.
+
+    Returns:
+        Counter: Collapsed stacks (`outer;inner;leaf`, flamegraph.pl / speedscope format) -> samples.
+    """
+    own = threading.get_ident()
+    samples = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id != own:
+                samples[_collapse(frame)] += 1
+        time.sleep(interval)
+    return samples
+
+
+_profile_lock = asyncio.Lock()
+
+
+async def profile(seconds: float, interval: float = 0.005) -> str:
+    """Profile the running process for `seconds` and return collapsed stacks, one per line, hottest first."""
+    # One profile at a time: overlapping runs would only sample each other
+    async with _profile_lock:
+        samples = await asyncio.to_thread(sample_stacks, seconds, interval)
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
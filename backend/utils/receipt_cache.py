@@ -0,0 +1,199 @@
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_key(image_bytes: bytes) -> str:
+    """SHA-256 of the raw upload; identical files always map to the same entry."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def perceptual_hash(image_bytes: bytes) -> int:
+    """
+    64-bit difference hash of the image.
+
+    Re-encoded or slightly resized copies of the same photo land within a few bits of
+    each other, so near-duplicates can be found with a Hamming-distance check.
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_bytes))
+    image.draft("L", (64, 64))
+    pixels = list(image.convert("L").resize((9, 8)).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+class ReceiptCache:
+    """
+    Cache of receipt scan results and the fields derived from them, keyed by image content.
+
+    The in-memory tier is an LRU bounded by `max_entries`; entries older than `ttl` seconds
+    are treated as misses. When `db_path` is set, entries are also written to SQLite so they
+    survive restarts, and memory misses fall through to disk.
+
+    Identical bytes are the same receipt whoever uploads them, so exact matches are shared.
+    A perceptual match may be a different receipt that merely looks alike (same store, same
+    layout), so it is only returned to a user who uploaded the matching photo themselves.
+    Entries also remember which expense each user saved from them, so a re-upload can be
+    recognised as a duplicate.
+
+    Args:
+        max_entries (int): Entries kept in memory.
+        ttl (float): Seconds an entry stays valid.
+        db_path (str): Optional SQLite file for the persistent tier.
+        perceptual (bool): Also match near-identical photos by perceptual hash.
+        max_distance (int): Largest Hamming distance counted as the same photo.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 7 * 24 * 3600, db_path: str = None, perceptual: bool = False, max_distance: int = 4):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.perceptual = perceptual
+        self.max_distance = max_distance
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS receipt_cache ("
+                "key TEXT PRIMARY KEY, phash INTEGER, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS receipt_cache_created_at ON receipt_cache (created_at)")
+            self._db.commit()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.getenv("RECEIPT_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("RECEIPT_CACHE_TTL", str(7 * 24 * 3600))),
+            db_path=os.getenv("RECEIPT_CACHE_DB") or None,
+            perceptual=os.getenv("RECEIPT_CACHE_PERCEPTUAL", "0") == "1",
+        )
+
+    def _phash(self, image_bytes: bytes):
+        if not self.perceptual:
+            return None
+        try:
+            return perceptual_hash(image_bytes)
+        except Exception:
+            return None
+
+    def _expired(self, created_at: float) -> bool:
+        return time.time() - created_at > self.ttl
+
+    def _remember(self, key: str, entry: dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _lookup(self, key: str, phash, user_id=None):
+        entry = self._entries.get(key)
+        if entry is not None:
+            if not self._expired(entry["created_at"]):
+                self._entries.move_to_end(key)
+                return entry
+            del self._entries[key]
+
+        if phash is not None and user_id is not None:
+            for candidate_key, candidate in reversed(self._entries.items()):
+                candidate_phash = candidate.get("phash")
+                if candidate_phash is None or self._expired(candidate["created_at"]):
+                    continue
+                if str(user_id) not in candidate.get("user_ids", ()):
+                    continue
+                if bin(candidate_phash ^ phash).count("1") <= self.max_distance:
+                    self._entries.move_to_end(candidate_key)
+                    return candidate
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT value, phash, created_at FROM receipt_cache WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self.ttl),
+            ).fetchone()
+            if row is not None:
+                entry = {**json.loads(row[0]), "key": key, "phash": row[1], "created_at": row[2]}
+                self._remember(key, entry)
+                return entry
+        return None
+
+    def get(self, image_bytes: bytes, user_id=None):
+        """
+        Look up a previous result for this image.
+
+        Args:
+            image_bytes (bytes): The upload.
+            user_id: The uploader; near-identical photos only match that user's own uploads.
+
+        Returns:
+            dict: The cached entry (`scan` plus any derived fields), or None on a miss.
+        """
+        key = content_key(image_bytes)
+        phash = self._phash(image_bytes)
+        with self._lock:
+            entry = self._lookup(key, phash, user_id)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def put(self, image_bytes: bytes, scan: dict, user_id=None, expense_id=None, **fields) -> dict:
+        """
+        Store the scan result for this image, plus any derived fields (category, price, business_name).
+
+        Args:
+            user_id: The uploader, recorded alongside earlier uploaders of the same bytes.
+            expense_id: The expense `user_id` saved from this receipt.
+        """
+        key = content_key(image_bytes)
+        entry = {"key": key, "phash": self._phash(image_bytes), "created_at": time.time(), "scan": scan, **fields}
+        with self._lock:
+            previous = self._lookup(key, None)
+            user_ids = set(previous.get("user_ids", ())) if previous is not None else set()
+            expense_ids = dict(previous.get("expense_ids", {})) if previous is not None else {}
+            if user_id is not None:
+                user_ids.add(str(user_id))
+                if expense_id is not None:
+                    expense_ids[str(user_id)] = str(expense_id)
+            entry.update(user_ids=sorted(user_ids), expense_ids=expense_ids)
+            self._remember(key, entry)
+            if self._db is not None:
+                value = json.dumps({name: value for name, value in entry.items() if name not in ("key", "phash", "created_at")})
+                self._db.execute(
+                    "INSERT OR REPLACE INTO receipt_cache (key, phash, value, created_at) VALUES (?, ?, ?, ?)",
+                    (key, entry["phash"], value, entry["created_at"]),
+                )
+                self._db.execute("DELETE FROM receipt_cache WHERE created_at < ?", (time.time() - self.ttl,))
+                self._db.commit()
+        return entry
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "persistent": self._db is not None,
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
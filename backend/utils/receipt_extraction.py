@@ -0,0 +1,156 @@
+import json
+import os
+import re
+import time
+from typing import Literal, Optional
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+from utils.metrics import get_summary, span
+from utils.receipt_rules import extract_fields_by_rules
+
+# Rule-based fields at or above this confidence are trusted without asking the LLM
+RULES_MIN_CONFIDENCE = float(os.getenv("RECEIPT_RULES_MIN_CONFIDENCE", "0.8"))
+
+CATEGORIES = ("Food", "Entertainment", "Shopping", "Travel", "Pets", "Medical", "Rent", "Transportation", "Other")
+
+EXTRACTION_PROMPT = f"""You are an expert in reading parsed receipts (given as a JSON object).
+Extract the following fields:
+- "category": one of {", ".join(CATEGORIES)}. Use "Other" if none fit.
+- "price": the final total paid, as a number without a currency symbol.
+- "business_name": the name of the restaurant or store.
+***IMPORTANT FORMATTING INSTRUCTIONS***
+Respond with a single JSON object and nothing else, in exactly this format:
+{{"category": "Food", "price": 12.34, "business_name": "Example Diner"}}
+"""
+
+# Narrow prompts used to re-ask for a single field that failed validation
+FIELD_PROMPTS = {
+    "category": f"You are an expert in classifying receipts into categories. The categories are: {', '.join(CATEGORIES)}. IMPORTANT: ONLY RESPOND WITH THE CATEGORY NAME, NO OTHER TEXT. If the receipt cannot be classified into any of the categories, respond with \"Other\".",
+    "price": "You are an expert in extracting prices from receipts. Specifically, the final price. IMPORTANT: ONLY RESPOND WITH THE FINAL PRICE, NO OTHER TEXT.",
+    "business_name": "You are an expert in extracting restaurant names from receipts. Specifically, the restaurant name. IMPORTANT: ONLY RESPOND WITH THE RESTAURANT NAME, NO OTHER TEXT. Do not include '$' in your response.",
+}
+
+
+class ReceiptFields(BaseModel):
+    """Fields the LLM extracts from a scanned receipt."""
+
+    category: Literal["Food", "Entertainment", "Shopping", "Travel", "Pets", "Medical", "Rent", "Transportation", "Other"]
+    price: float
+    business_name: Optional[str] = None
+
+    @field_validator("category", mode="before")
+    @classmethod
+    def normalize_category(cls, value):
+        if isinstance(value, str):
+            for category in CATEGORIES:
+                if value.strip().lower() == category.lower():
+                    return category
+        return value
+
+    @field_validator("price", mode="before")
+    @classmethod
+    def parse_price(cls, value):
+        if isinstance(value, str):
+            match = re.search(r"-?\d[\d,]*(?:\.\d+)?", value)
+            if match is None:
+                raise ValueError(f"No price found in {value!r}")
+            return match.group(0).replace(",", "")
+        return value
+
+    @field_validator("business_name")
+    @classmethod
+    def non_empty_business_name(cls, value):
+        if value is None:
+            return value
+        value = value.strip().strip('"')
+        if not value:
+            raise ValueError("Business name is empty")
+        return value
+
+
+def strip_thinking(content: str) -> str:
+    """Drop a DeepSeek-R1 <think> section, keeping only the final answer."""
+    if "</think>" in content:
+        content = content.split("</think>", 1)[1]
+    return content.strip()
+
+
+def parse_json_object(content: str) -> dict:
+    """Pull the first JSON object out of a completion, tolerating code fences and chatter."""
+    start, end = content.find("{"), content.rfind("}")
+    if start == -1 or end < start:
+        return {}
+    try:
+        with span("json_parse", target="receipt_extraction"):
+            parsed = json.loads(content[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def _invalid_fields(values: dict) -> list:
+    try:
+        fields = ReceiptFields.model_validate(values)
+    except ValidationError as err:
+        return sorted({str(error["loc"][0]) for error in err.errors() if error["loc"]})
+    # Only the rule-based path may leave the business name unknown
+    return [] if fields.business_name else ["business_name"]
+
+
+async def extract_receipt_fields(result: dict, gateway, min_confidence: float = RULES_MIN_CONFIDENCE) -> tuple:
+    """
+    Extract category, price and business name from a scan.
+
+    The Donut prediction is first read with deterministic rules; when the price and
+    category come out at `min_confidence` or better, no LLM call is made. Otherwise a
+    single structured completion is requested, and fields that fail validation are
+    re-asked one at a time with a narrow prompt, so a bad price does not cost another
+    category or business-name round trip.
+
+    Args:
+        result (dict): The Donut prediction for the receipt.
+        gateway (LLMGateway): The LLM gateway to call.
+        min_confidence (float): Rule confidence needed to skip the LLM.
+
+    Returns:
+        tuple: The validated ReceiptFields and a usage report (source, tokens, LLM calls, latency).
+    """
+    started = time.perf_counter()
+    usage = {"source": "rules", "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "retried_fields": []}
+
+    rules = extract_fields_by_rules(result)
+    confidence = rules["confidence"]
+    if rules["price"] is not None and min(confidence["price"], confidence["category"]) >= min_confidence:
+        fields = ReceiptFields(category=rules["category"], price=rules["price"], business_name=rules["business_name"])
+        usage["latency_seconds"] = time.perf_counter() - started
+        get_summary("receipt_extraction.rules_latency_seconds").observe(usage["latency_seconds"])
+        return fields, usage
+
+    usage["source"] = "llm"
+    receipt_json = json.dumps(result)
+
+    async def complete(system_prompt: str) -> str:
+        response = await gateway.chat([
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Here is the receipt: {receipt_json}"}
+        ])
+        usage["llm_calls"] += 1
+        token_usage = response.get("usage") or {}
+        usage["prompt_tokens"] += token_usage.get("prompt_tokens") or 0
+        usage["completion_tokens"] += token_usage.get("completion_tokens") or 0
+        return strip_thinking(response["choices"][0]["message"]["content"])
+
+    values = parse_json_object(await complete(EXTRACTION_PROMPT))
+    for field in _invalid_fields(values):
+        usage["retried_fields"].append(field)
+        values[field] = await complete(FIELD_PROMPTS[field])
+    fields = ReceiptFields.model_validate(values)
+    if not fields.business_name:
+        raise ValueError("LLM did not return a business name")
+
+    usage["latency_seconds"] = time.perf_counter() - started
+    get_summary("receipt_extraction.latency_seconds").observe(usage["latency_seconds"])
+    get_summary("receipt_extraction.prompt_tokens").observe(usage["prompt_tokens"])
+    get_summary("receipt_extraction.completion_tokens").observe(usage["completion_tokens"])
+    return fields, usage
@@ -0,0 +1,405 @@
+import asyncio
+import ipaddress
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import httpx
+
+from utils.log import get_logger
+from utils.metrics import get_summary
+
+log = get_logger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+FINAL_STATUSES = ("done", "dead")
+
+
+class UnsafeWebhookURL(ValueError):
+    """Raised for a webhook URL that is not http(s) or does not point at a public address."""
+
+
+async def resolve_webhook_url(url: str) -> tuple:
+    """
+    Check that a webhook URL points at the public internet.
+
+    The host is resolved and every address it resolves to must be globally routable, so a
+    webhook cannot be aimed at loopback, private, link-local (cloud metadata) or reserved
+    addresses.
+
+    Returns:
+        tuple: (httpx.URL, address), where address is the checked IP to connect to, so
+        delivery does not resolve the name a second time (DNS rebinding).
+    """
+    try:
+        parsed = httpx.URL(url)
+    except httpx.InvalidURL as e:
+        raise UnsafeWebhookURL(f"Invalid webhook_url: {e}")
+    if parsed.scheme not in ("http", "https") or not parsed.host:
+        raise UnsafeWebhookURL("webhook_url must be an http(s) URL")
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(parsed.host, parsed.port or 0, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise UnsafeWebhookURL(f"webhook_url host does not resolve: {e}")
+    addresses = []
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise UnsafeWebhookURL("webhook_url must not point at a private, loopback or link-local address")
+        addresses.append(str(address))
+    return parsed, addresses[0]
+
+
+class ReceiptJobQueue:
+    """
+    Persistent queue of receipt ingestion jobs, stored in SQLite.
+
+    A job holds the uploaded image until it is processed. Claimed jobs carry a lease; if
+    the process dies mid-job the lease runs out and another worker picks the job up again.
+    Each claim increments `attempts`, which doubles as the lease token: complete and fail
+    are ignored unless the caller still holds that claim.
+    Failed jobs are retried with exponential backoff and moved to the `dead` status
+    (dead-lettered, image kept) once `max_attempts` is reached.
+
+    Args:
+        db_path (str): SQLite file, or ":memory:" for a queue that does not survive restarts.
+        max_attempts (int): Attempts before a job is dead-lettered.
+        retry_delay (float): Seconds before the first retry; doubles on every attempt.
+        lease_seconds (float): How long a worker may hold a job before it is handed out again.
+    """
+
+    def __init__(self, db_path: str = ":memory:", max_attempts: int = 3, retry_delay: float = 5.0, lease_seconds: float = 300.0):
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS receipt_jobs ("
+            "id TEXT PRIMARY KEY, user_id TEXT NOT NULL, status TEXT NOT NULL, image BLOB, "
+            "attempts INTEGER NOT NULL DEFAULT 0, available_at REAL NOT NULL, leased_until REAL, "
+            "webhook_url TEXT, result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS receipt_jobs_ready ON receipt_jobs (status, available_at)")
+        self._db.commit()
+        self._watchers = {}
+        self._wakeup = asyncio.Event()
+        self._expired = asyncio.Queue()
+        self.wait_time = get_summary("receipt_jobs.queue_wait_seconds")
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            db_path=os.getenv("RECEIPT_JOBS_DB", "receipt_jobs.sqlite3"),
+            max_attempts=int(os.getenv("RECEIPT_JOB_MAX_ATTEMPTS", "3")),
+            retry_delay=float(os.getenv("RECEIPT_JOB_RETRY_DELAY", "5")),
+            lease_seconds=float(os.getenv("RECEIPT_JOB_LEASE_SECONDS", "300")),
+        )
+
+    def _row(self, job_id: str):
+        row = self._db.execute(
+            "SELECT id, user_id, status, attempts, webhook_url, result, error, created_at, updated_at "
+            "FROM receipt_jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "user_id", "status", "attempts", "webhook_url", "result", "error", "created_at", "updated_at")
+        job = dict(zip(keys, row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def enqueue(self, image: bytes, user_id, webhook_url: str = None) -> dict:
+        """Persist a new job and wake an idle worker. Returns the job (without its image)."""
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO receipt_jobs (id, user_id, status, image, available_at, webhook_url, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, str(user_id), image, now, webhook_url, now, now),
+            )
+            self._db.commit()
+            job = self._row(job_id)
+        self._wakeup.set()
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._row(job_id)
+
+    def claim(self):
+        """
+        Lease the oldest ready job, or a running one whose lease expired.
+
+        Running jobs whose lease expired on their last attempt are dead-lettered instead;
+        watchers are told, and those with a webhook are handed out by `next_expired`.
+
+        Returns:
+            dict: The job including its `image`, or None if nothing is ready.
+        """
+        now = time.time()
+        with self._lock:
+            # A job whose worker keeps dying with it must not be handed out forever
+            expired = [job_id for (job_id,) in self._db.execute(
+                "SELECT id FROM receipt_jobs WHERE status = 'running' AND leased_until < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            ).fetchall()]
+            for job_id in expired:
+                self._db.execute(
+                    "UPDATE receipt_jobs SET status = 'dead', error = 'Worker lease expired', leased_until = NULL, updated_at = ? WHERE id = ?",
+                    (now, job_id),
+                )
+            self._db.commit()
+            dead = [self._row(job_id) for job_id in expired]
+            row = self._db.execute(
+                "SELECT id, user_id, image, attempts, created_at FROM receipt_jobs "
+                "WHERE (status = 'queued' AND available_at <= ?) OR (status = 'running' AND leased_until < ?) "
+                "ORDER BY available_at LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is not None:
+                self._db.execute(
+                    "UPDATE receipt_jobs SET status = 'running', attempts = attempts + 1, leased_until = ?, updated_at = ? WHERE id = ?",
+                    (now + self.lease_seconds, now, row[0]),
+                )
+                self._db.commit()
+                job = self._row(row[0])
+        for expired_job in dead:
+            self._notify(expired_job)
+            if expired_job["webhook_url"]:
+                self._expired.put_nowait(expired_job)
+        if row is None:
+            return None
+        self._notify(job)
+        self.wait_time.observe(now - row[4])
+        return {"id": row[0], "user_id": row[1], "image": row[2], "attempts": row[3] + 1}
+
+    async def next_expired(self) -> dict:
+        """Wait for a job with a webhook that `claim` dead-lettered after its lease expired."""
+        return await self._expired.get()
+
+    def _holds_lease(self, job_id: str, attempt) -> bool:
+        if attempt is None:
+            return True
+        row = self._db.execute("SELECT status, attempts FROM receipt_jobs WHERE id = ?", (job_id,)).fetchone()
+        return row == ("running", attempt)
+
+    def renew(self, job_id: str, attempt: int) -> bool:
+        """Extend the lease of a running job. Returns False if another worker has claimed it since."""
+        with self._lock:
+            renewed = self._db.execute(
+                "UPDATE receipt_jobs SET leased_until = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+                (time.time() + self.lease_seconds, job_id, attempt),
+            ).rowcount
+            self._db.commit()
+        return bool(renewed)
+
+    def complete(self, job_id: str, result: dict, attempt: int = None):
+        """
+        Record a job's result.
+
+        With `attempt` (the claim's attempt number), nothing is recorded unless that claim still
+        holds the job; returns None in that case.
+        """
+        now = time.time()
+        with self._lock:
+            if not self._holds_lease(job_id, attempt):
+                return None
+            # The image is no longer needed once the expense is saved
+            self._db.execute(
+                "UPDATE receipt_jobs SET status = 'done', image = NULL, result = ?, error = NULL, leased_until = NULL, updated_at = ? WHERE id = ?",
+                (json.dumps(result, default=str), now, job_id),
+            )
+            self._db.commit()
+            job = self._row(job_id)
+        self._notify(job)
+        return job
+
+    def fail(self, job_id: str, error: str, retry: bool = True, attempt: int = None):
+        """
+        Schedule a retry with backoff, or dead-letter the job once it is out of attempts (or `retry` is False).
+
+        `attempt` works as in complete.
+        """
+        now = time.time()
+        with self._lock:
+            if not self._holds_lease(job_id, attempt):
+                return None
+            attempts = self._db.execute("SELECT attempts FROM receipt_jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            if not retry or attempts >= self.max_attempts:
+                self._db.execute(
+                    "UPDATE receipt_jobs SET status = 'dead', error = ?, leased_until = NULL, updated_at = ? WHERE id = ?",
+                    (error, now, job_id),
+                )
+            else:
+                self._db.execute(
+                    "UPDATE receipt_jobs SET status = 'queued', error = ?, available_at = ?, leased_until = NULL, updated_at = ? WHERE id = ?",
+                    (error, now + self.retry_delay * 2 ** (attempts - 1), now, job_id),
+                )
+            self._db.commit()
+            job = self._row(job_id)
+        self._notify(job)
+        return job
+
+    def retry(self, job_id: str):
+        """Put a dead-lettered job back in the queue with a fresh set of attempts."""
+        now = time.time()
+        with self._lock:
+            updated = self._db.execute(
+                "UPDATE receipt_jobs SET status = 'queued', attempts = 0, available_at = ?, updated_at = ? WHERE id = ? AND status = 'dead'",
+                (now, now, job_id),
+            ).rowcount
+            self._db.commit()
+            job = self._row(job_id)
+        if updated:
+            self._wakeup.set()
+            self._notify(job)
+        return job
+
+    def _notify(self, job: dict):
+        for queue in self._watchers.get(job["id"], ()):
+            queue.put_nowait(job)
+
+    async def watch(self, job_id: str):
+        """Yield the job every time its status changes, until it is done or dead-lettered."""
+        queue = asyncio.Queue()
+        self._watchers.setdefault(job_id, set()).add(queue)
+        try:
+            job = self.get(job_id)
+            while job is not None:
+                yield job
+                if job["status"] in FINAL_STATUSES:
+                    return
+                job = await queue.get()
+        finally:
+            self._watchers[job_id].discard(queue)
+            if not self._watchers[job_id]:
+                del self._watchers[job_id]
+
+    async def next_job(self, poll_interval: float = 1.0):
+        """Wait for a job to become ready. Polls only to pick up retries and expired leases."""
+        while True:
+            job = self.claim()
+            if job is not None:
+                return job
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM receipt_jobs GROUP BY status").fetchall())
+        return {
+            **{status: counts.get(status, 0) for status in (*ACTIVE_STATUSES, *FINAL_STATUSES)},
+            "watchers": sum(len(queues) for queues in self._watchers.values()),
+            "queue_wait_seconds": self.wait_time.snapshot(),
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class ReceiptJobWorkers:
+    """
+    Background tasks that drain a ReceiptJobQueue.
+
+    Each worker claims a job, renews its lease while `handler(job)` (scan, extract, save)
+    runs, and records the result, or the error for a retry. Finished and dead-lettered jobs
+    (including those whose lease ran out on their last attempt) are POSTed to their
+    webhook, if they have one and it still resolves to a public address.
+
+    Args:
+        queue (ReceiptJobQueue): The queue to drain.
+        handler: Coroutine function taking the claimed job and returning a JSON-able result.
+        workers (int): Jobs processed at the same time.
+        permanent_errors (tuple): Exception types that dead-letter a job without retrying.
+        transport: Optional httpx transport for webhook calls instead of the network (tests).
+    """
+
+    def __init__(self, queue: ReceiptJobQueue, handler, workers: int = 2, permanent_errors: tuple = (), webhook_timeout: float = 10.0, transport: httpx.AsyncBaseTransport = None):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.permanent_errors = permanent_errors
+        self.webhook_timeout = webhook_timeout
+        self.transport = transport
+        self._tasks = []
+        self._http = None
+        self.job_time = get_summary("receipt_jobs.processing_seconds")
+
+    @classmethod
+    def from_env(cls, queue: ReceiptJobQueue, handler, permanent_errors: tuple = ()):
+        return cls(queue, handler, workers=int(os.getenv("RECEIPT_JOB_WORKERS", "2")), permanent_errors=permanent_errors)
+
+    async def start(self):
+        # A redirect could point the webhook at an address resolve_webhook_url would refuse
+        self._http = httpx.AsyncClient(timeout=self.webhook_timeout, follow_redirects=False, transport=self.transport)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._deliver_expired()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._http is not None:
+            await self._http.aclose()
+
+    async def _work(self):
+        while True:
+            job = await self.queue.next_job()
+            started = time.perf_counter()
+            renewer = asyncio.create_task(self._keep_leased(job))
+            try:
+                result = await self.handler(job)
+            except asyncio.CancelledError:
+                # Shutting down: the lease runs out and the job is picked up after restart
+                raise
+            except Exception as e:
+                finished = self.queue.fail(job["id"], f"{type(e).__name__}: {e}", retry=not isinstance(e, self.permanent_errors), attempt=job["attempts"])
+            else:
+                finished = self.queue.complete(job["id"], result, attempt=job["attempts"])
+            finally:
+                renewer.cancel()
+            self.job_time.observe(time.perf_counter() - started)
+            if finished is None:
+                # The lease ran out and another worker owns the job now; its outcome wins
+                log.warning("receipt_job_lease_lost", job_id=job["id"], attempt=job["attempts"])
+            elif finished["status"] in FINAL_STATUSES and finished["webhook_url"]:
+                await self._call_webhook(finished)
+
+    async def _deliver_expired(self):
+        # No worker reports back for a job whose lease ran out on its last attempt
+        while True:
+            await self._call_webhook(await self.queue.next_expired())
+
+    async def _keep_leased(self, job: dict):
+        # Renew well before expiry so a slow scan is not handed to a second worker
+        while True:
+            await asyncio.sleep(max(self.queue.lease_seconds / 3, 0.01))
+            if not self.queue.renew(job["id"], job["attempts"]):
+                return
+
+    async def _call_webhook(self, job: dict):
+        payload = {key: value for key, value in job.items() if key != "webhook_url"}
+        try:
+            # Checked again at delivery: the name may resolve elsewhere by now
+            url, address = await resolve_webhook_url(job["webhook_url"])
+            await self._http.post(
+                url.copy_with(host=address),
+                json=payload,
+                headers={"Host": url.netloc.decode("ascii")},
+                extensions={"sni_hostname": url.host},
+            )
+        except (httpx.HTTPError, UnsafeWebhookURL) as e:
+            log.warning("receipt_job_webhook_failed", job_id=job["id"], error=str(e))
@@ -0,0 +1,232 @@
+import re
+from datetime import date
+
+# Known merchants, matched as whole words of the lower-cased store name (so "uber" is not found in "Huber's")
+MERCHANT_CATEGORIES = {
+    "starbucks": "Food", "mcdonald": "Food", "chipotle": "Food", "subway": "Food", "domino": "Food",
+    "burger king": "Food", "wendy": "Food", "taco bell": "Food", "kfc": "Food", "panera": "Food",
+    "dunkin": "Food", "in-n-out": "Food", "safeway": "Food", "trader joe": "Food", "whole foods": "Food",
+    "amc": "Entertainment", "regal": "Entertainment", "cinemark": "Entertainment", "steam": "Entertainment",
+    "target": "Shopping", "walmart": "Shopping", "costco": "Shopping", "amazon": "Shopping", "best buy": "Shopping",
+    "ikea": "Shopping", "home depot": "Shopping",
+    "petco": "Pets", "petsmart": "Pets", "chewy": "Pets",
+    "cvs": "Medical", "walgreens": "Medical", "rite aid": "Medical", "pharmacy": "Medical", "clinic": "Medical",
+    "uber": "Transportation", "lyft": "Transportation", "shell": "Transportation", "chevron": "Transportation",
+    "exxon": "Transportation", "arco": "Transportation", "parking": "Transportation", "metro": "Transportation",
+    "airbnb": "Travel", "marriott": "Travel", "hilton": "Travel", "hotel": "Travel", "airlines": "Travel",
+}
+
+# Words that show up in line items, matched as whole words (or their plurals) of each menu
+# item name, so "cat" is not found in "Catfish" nor "tea" in "team"
+ITEM_KEYWORDS = {
+    "Food": (
+        "burger", "cheeseburger", "hamburger", "pizza", "coffee", "latte", "espresso", "tea", "rice", "chicken", "beef", "pork", "fish",
+        "fries", "salad", "sandwich", "noodle", "ramen", "soup", "taco", "burrito", "sushi", "beer", "wine",
+        "soda", "coke", "juice", "water", "cake", "bread", "egg", "cheese", "steak", "pasta", "dumpling",
+        "donut", "bagel", "milk", "milkshake", "ice cream", "mie", "nasi", "ayam", "teh", "kopi",
+    ),
+    "Transportation": ("gas", "fuel", "unleaded", "diesel", "fare", "toll", "parking"),
+    "Medical": ("rx", "prescription", "ibuprofen", "tylenol", "vitamin", "copay"),
+    "Pets": ("dog", "cat", "kibble", "litter", "pet"),
+    "Entertainment": ("ticket", "admission", "popcorn", "movie", "concert"),
+    "Travel": ("room", "night stay", "resort fee", "baggage"),
+}
+
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY", "₩": "KRW", "rp": "IDR", "usd": "USD", "eur": "EUR"}
+
+MERCHANT_PATTERNS = [(re.compile(rf"\b{re.escape(merchant)}s?\b"), category) for merchant, category in MERCHANT_CATEGORIES.items()]
+
+ITEM_PATTERNS = [
+    (re.compile(rf"\b(?:{'|'.join(re.escape(keyword) for keyword in keywords)})(?:e?s)?\b"), category)
+    for category, keywords in ITEM_KEYWORDS.items()
+]
+
+# Letter codes must start a word and not run into more letters: "Rp45.000" and "USD 12" but not "Sharp" or "Europe"
+CURRENCY_PATTERNS = [
+    (re.compile(rf"\b{re.escape(symbol)}(?![a-z])" if symbol.isalpha() else re.escape(symbol)), currency)
+    for symbol, currency in CURRENCY_SYMBOLS.items()
+]
+
+STORE_NAME_KEYS = ("store_nm", "store_name", "storename", "merchant", "merchant_name", "business_name", "company")
+
+DATE_PATTERNS = (
+    (re.compile(r"\b(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})\b"), ("y", "m", "d")),
+    (re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{2,4})\b"), ("m", "d", "y")),
+    (re.compile(r"\b(\d{1,2})[.-](\d{1,2})[.-](\d{2,4})\b"), ("d", "m", "y")),
+)
+
+
+def parse_amount(text) -> float:
+    """
+    Parse a receipt amount such as "$1,234.50", "45.000" or "12,50".
+
+    Returns:
+        float: The amount, or None if there is no number in `text`.
+    """
+    if isinstance(text, (int, float)):
+        return float(text)
+    if not isinstance(text, str):
+        return None
+    match = re.search(r"-?\d[\d.,]*", text.replace(" ", ""))
+    if match is None:
+        return None
+    number = match.group(0).rstrip(".,")
+    if "," in number and "." in number:
+        # Whichever separator comes last is the decimal point
+        if number.rfind(",") > number.rfind("."):
+            number = number.replace(".", "").replace(",", ".")
+        else:
+            number = number.replace(",", "")
+    elif "," in number or "." in number:
+        separator = "," if "," in number else "."
+        groups = number.split(separator)
+        if len(groups) > 2 or len(groups[-1]) == 3:
+            # 45.000 / 1,234,567 style thousands grouping
+            number = "".join(groups)
+        else:
+            number = number.replace(",", ".")
+    try:
+        return float(number)
+    except ValueError:
+        return None
+
+
+def detect_currency(texts) -> str:
+    for text in texts:
+        lowered = text.lower()
+        for pattern, currency in CURRENCY_PATTERNS:
+            if pattern.search(lowered):
+                return currency
+    return None
+
+
+def detect_date(texts):
+    for text in texts:
+        for pattern, order in DATE_PATTERNS:
+            match = pattern.search(text)
+            if match is None:
+                continue
+            parts = dict(zip(order, (int(group) for group in match.groups())))
+            if parts["y"] < 100:
+                parts["y"] += 2000
+            try:
+                return date(parts["y"], parts["m"], parts["d"])
+            except ValueError:
+                continue
+    return None
+
+
+def _as_list(value) -> list:
+    # Donut emits a single dict instead of a one-element list for lone entries
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+def _store_name(prediction: dict):
+    for key in STORE_NAME_KEYS:
+        value = prediction.get(key)
+        if isinstance(value, str) and value.strip():
+            return value.strip()
+    store_info = prediction.get("store_info")
+    if isinstance(store_info, dict):
+        for key in ("nm", *STORE_NAME_KEYS):
+            value = store_info.get(key)
+            if isinstance(value, str) and value.strip():
+                return value.strip()
+    return None
+
+
+def classify(business_name: str, item_names: list) -> tuple:
+    """
+    Pick a category from the merchant table, falling back to line-item keywords.
+
+    Returns:
+        tuple: (category, confidence between 0 and 1).
+    """
+    if business_name:
+        lowered = business_name.lower()
+        for pattern, category in MERCHANT_PATTERNS:
+            if pattern.search(lowered):
+                return category, 0.95
+
+    votes = {}
+    for name in item_names:
+        lowered = name.lower()
+        for pattern, category in ITEM_PATTERNS:
+            if pattern.search(lowered):
+                votes[category] = votes.get(category, 0) + 1
+                break
+    if not votes:
+        return "Other", 0.0
+    category, count = max(votes.items(), key=lambda vote: vote[1])
+    return category, 0.5 + 0.45 * count / len(item_names)
+
+
+def extract_fields_by_rules(prediction: dict) -> dict:
+    """
+    Read the total, currency, date, store name and category straight from a CORD-v2 prediction.
+
+    Args:
+        prediction (dict): The Donut output for one receipt.
+
+    Returns:
+        dict: `category`, `price`, `business_name`, `currency` and `date`, plus a
+        `confidence` dict giving a 0-1 score for category, price and business_name.
+    """
+    menu = _as_list(prediction.get("menu"))
+    item_names = [item["nm"] for item in menu if isinstance(item, dict) and isinstance(item.get("nm"), str)]
+    item_prices = [parse_amount(item.get("price")) for item in menu if isinstance(item, dict)]
+    item_prices = [price for price in item_prices if price is not None]
+    menu_sum = sum(item_prices)
+
+    total = prediction.get("total") if isinstance(prediction.get("total"), dict) else {}
+    sub_total = prediction.get("sub_total") if isinstance(prediction.get("sub_total"), dict) else {}
+    total_price = parse_amount(total.get("total_price"))
+    subtotal_price = parse_amount(sub_total.get("subtotal_price"))
+
+    if total_price is not None:
+        price = total_price
+        if subtotal_price is not None and total_price >= subtotal_price > 0:
+            price_confidence = 0.95
+        elif item_prices and abs(menu_sum - total_price) <= max(0.01, 0.25 * total_price):
+            # Line items roughly add up to the total (tax and tip explain the rest)
+            price_confidence = 0.9
+        else:
+            price_confidence = 0.75
+    elif subtotal_price is not None:
+        tax = parse_amount(sub_total.get("tax_price")) or 0.0
+        service = parse_amount(sub_total.get("service_price")) or 0.0
+        price, price_confidence = subtotal_price + tax + service, 0.6
+    elif item_prices:
+        price, price_confidence = menu_sum, 0.4
+    else:
+        price, price_confidence = None, 0.0
+
+    business_name = _store_name(prediction)
+    category, category_confidence = classify(business_name, item_names)
+    texts = list(_strings(prediction))
+
+    return {
+        "category": category,
+        "price": price,
+        "business_name": business_name,
+        "currency": detect_currency(texts),
+        "date": detect_date(texts),
+        "confidence": {
+            "category": category_confidence,
+            "price": price_confidence,
+            "business_name": 0.9 if business_name else 0.0,
+        },
+    }
@@ -5,11 +5,82 @@ MIT License
 
 https://github.com/clovaai/donut
 """
-from PIL import Image
-from donut import DonutModel
+import asyncio
+import io
+import os
+import time
+from contextlib import asynccontextmanager
+
+from utils.metrics import get_summary, span
+
+MAX_UPLOAD_BYTES = int(os.getenv("RECEIPT_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+
+class ReceiptTooLarge(Exception):
+    """Raised when an uploaded receipt exceeds the configured size limit."""
+
+
+class ReceiptScannerUnavailable(Exception):
+    """Raised when the receipt scanner failed to load and cannot serve scans."""
+
+
+async def read_upload(file, max_bytes: int = MAX_UPLOAD_BYTES) -> bytes:
+    """
+    Read an UploadFile into memory, giving up as soon as it grows past `max_bytes`.
+
+    Args:
+        file (UploadFile): The uploaded receipt.
+        max_bytes (int): Largest accepted upload.
+
+    Returns:
+        bytes: The upload contents.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise ReceiptTooLarge(f"Receipt image is larger than {max_bytes} bytes")
+    buffer = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            raise ReceiptTooLarge(f"Receipt image is larger than {max_bytes} bytes")
+    return bytes(buffer)
+
+
+def load_receipt_image(source, max_side: int = None):
+    """
+    Decode a receipt image from a path, raw bytes, a file-like object or an UploadFile.
+
+    Args:
+        source: Where to read the image from.
+        max_side (int): If given, downscale so neither side exceeds this many pixels.
+
+    Returns:
+        Image: The decoded RGB image.
+    """
+    from PIL import Image
+
+    if isinstance(source, Image.Image):
+        image = source
+    else:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        elif hasattr(source, "file"):
+            # Starlette UploadFile: decode straight from its spooled buffer
+            source = source.file
+            source.seek(0)
+        image = Image.open(source)
+    if max_side and max(image.size) > max_side:
+        # draft() lets the JPEG decoder skip detail we would throw away anyway
+        image.draft("RGB", (max_side, max_side))
+        image.thumbnail((max_side, max_side))
+    return image.convert("RGB")
+
 
 class ReceiptScanner:
     def __init__(self):
+        # donut pulls in torch and transformers, so only pay for them when a scanner is built
+        from donut import DonutModel
+
         # Initialize the model with ignore_mismatched_sizes=True
         self.model = DonutModel.from_pretrained(
             "naver-clova-ix/donut-base-finetuned-cord-v2",
@@ -17,18 +88,273 @@ class ReceiptScanner:
         )
         self.model.eval()
         self.task_prompt = "<s_cord-v2>"
+        # The encoder resizes to this anyway, so larger uploads are only wasted decoding work
+        self.max_image_side = max(self.model.config.input_size)
 
-    def scan_receipt(self, image_path):
-        # Load and process the image
+    def _load_image(self, image):
         try:
-            image = Image.open(image_path)
+            return load_receipt_image(image, max_side=self.max_image_side)
         except Exception as e:
-            raise FileNotFoundError(detail=str(e))
+            raise FileNotFoundError(str(e))
+
+    def scan_receipt(self, image):
+        """Scan one receipt given as a path, bytes, a file-like object or an UploadFile."""
+        # Load and process the image
+        import torch
+
+        image = self._load_image(image)
         
         # Generate receipt information
-        output = self.model.inference(
-            image=image,
-            prompt=self.task_prompt
-        )["predictions"][0]
+        with torch.inference_mode():
+            output = self.model.inference(
+                image=image,
+                prompt=self.task_prompt
+            )["predictions"][0]
         
         return output
+
+    def scan_receipts(self, images):
+        """
+        Scan several receipts in a single encoder/decoder pass.
+
+        Args:
+            images: The receipt images to scan, in any form scan_receipt accepts.
+
+        Returns:
+            list: One prediction per image, in the same order.
+        """
+        import torch
+
+        images = [self._load_image(image) for image in images]
+        with torch.inference_mode():
+            image_tensors = torch.stack([self.model.encoder.prepare_input(image) for image in images])
+            prompt_tensors = self.model.decoder.tokenizer(
+                self.task_prompt,
+                add_special_tokens=False,
+                return_tensors="pt"
+            )["input_ids"].expand(len(images), -1)
+            return self.model.inference(
+                image_tensors=image_tensors,
+                prompt_tensors=prompt_tensors
+            )["predictions"]
+
+
+# Queued in place of a scanner when loading fails, so waiters do not block forever
+_LOAD_FAILED = object()
+
+
+class ReceiptScannerPool:
+    """
+    A fixed set of preloaded ReceiptScanner instances shared by every request.
+
+    Loading Donut takes seconds and hundreds of MB, so the scanners are built once at
+    startup and lent out one request at a time. The pool size is also the upper bound
+    on concurrent inferences; extra requests wait for a scanner to be returned.
+
+    Args:
+        size (int): Number of scanners to keep loaded.
+        scanner_factory: Callable returning a ready-to-use scanner.
+    """
+
+    def __init__(self, size: int = 1, scanner_factory=ReceiptScanner):
+        if size < 1:
+            raise ValueError("Receipt scanner pool size must be at least 1")
+        self.size = size
+        self._scanner_factory = scanner_factory
+        self._idle = None
+        self.load_error = None
+        self._in_use = 0
+        self._waiting = 0
+        self.load_time = get_summary("receipt_scanner.load_seconds")
+        self.queue_wait = get_summary("receipt_scanner.queue_wait_seconds")
+        self.inference_time = get_summary("receipt_scanner.inference_seconds")
+
+    @classmethod
+    def from_env(cls):
+        return cls(size=int(os.getenv("RECEIPT_SCANNER_POOL_SIZE", "1")))
+
+    async def start(self):
+        """
+        Load every scanner up front. Loading runs in a thread so startup can overlap other work.
+
+        If a scanner fails to load, the pool stops serving: callers already waiting for a
+        scanner and every later one get ReceiptScannerUnavailable instead of waiting forever.
+        """
+        self._idle = asyncio.Queue()
+        try:
+            for _ in range(self.size):
+                started = time.perf_counter()
+                scanner = await asyncio.to_thread(self._scanner_factory)
+                self.load_time.observe(time.perf_counter() - started)
+                self._idle.put_nowait(scanner)
+        except Exception as e:
+            self.load_error = e
+            # Wakes the waiters one after another, see acquire
+            self._idle.put_nowait(_LOAD_FAILED)
+            raise
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrow a scanner for the duration of the `async with` block."""
+        if self._idle is None:
+            raise RuntimeError("Receipt scanner pool has not been started")
+        if self.load_error is not None:
+            raise ReceiptScannerUnavailable(f"Receipt scanner failed to load: {self.load_error!r}")
+        started = time.perf_counter()
+        self._waiting += 1
+        try:
+            scanner = await self._idle.get()
+        finally:
+            self._waiting -= 1
+        if scanner is _LOAD_FAILED:
+            self._idle.put_nowait(scanner)
+            raise ReceiptScannerUnavailable(f"Receipt scanner failed to load: {self.load_error!r}")
+        self.queue_wait.observe(time.perf_counter() - started)
+        self._in_use += 1
+        try:
+            yield scanner
+        finally:
+            self._in_use -= 1
+            self._idle.put_nowait(scanner)
+
+    async def scan(self, image):
+        """Scan a receipt on a pooled scanner without blocking the event loop."""
+        async with self.acquire() as scanner:
+            started = time.perf_counter()
+            try:
+                with span("donut"):
+                    return await asyncio.to_thread(scanner.scan_receipt, image)
+            finally:
+                self.inference_time.observe(time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "in_use": self._in_use,
+            "waiting": self._waiting,
+            "load_seconds": self.load_time.snapshot(),
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+            "inference_seconds": self.inference_time.snapshot(),
+        }
+
+
+class BatchingReceiptScanner:
+    """
+    Micro-batching front end for a ReceiptScannerPool.
+
+    Uploads arriving within `batch_window` seconds of each other are grouped (up to
+    `max_batch_size`) and run through Donut as one batch, which keeps every core busy on
+    CPU-only nodes. There is one collector per pooled scanner, so the pool size still
+    bounds the number of batches in flight.
+
+    Args:
+        pool (ReceiptScannerPool): The started pool to run batches on.
+        max_batch_size (int): Largest number of receipts scanned together.
+        batch_window (float): Seconds to wait for more uploads after the first one arrives.
+        request_timeout (float): Seconds a caller waits for its prediction before giving up.
+    """
+
+    def __init__(self, pool: ReceiptScannerPool, max_batch_size: int = 4, batch_window: float = 0.05, request_timeout: float = 120.0):
+        if max_batch_size < 1:
+            raise ValueError("Receipt batch size must be at least 1")
+        self.pool = pool
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.request_timeout = request_timeout
+        self._queue = None
+        self._collectors = []
+        self.batch_sizes = get_summary("receipt_scanner.batch_size")
+        self.batch_time = get_summary("receipt_scanner.batch_seconds")
+
+    @classmethod
+    def from_env(cls, pool: ReceiptScannerPool):
+        return cls(
+            pool,
+            max_batch_size=int(os.getenv("RECEIPT_BATCH_SIZE", "4")),
+            batch_window=float(os.getenv("RECEIPT_BATCH_WINDOW_MS", "50")) / 1000,
+            request_timeout=float(os.getenv("RECEIPT_SCAN_TIMEOUT", "120")),
+        )
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._collectors = [asyncio.create_task(self._collect()) for _ in range(self.pool.size)]
+
+    async def stop(self):
+        for collector in self._collectors:
+            collector.cancel()
+        await asyncio.gather(*self._collectors, return_exceptions=True)
+        self._collectors = []
+
+    async def scan(self, image):
+        """Queue a receipt for the next batch and wait for its own prediction."""
+        if self._queue is None:
+            raise RuntimeError("Batching receipt scanner has not been started")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image, future))
+        return await asyncio.wait_for(future, timeout=self.request_timeout)
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        # Callers that already timed out do not need a prediction
+        return [(image, future) for image, future in batch if not future.done()]
+
+    async def _collect(self):
+        while True:
+            batch = await self._next_batch()
+            if not batch:
+                continue
+            try:
+                async with self.pool.acquire() as scanner:
+                    await self._run_batch(scanner, batch)
+            except ReceiptScannerUnavailable as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _run_batch(self, scanner, batch):
+        self.batch_sizes.observe(len(batch))
+        started = time.perf_counter()
+        try:
+            with span("donut", batched="1"):
+                predictions = await asyncio.to_thread(scanner.scan_receipts, [image for image, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                predictions = [e]
+            else:
+                # Retry one by one so a single unreadable upload does not fail its neighbours
+                predictions = []
+                for image, _ in batch:
+                    try:
+                        predictions.append(await asyncio.to_thread(scanner.scan_receipt, image))
+                    except Exception as single_error:
+                        predictions.append(single_error)
+        finally:
+            self.batch_time.observe(time.perf_counter() - started)
+
+        for (_, future), prediction in zip(batch, predictions):
+            if future.done():
+                continue
+            if isinstance(prediction, Exception):
+                future.set_exception(prediction)
+            else:
+                future.set_result(prediction)
+
+    def stats(self) -> dict:
+        return {
+            **self.pool.stats(),
+            "max_batch_size": self.max_batch_size,
+            "batch_window_seconds": self.batch_window,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batch_size": self.batch_sizes.snapshot(),
+            "batch_seconds": self.batch_time.snapshot(),
+        }
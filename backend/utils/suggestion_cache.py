@@ -0,0 +1,192 @@
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case, drop punctuation (keeping amounts intact) and collapse whitespace."""
+    text = text.lower().replace(",", "")
+    text = re.sub(r"[^\w$.%\s]|(?<!\d)\.|\.(?!\d)", " ", text)
+    return " ".join(text.split())
+
+
+def normalize_questionnaire(questionnaire) -> str:
+    """Canonical text for a questionnaire model, one `field: answer` line per field."""
+    return "\n".join(f"{name}: {normalize_text(str(value))}" for name, value in questionnaire.model_dump().items())
+
+
+def _numbers(text: str) -> tuple:
+    return tuple(sorted(re.findall(r"\d+(?:\.\d+)?", text)))
+
+
+class MinHasher:
+    """MinHash signatures over word unigrams and bigrams, for estimating Jaccard similarity."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._params = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+
+    def signature(self, text: str) -> tuple:
+        words = text.split()
+        shingles = set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+        if not shingles:
+            return tuple([_MERSENNE_PRIME] * self.num_perm)
+        hashes = [int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big") for shingle in shingles]
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._params)
+
+    @staticmethod
+    def similarity(left: tuple, right: tuple) -> float:
+        return sum(l == r for l, r in zip(left, right)) / len(left)
+
+
+class SuggestionCache:
+    """
+    LRU + TTL cache of LLM suggestions keyed by normalized questionnaire text.
+
+    Exact matches are looked up by hash. With `near_duplicates` enabled, a miss is also
+    checked against stored entries using MinHash with LSH banding; an entry counts as a hit
+    when its estimated similarity is at least `similarity_threshold` and it mentions
+    exactly the same numbers (so "$5000 a month" never reuses the "$500 a month" answer).
+
+    Args:
+        max_entries (int): Entries kept before the least recently used is evicted.
+        ttl (float): Seconds an entry stays valid.
+        near_duplicates (bool): Also serve near-identical questionnaires.
+        similarity_threshold (float): Estimated Jaccard similarity needed for a near-duplicate hit.
+        num_perm (int): MinHash permutations (a multiple of `bands`).
+        bands (int): LSH bands used to find near-duplicate candidates.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600, near_duplicates: bool = False, similarity_threshold: float = 0.8, num_perm: int = 64, bands: int = 16):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.near_duplicates = near_duplicates
+        self.similarity_threshold = similarity_threshold
+        self.bands = bands
+        self._rows = num_perm // bands
+        self._hasher = MinHasher(num_perm) if near_duplicates else None
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.getenv("SUGGESTION_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("SUGGESTION_CACHE_TTL", "3600")),
+            near_duplicates=os.getenv("SUGGESTION_CACHE_NEAR_DUPLICATES", "0") == "1",
+            similarity_threshold=float(os.getenv("SUGGESTION_CACHE_SIMILARITY", "0.8")),
+        )
+
+    def _band_keys(self, kind: str, signature: tuple):
+        for band in range(self.bands):
+            yield (kind, band, signature[band * self._rows:(band + 1) * self._rows])
+
+    def _evict(self, key):
+        entry = self._entries.pop(key)
+        if entry["signature"] is not None:
+            for band_key in self._band_keys(entry["kind"], entry["signature"]):
+                bucket = self._buckets.get(band_key)
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self._buckets[band_key]
+
+    def _fresh(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["created_at"] > self.ttl:
+            self._evict(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _key(self, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{kind}\n{text}".encode()).hexdigest()
+
+    def get(self, kind: str, text: str):
+        """
+        Look up a cached suggestion.
+
+        Args:
+            kind (str): Which suggestion endpoint the entry belongs to.
+            text (str): The normalized questionnaire.
+
+        Returns:
+            The cached suggestion, or None on a miss.
+        """
+        with self._lock:
+            entry = self._fresh(self._key(kind, text))
+            if entry is not None:
+                self.hits += 1
+                return entry["value"]
+
+            if self.near_duplicates:
+                signature = self._hasher.signature(text)
+                numbers = _numbers(text)
+                candidates = set()
+                for band_key in self._band_keys(kind, signature):
+                    candidates |= self._buckets.get(band_key, set())
+                best_key, best_similarity = None, self.similarity_threshold
+                for candidate_key in candidates:
+                    candidate = self._entries.get(candidate_key)
+                    if candidate is None or candidate["numbers"] != numbers:
+                        continue
+                    similarity = MinHasher.similarity(signature, candidate["signature"])
+                    if similarity >= best_similarity:
+                        best_key, best_similarity = candidate_key, similarity
+                if best_key is not None and self._fresh(best_key) is not None:
+                    self.hits += 1
+                    self.near_hits += 1
+                    return self._entries[best_key]["value"]
+
+            self.misses += 1
+            return None
+
+    def put(self, kind: str, text: str, value):
+        key = self._key(kind, text)
+        signature = self._hasher.signature(text) if self.near_duplicates else None
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = {
+                "kind": kind,
+                "value": value,
+                "signature": signature,
+                "numbers": _numbers(text),
+                "created_at": time.time(),
+            }
+            if signature is not None:
+                for band_key in self._band_keys(kind, signature):
+                    self._buckets.setdefault(band_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "near_duplicate_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "near_duplicates": self.near_duplicates,
+            "similarity_threshold": self.similarity_threshold,
+        }
@@ -1,6 +1,131 @@
-from supabase import create_client
 import os
+import time
+
+import httpx
 from dotenv import load_dotenv
+from gotrue import AsyncMemoryStorage
+from supabase import AsyncClient, AsyncClientOptions, ASupabaseAuthClient, acreate_client
+
+from utils.metrics import span
 
 load_dotenv()
-supabase_client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    Wrap the pooled HTTP transport to track how many requests are in flight.
+
+    Each request is also timed as a `db` stage, labelled with the table or RPC it targets.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_connections: int):
+        self._transport = transport
+        self.max_connections = max_connections
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.busy_seconds = 0.0
+        self.started = time.monotonic()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        started = time.monotonic()
+        try:
+            with span("db", target=db_target(request.url.path)):
+                return await self._transport.handle_async_request(request)
+        finally:
+            self.in_flight -= 1
+            self.busy_seconds += time.monotonic() - started
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+    def stats(self) -> dict:
+        uptime = time.monotonic() - self.started
+        return {
+            "max_connections": self.max_connections,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "requests": self.requests,
+            "utilization": self.in_flight / self.max_connections,
+            # Average number of requests in flight since startup, relative to the pool size
+            "average_utilization": self.busy_seconds / uptime / self.max_connections if uptime else 0.0,
+        }
+
+
+def db_target(path: str) -> str:
+    """Metric label for a Supabase URL path: `/rest/v1/expenses` -> `expenses`, `/rest/v1/rpc/x` -> `rpc/x`."""
+    service, _, rest = path.strip("/").partition("/v1/")
+    if service != "rest":
+        # auth/v1/user, realtime, storage...: the service name is enough
+        return service or "unknown"
+    parts = rest.split("/")
+    return "/".join(parts[:2]) if parts[0] == "rpc" else parts[0]
+
+
+async def create_supabase_client(transport: httpx.AsyncBaseTransport = None) -> AsyncClient:
+    """
+    Create the process-wide Supabase client.
+
+    Every PostgREST and auth request goes through one keep-alive HTTP/2 connection pool,
+    sized by SUPABASE_MAX_CONNECTIONS and SUPABASE_MAX_KEEPALIVE. Call this once from the
+    app lifespan and close it with close_supabase_client. Nobody signs in on this client
+    (see create_auth_client): it serves every user's queries under the project key, so it
+    keeps no session and never refreshes one.
+
+    Args:
+        transport: Optional httpx transport to use instead of the network (tests and benchmarks).
+    """
+    max_connections = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20"))
+    pool_transport = transport or httpx.AsyncHTTPTransport(
+        http2=os.getenv("SUPABASE_HTTP2", "1") == "1",
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=int(os.getenv("SUPABASE_MAX_KEEPALIVE", "10")),
+            keepalive_expiry=float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30")),
+        ),
+    )
+    instrumented = InstrumentedTransport(pool_transport, max_connections)
+    timeout = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+    http_client = httpx.AsyncClient(transport=instrumented, timeout=timeout)
+    client = await acreate_client(
+        os.getenv("SUPABASE_URL"),
+        os.getenv("SUPABASE_KEY"),
+        options=AsyncClientOptions(
+            httpx_client=http_client,
+            postgrest_client_timeout=timeout,
+            auto_refresh_token=False,
+            persist_session=False,
+        ),
+    )
+    client.pool = instrumented
+    client.http_client = http_client
+    return client
+
+
+def create_auth_client(client: AsyncClient) -> ASupabaseAuthClient:
+    """
+    A throwaway auth client for signing a user in or up, sharing `client`'s connection pool.
+
+    Signing in on the shared client would store the user's session on it and switch the
+    Authorization header of every later query, for every user, to that user's token. This
+    client is built per request, keeps its session to itself and never refreshes it.
+    """
+    return ASupabaseAuthClient(
+        url=client.auth_url,
+        headers={"apikey": client.supabase_key, "Authorization": f"Bearer {client.supabase_key}"},
+        auto_refresh_token=False,
+        persist_session=False,
+        storage=AsyncMemoryStorage(),
+        http_client=client.http_client,
+    )
+
+
+async def close_supabase_client(client: AsyncClient):
+    await client.http_client.aclose()
+
+
+def pool_stats(client: AsyncClient) -> dict:
+    return client.pool.stats()
@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+
+# Expense writes also move budget utilization and goal forecasts
+EXPENSE_RESOURCES = ("expenses", "budgets", "goals")
+
+
+def etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class UserCache:
+    """
+    Read-through cache of serialized per-user responses, invalidated by writes.
+
+    Entries are keyed by user, resource ("expenses", "budgets", "goals"), the resource's
+    generation and a variant (the query parameters). A write bumps the generation of the
+    resources it touched, so every cached variant for that user goes stale at once, and a
+    read that raced the write can only have stored its result under the old generation.
+
+    The memory tier is an LRU bounded by `max_entries` whose entries expire after `ttl`
+    seconds. Given a Redis (or Redis-compatible) asyncio client, generations and entries
+    are shared through it so an invalidation on one instance is seen by all; a memory hit
+    then still costs one GET for the generation.
+
+    Args:
+        max_entries (int): Responses kept in memory.
+        ttl (float): Seconds a response may be served from the cache.
+        redis: Optional redis.asyncio client for the shared tier.
+        prefix (str): Namespace for Redis keys.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 60.0, redis=None, prefix: str = "budgetbuddy:cache"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.redis = redis
+        self.prefix = prefix
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls):
+        redis = None
+        redis_url = os.getenv("USER_CACHE_REDIS_URL")
+        if redis_url:
+            import redis.asyncio as aioredis
+
+            redis = aioredis.from_url(redis_url)
+        return cls(
+            max_entries=int(os.getenv("USER_CACHE_MAX_ENTRIES", "4096")),
+            ttl=float(os.getenv("USER_CACHE_TTL", "60")),
+            redis=redis,
+        )
+
+    def _generation_key(self, user_id, resource: str) -> str:
+        return f"{self.prefix}:generation:{user_id}:{resource}"
+
+    async def _generation(self, user_id, resource: str) -> int:
+        if self.redis is None:
+            return self._generations.get((str(user_id), resource), 0)
+        return int(await self.redis.get(self._generation_key(user_id, resource)) or 0)
+
+    def _get_local(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry["expires_at"]:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put_local(self, key: str, entry: dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_load(self, user_id, resource: str, variant: str, load) -> dict:
+        """
+        Return the cached response for this user, resource and variant, loading it on a miss.
+
+        Concurrent misses for the same key share one load.
+
+        Args:
+            load: Coroutine function returning (body bytes, extra response headers).
+                Exceptions propagate and nothing is cached.
+
+        Returns:
+            dict: The entry, with `body`, `headers` and `etag`.
+        """
+        key = f"{self.prefix}:{user_id}:{resource}:{await self._generation(user_id, resource)}:{variant}"
+        while True:
+            entry = self._get_local(key)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            if self.redis is not None:
+                shared = await self.redis.get(key)
+                if shared is not None:
+                    entry = json.loads(shared)
+                    entry = {**entry, "body": entry["body"].encode(), "expires_at": time.monotonic() + self.ttl}
+                    self._put_local(key, entry)
+                    self.hits += 1
+                    return entry
+            pending = self._loading.get(key)
+            if pending is None:
+                break
+            # Another request is loading this key; use its result, or load again if it failed
+            await asyncio.shield(pending)
+
+        self.misses += 1
+        done = self._loading[key] = asyncio.get_running_loop().create_future()
+        try:
+            body, headers = await load()
+            entry = {"body": body, "headers": headers, "etag": etag(body), "expires_at": time.monotonic() + self.ttl}
+            self._put_local(key, entry)
+            if self.redis is not None:
+                shared = {"body": body.decode(), "headers": headers, "etag": entry["etag"]}
+                await self.redis.set(key, json.dumps(shared), ex=math.ceil(self.ttl))
+            return entry
+        finally:
+            del self._loading[key]
+            done.set_result(None)
+
+    async def invalidate(self, user_id, *resources: str):
+        """Make every cached response for these resources of `user_id` stale. Call after the write succeeded."""
+        self.invalidations += 1
+        for resource in resources:
+            if self.redis is None:
+                key = (str(user_id), resource)
+                self._generations[key] = self._generations.get(key, 0) + 1
+                continue
+            generation_key = self._generation_key(user_id, resource)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                # Outlives every entry of the old generation, so a reset to 0 cannot revive one
+                await pipe.incr(generation_key).expire(generation_key, max(math.ceil(self.ttl) * 10, 24 * 3600)).execute()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "shared": self.redis is not None,
+        }
+
+    async def aclose(self):
+        if self.redis is not None:
+            await self.redis.aclose()